@@ -1,4 +1,3 @@
-import os
 import base64
 import time
 import secrets as pysecrets
@@ -8,6 +7,8 @@ import requests
 import streamlit as st
 from PIL import Image
 import hmac, hashlib, json, base64
+from pages.utils.graph_api import GraphAPIError, graph_get
+from pages.utils.blob_client import get_blob_service_client
 
 def _b64e(b: bytes) -> str:
     return base64.urlsafe_b64encode(b).decode().rstrip("=")
@@ -352,9 +353,8 @@ elif code:
             # Only verify identity if we have an expected user (step-up auth)
             if expected_user_id:
                 try:
-                    r = requests.get(f"https://graph.facebook.com/me?fields=id,name&access_token={access_token}", timeout=5)
-                    r.raise_for_status()
-                    profile = r.json()
+                    # Cached per token, so the session persist below reuses this response
+                    profile = graph_get(access_token, "me?fields=id,name", timeout=5)
                     new_user_id = str(profile.get("id"))
                     
                     if new_user_id != str(expected_user_id):
@@ -363,8 +363,8 @@ elif code:
                         # Do not save token
                         st.stop()
                         
-                except requests.exceptions.HTTPError as e:
-                    st.error(f"❌ Facebook API Error: {e.response.status_code}")
+                except GraphAPIError as e:
+                    st.error(f"❌ Facebook API Error: {e.error.get('code', e)}")
                     st.info("Please try logging in again. If the problem persists, contact support.")
                     st.stop()
                 except Exception as e:
@@ -378,23 +378,17 @@ elif code:
             # Local filesystem cache on Streamlit Cloud is ephemeral. Stash a copy
             # in Blob storage so Stripe/OAuth redirects can always restore.
             try:
-                from azure.storage.blob import BlobServiceClient as _BSC
-                _az_conn = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
-                if _az_conn:
+                _bsc = get_blob_service_client()
+                if _bsc is not None:
                     # Fetch fb profile for fb_id/fb_name
                     _fb_id = ""
                     _fb_name = ""
                     try:
-                        _r = requests.get(
-                            f"https://graph.facebook.com/me?fields=id,name&access_token={access_token}",
-                            timeout=5,
-                        )
-                        if _r.status_code == 200:
-                            _pj = _r.json()
-                            _fb_id = str(_pj.get("id") or "")
-                            _fb_name = _pj.get("name") or ""
-                            st.session_state["fb_id"] = _fb_id
-                            st.session_state["fb_name"] = _fb_name
+                        _pj = graph_get(access_token, "me?fields=id,name", timeout=5)
+                        _fb_id = str(_pj.get("id") or "")
+                        _fb_name = _pj.get("name") or ""
+                        st.session_state["fb_id"] = _fb_id
+                        st.session_state["fb_name"] = _fb_name
                     except Exception:
                         pass
                     _th = hashlib.md5(access_token.encode()).hexdigest()
@@ -405,7 +399,6 @@ elif code:
                         "selected_backup": st.session_state.get("selected_backup") or "",
                         "ts": int(time.time()),
                     }
-                    _bsc = _BSC.from_connection_string(_az_conn)
                     _bsc.get_container_client("backup").get_blob_client(
                         f"_sessions/{_th}.json"
                     ).upload_blob(json.dumps(_payload).encode("utf-8"), overwrite=True)
@@ -7,7 +7,8 @@ import streamlit as st
 import stripe
 from urllib.parse import urlencode
 import hashlib
-from azure.storage.blob import BlobServiceClient
+from pages.utils.blob_client import get_blob_service_client, get_container_client
+from pages.utils.entitlements import invalidate_entitlements
 from datetime import datetime, timezone
 # ----------------- MUST BE FIRST -----------------
 st.set_page_config(
@@ -75,12 +76,9 @@ if "fb_token" not in st.session_state:
     if _cache_hash_fb:
         try:
             import time as _time_fb
-            from azure.storage.blob import BlobServiceClient as _BSC_fb
-            _conn_fb = st.secrets.get("AZURE_CONNECTION_STRING") or os.environ.get("AZURE_CONNECTION_STRING")
-            if _conn_fb:
-                _bc_fb = _BSC_fb.from_connection_string(_conn_fb) \
-                    .get_container_client("backup") \
-                    .get_blob_client(f"_sessions/{_cache_hash_fb}.json")
+            _cc_fb = get_container_client("backup")
+            if _cc_fb is not None:
+                _bc_fb = _cc_fb.get_blob_client(f"_sessions/{_cache_hash_fb}.json")
                 if _bc_fb.exists():
                     _d_fb = json.loads(_bc_fb.download_blob().readall().decode("utf-8"))
                     if (int(_time_fb.time()) - int(_d_fb.get("ts", 0)) <= 7 * 86400) and _d_fb.get("fb_token"):
@@ -112,7 +110,7 @@ if not AZURE_CONN:
     st.error("Missing AZURE_CONNECTION_STRING in Secrets.")
     st.stop()
 
-_blob = BlobServiceClient.from_connection_string(AZURE_CONN)
+_blob = get_blob_service_client()
 _container = _blob.get_container_client("backup")
 
 # ── Azure Blob session persistence ──────────────────────────
@@ -188,6 +186,7 @@ def _write_entitlements(prefix: str, session) -> None:
     # markers (zero-byte files are fine)
     _container.get_blob_client(f"{prefix}/.paid.memories").upload_blob(b"", overwrite=True)
     _container.get_blob_client(f"{prefix}/.paid.download").upload_blob(b"", overwrite=True)
+    invalidate_entitlements(prefix)
 
 
 # --- NEW: accept prod_ or price_ and resolve to a Price ID
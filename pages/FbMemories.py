@@ -7,30 +7,23 @@ st.set_page_config(page_title="🧠 Facebook Memories", layout="wide", initial_s
 import requests
 import json
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-from urllib.parse import quote, unquote, urlparse, urlunparse
-from azure.storage.blob import BlobServiceClient  # type: ignore
+import tempfile
+from urllib.parse import unquote, urlparse, urlunparse
 import hashlib
 import time 
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # TOP OF FILE, with your other imports
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from uuid import uuid4
 from pathlib import Path
-from textwrap import wrap
 
 try:
-    from PIL import Image as PILImage
-    _HAVE_PIL = True
+    import orjson  # optional: several times faster on large posts shards
+    _json_loads = orjson.loads
 except Exception:
-    _HAVE_PIL = False
+    _json_loads = json.loads
 
 # ---- Debug guard to catch & suppress accidental "None" renders ----
 import functools, inspect
@@ -79,6 +72,15 @@ for _fn in ("write", "text", "caption", "markdown", "code"):
 # -------------------------------------------------------------------
 
 from pages.utils.theme import inject_global_styles
+from pages.utils.graph_api import GraphPager
+from pages.utils.thumbs import is_thumb_path, pick_size, thumb_blob_path
+from pages.utils.backup_manifest import backup_blob_etags, backup_blob_names, record_blobs
+from pages.utils.entitlements import resolve_entitlements, invalidate_entitlements
+from pages.utils.sas import get_signer
+from pages.utils.blob_client import get_blob_service_client, get_container_client
+from pages.utils.image_cache import get_image_cache
+from pages.utils.scrapbook_pdf import (LAYOUT_SLOTS, MEMORY_QUOTES, download_image, layout_for, normalize_image,
+                                       render_document, slot_px)
 
 inject_global_styles()
 st.markdown("""
@@ -884,13 +886,10 @@ if not st.session_state.get("fb_token"):
     _early_cache_hash = qp_get("cache")
     if _early_cache_hash:
         try:
-            from azure.storage.blob import BlobServiceClient as _BSC_early
             import time as _time_early
-            _conn_early = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
-            if _conn_early:
-                _bc_early = _BSC_early.from_connection_string(_conn_early) \
-                    .get_container_client("backup") \
-                    .get_blob_client(f"_sessions/{_early_cache_hash}.json")
+            _cc_early = get_container_client("backup")
+            if _cc_early is not None:
+                _bc_early = _cc_early.get_blob_client(f"_sessions/{_early_cache_hash}.json")
                 if _bc_early.exists():
                     _d_early = json.loads(_bc_early.download_blob().readall().decode("utf-8"))
                     if (int(_time_early.time()) - int(_d_early.get("ts", 0)) <= 7 * 86400) and _d_early.get("fb_token"):
@@ -1079,7 +1078,7 @@ if "azurewebsites.net" not in FUNCTION_BASE:
 CONNECT_STR   = st.secrets["AZURE_CONNECTION_STRING"]
 CONTAINER     = "backup"
 
-blob_service_client = BlobServiceClient.from_connection_string(CONNECT_STR)
+blob_service_client = get_blob_service_client()
 container_client = blob_service_client.get_container_client(CONTAINER)
 
 # ── Azure Blob session persistence ──────────────────────────
@@ -1141,19 +1140,8 @@ def _scrapbook_is_paid(prefix: str) -> bool:
     """Check if user has paid for the scrapbook PDF download."""
     if DEBUG_SCRAPBOOK:
         return True
-    try:
-        # Check scrapbook-specific entitlements
-        bc = container_client.get_blob_client(f"{prefix}/scrapbook_entitlements.json")
-        if bc.exists():
-            ent = json.loads(bc.download_blob().readall().decode("utf-8"))
-            if bool(ent.get("scrapbook") or ent.get("paid")):
-                return True
-        # Marker file
-        if container_client.get_blob_client(f"{prefix}/.paid.scrapbook").exists():
-            return True
-    except Exception:
-        pass
-    return False
+    # scrapbook_entitlements.json or the .paid.scrapbook marker (cached per prefix)
+    return resolve_entitlements(container_client, prefix)["scrapbook"]
 
 def _stripe_pick(obj, key, default=None):
     """
@@ -1191,6 +1179,7 @@ def _write_scrapbook_entitlements(prefix: str, session) -> None:
     bc = container_client.get_blob_client(f"{prefix}/scrapbook_entitlements.json")
     bc.upload_blob(json.dumps(ent, ensure_ascii=False).encode("utf-8"), overwrite=True)
     container_client.get_blob_client(f"{prefix}/.paid.scrapbook").upload_blob(b"", overwrite=True)
+    invalidate_entitlements(prefix)
 
 # ── Handle Stripe redirect back (session_id in query params) ──
 try:
@@ -1247,38 +1236,39 @@ except Exception as _e:
     if _etype in ("RerunException", "RerunData", "StopException"):
         raise  # let Streamlit handle page switches normally
 
-# --- SAS helpers (robust across SDK variants) ---
-def _get_account_key() -> str | None:
-    try:
-        import re
-        m = re.search(r'AccountKey=([^;]+)', CONNECT_STR)
-        return m.group(1) if m else None
-    except Exception:
-        return None
+# --- SAS helpers: one process-wide signer, credentials parsed once ---
+_PLACEHOLDER_IMG = "https://via.placeholder.com/600x400?text=Image+Unavailable"
+# "container" signs one token for every gallery image; only safe if the container isn't shared between users
+SAS_SCOPE = str(st.secrets.get("SAS_SCOPE", "blob")).strip().lower()
+
+def _signer():
+    return get_signer(CONNECT_STR, CONTAINER, service_client=blob_service_client, scope=SAS_SCOPE)
 
 def sign_blob_url(blob_path: str) -> str:
-    sas_cache = st.session_state.setdefault("_sas_cache", {})
-    if blob_path in sas_cache:
-        return sas_cache[blob_path]
+    try:
+        return _signer().url(blob_path) or _PLACEHOLDER_IMG
+    except Exception:
+        return _PLACEHOLDER_IMG
 
+def sign_blob_urls(blob_paths) -> dict:
+    """blob_path -> signed URL for a whole gallery at once."""
     try:
-        account_name = blob_service_client.account_name
-        account_key = _get_account_key()
-        sas = generate_blob_sas(
-            account_name=account_name,
-            container_name=CONTAINER,
-            blob_name=blob_path,
-            account_key=account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=24),
-        )
-        url = f"https://{account_name}.blob.core.windows.net/{CONTAINER}/{quote(blob_path, safe='/')}?{sas}"
-        sas_cache[blob_path] = url
-        return url
+        return _signer().urls(blob_paths)
     except Exception:
-        return "https://via.placeholder.com/600x400?text=Image+Unavailable"
+        return {}
 
 _IMAGE_INDEX_CACHE: dict[str, dict[str, str]] = {}
+# folder -> {stem: [thumbnail sizes stored under images/thumbs/]}
+_THUMB_INDEX_CACHE: dict[str, dict[str, list[int]]] = {}
+# folder -> {blob path: etag} for every image and thumbnail in the backup
+_ETAG_INDEX_CACHE: dict[str, dict[str, str]] = {}
+# Gallery cells are ~1/3 of the page width; 640px stays sharp on 2x screens
+GALLERY_THUMB_PX = 640
+GALLERY_FETCH_WORKERS = 8
+# Local image cache shared by the gallery and the PDF builder
+IMAGE_CACHE_DIR = st.secrets.get("IMAGE_CACHE_DIR", os.getenv("IMAGE_CACHE_DIR")) \
+    or os.path.join(tempfile.gettempdir(), "liveon-image-cache")
+IMAGE_CACHE_MAX_MB = int(st.secrets.get("IMAGE_CACHE_MAX_MB", os.getenv("IMAGE_CACHE_MAX_MB", "1024")))
 
 def _build_image_index(folder: str) -> dict[str, str]:
     """
@@ -1289,19 +1279,42 @@ def _build_image_index(folder: str) -> dict[str, str]:
     """
     if folder in _IMAGE_INDEX_CACHE:
         return _IMAGE_INDEX_CACHE[folder]
-    index = {}
+    index, thumbs, etags = {}, {}, {}
     try:
         prefix = f"{folder}/images/"
-        blobs = container_client.list_blobs(name_starts_with=prefix)
-        for blob in blobs:
-            name = blob.name  # e.g., "hash/images/12345.jpg"
+        # manifest.json when the backup has one, a listing otherwise
+        etags = backup_blob_etags(container_client, folder, "images/")
+        for name in etags:
+            # e.g., "hash/images/12345.jpg"
             stem = Path(name).stem  # e.g., "12345"
+            if is_thumb_path(name):
+                # e.g., "hash/images/thumbs/640/12345.jpg"
+                size = name[len(prefix):].split("/")[1]
+                if size.isdigit():
+                    thumbs.setdefault(stem, []).append(int(size))
+                continue
             index[stem] = name
     except Exception:
         pass
     _IMAGE_INDEX_CACHE[folder] = index
+    _THUMB_INDEX_CACHE[folder] = thumbs
+    _ETAG_INDEX_CACHE[folder] = {name: str(etag).strip('"') for name, etag in etags.items() if etag}
     return index
 
+def _sized_image_ref(u: str, max_px: int | None) -> str:
+    """
+    For one of our backup images, the smallest stored thumbnail whose longest
+    edge covers max_px. Anything else (older backups without thumbnails,
+    external URLs, slots bigger than every thumbnail) comes back unchanged.
+    """
+    bp = _ours_blob_path(u) if max_px else None
+    if not bp or "/images/" not in bp or is_thumb_path(bp):
+        return u
+    folder = bp.split("/images/", 1)[0]
+    _build_image_index(folder)
+    size = pick_size(max_px, _THUMB_INDEX_CACHE.get(folder, {}).get(Path(bp).stem, ()))
+    return thumb_blob_path(bp, size) if size else u
+
 def _resolve_image_url(img_url: str, post_id: str = "", image_index: dict = None) -> str:
     """
     Resolve an image URL to a displayable URL, with blob index fallback.
@@ -1395,7 +1408,6 @@ if _prev != blob_folder:
     st.session_state.pop("chapters", None)
     st.session_state["pdf_bytes"] = None
     st.session_state["pdf_dirty"] = True
-    st.session_state.pop("_sas_cache", None)
 
 if project_id:
     project_id = unquote(project_id)
@@ -1411,19 +1423,21 @@ try:
 except:
     project_name = "Facebook Memories"
 
+POSTS_SHARD_WORKERS = 8
+
 @st.cache_data(show_spinner=False)
 def load_all_posts_from_blob(container: str, folder: str) -> list[dict]:
-    bsc = BlobServiceClient.from_connection_string(CONNECT_STR)
+    bsc = get_blob_service_client()
     cc = bsc.get_container_client(container)
-    blobs = list(cc.list_blobs(name_starts_with=f"{folder}/"))
+    blob_names = backup_blob_names(cc, folder)
 
     def _items_from_blob(blob_name: str) -> list[dict]:
-        txt = bsc.get_blob_client(container, blob_name).download_blob().readall().decode("utf-8")
+        raw = bsc.get_blob_client(container, blob_name).download_blob().readall()
         try:
-            data = json.loads(txt)
+            data = _json_loads(raw)
             if isinstance(data, list): return data
             if isinstance(data, dict) and isinstance(data.get("data"), list): return data["data"]
-        except json.JSONDecodeError: pass
+        except json.JSONDecodeError: pass  # orjson's decode error subclasses this one
         return []
 
     def _key(p: dict) -> str:
@@ -1432,35 +1446,42 @@ def load_all_posts_from_blob(container: str, folder: str) -> list[dict]:
         base = f"{p.get('message','')}|{p.get('created_time','')}"
         return hashlib.md5(base.encode("utf-8")).hexdigest()
 
-    posts_by_id: dict[str, dict] = {}
-    for blob in blobs:
-        name = blob.name.lower()
+    shards = []
+    for blob_name in blob_names:
+        name = blob_name.lower()
         if not (name.endswith(".json") or name.endswith(".json.json")): continue
-        if "posts+cap.json" not in name: continue
-        for p in _items_from_blob(blob.name): posts_by_id[_key(p)] = p
+        if "posts" not in name: continue
+        shards.append((blob_name, "posts+cap.json" in name))
+    if not shards:
+        return []
 
-    for blob in blobs:
-        name = blob.name.lower()
-        if not (name.endswith(".json") or name.endswith(".json.json")): continue
-        if "posts" not in name or "posts+cap.json" in name: continue
-        for p in _items_from_blob(blob.name): posts_by_id.setdefault(_key(p), p)
+    # Shards download and parse concurrently, so the load takes about as long as the largest one
+    with ThreadPoolExecutor(max_workers=min(POSTS_SHARD_WORKERS, len(shards))) as pool:
+        items = pool.map(_items_from_blob, [blob_name for blob_name, _ in shards])
+
+        # Captioned shards win; plain posts shards only fill in posts they don't have
+        captioned: dict[str, dict] = {}
+        plain: dict[str, dict] = {}
+        for (_, is_captioned), shard_items in zip(shards, items):
+            if is_captioned:
+                for p in shard_items: captioned[_key(p)] = p
+            else:
+                for p in shard_items: plain.setdefault(_key(p), p)
 
+    posts_by_id = dict(captioned)
+    for k, p in plain.items():
+        posts_by_id.setdefault(k, p)
     return list(posts_by_id.values())
 
 def fetch_posts_from_api(token: str, max_pages: int = 50) -> list[dict]:
-    url = f"https://graph.facebook.com/me/posts?fields=id,message,created_time,full_picture,attachments{{media}}&limit=100&access_token={token}"
+    # Next page is fetched while this one is being collected; errors keep what we already have
+    pager = GraphPager("me/posts", token, fields="id,message,created_time,full_picture,attachments{media}",
+                       limit=100, max_pages=max_pages)
     all_posts = []
-    pages = 0
-    while url and pages < max_pages:
-        try:
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-            if "error" in data: break
-            all_posts.extend(data.get("data", []))
-            url = data.get("paging", {}).get("next")
-            pages += 1
-        except Exception: break
+    try:
+        for page in pager:
+            all_posts.extend(page)
+    except Exception: pass
     return all_posts
 
 def save_posts_to_blob(posts: list[dict], blob_folder: str):
@@ -1468,6 +1489,8 @@ def save_posts_to_blob(posts: list[dict], blob_folder: str):
         blob_path = f"{blob_folder}/posts+cap.json"
         data = json.dumps(posts, indent=2, ensure_ascii=False)
         container_client.get_blob_client(blob_path).upload_blob(data, overwrite=True)
+        # load_all_posts_from_blob reads the shard list from manifest.json
+        record_blobs(container_client, blob_folder, [blob_path])
     except Exception: pass
 
 def call_function(endpoint:str, payload:dict, timeout:int=90):
@@ -1624,45 +1647,56 @@ def extract_titles(ai_text:str) -> list[str]:
         if m: titles.append(_clean(m.group(1)))
     return list(dict.fromkeys([t for t in titles if t]))
 
+def _post_gallery_images(post: dict, image_index: dict) -> list:
+    images = post.get("images", []) or ([post.get("image")] if "image" in post else [])
+    images = _prefer_azure([u for u in images if _is_displayable_image_ref(u)])
+
+    # If no displayable images found via URL, try the blob index by post ID
+    post_id = str(post.get("id") or post.get("post_id") or "").strip()
+    if not images and post_id and post_id in image_index:
+        images = [image_index[post_id]]
+
+    # Resolve each URL to prefer actual Azure blob paths over possibly-expired CDN URLs
+    resolved = []
+    for u in images:
+        bp = _ours_blob_path(u)
+        if bp:
+            resolved.append(bp)
+        elif post_id and post_id in image_index:
+            resolved.append(image_index[post_id])
+        else:
+            resolved.append(u)
+    return resolved
+
 def render_chapter_post_images(chap_title, chapter_posts, classification, FUNCTION_BASE):
     st.markdown("<div class='card'><div class='grid-3'>", unsafe_allow_html=True)
     cols = st.columns(3)
     seen_urls: set[str] = set()
     # Build blob image index for reliable image resolution
     image_index = _build_image_index(blob_folder)
+    post_images = [_post_gallery_images(post, image_index) for post in chapter_posts]
+    # Sign the chapter's thumbnails in one call; the fetches below then hit the signer cache
+    sign_blob_urls(
+        bp for images in post_images for u in images
+        if (bp := _ours_blob_path(_sized_image_ref(u, GALLERY_THUMB_PX)))
+    )
+    # Thumbnail bytes from the local image cache (the PDF builder shares it); a miss falls back to the URL
+    gallery_bytes = _gallery_images(_sized_image_ref(u, GALLERY_THUMB_PX) for images in post_images for u in images)
     for post_idx, post in enumerate(chapter_posts):
-        images = post.get("images", []) or ([post.get("image")] if "image" in post else [])
-        images = _prefer_azure([u for u in images if _is_displayable_image_ref(u)])
-
-        # If no displayable images found via URL, try the blob index by post ID
-        post_id = str(post.get("id") or post.get("post_id") or "").strip()
-        if not images and post_id and post_id in image_index:
-            images = [image_index[post_id]]
-
-        # Resolve each URL to prefer actual Azure blob paths over possibly-expired CDN URLs
-        resolved = []
-        for u in images:
-            bp = _ours_blob_path(u)
-            if bp:
-                resolved.append(bp)
-            elif post_id and post_id in image_index:
-                resolved.append(image_index[post_id])
-            else:
-                resolved.append(u)
-        images = resolved
-
+        images = post_images[post_idx]
         if not images: continue
         caption = _unique_caption(_craft_caption_via_function(post.get("message"), post.get("context_caption")))
         for img_idx, img_url in enumerate(images):
             with cols[post_idx % 3]:
-                display_url = to_display_url(img_url)
-                if not display_url:
+                thumb_ref = _sized_image_ref(img_url, GALLERY_THUMB_PX)
+                display = gallery_bytes.get(thumb_ref) or to_display_url(thumb_ref)
+                if not display:
                     continue
                 key = _image_key(img_url)
                 if key in seen_urls: continue
                 seen_urls.add(key)
                 cap = _safe_caption(caption)
-                st.image(display_url, caption=cap, use_container_width=True)
+                st.image(display, caption=cap, use_container_width=True)
                 button_key = f"replace_{chap_title}_{post_idx}_{img_idx}"
                 if st.button("🔄 Replace", key=button_key):
                     with st.spinner("⏳ Finding a better fit..."):
@@ -1687,863 +1721,97 @@ def render_chapter_post_images(chap_title, chapter_posts, classification, FUNCTI
                         except: pass
     st.markdown("</div></div>", unsafe_allow_html=True)
 
-def _register_scrapbook_fonts() -> tuple[str, str, str]:
+def _image_cache_key(ref: str) -> str:
+    """Cache key for an image: blob path + etag for our backup images, else the canonical URL."""
+    bp = _ours_blob_path(ref)
+    if bp and "/images/" in bp:
+        folder = bp.split("/images/", 1)[0]
+        _build_image_index(folder)
+        etag = _ETAG_INDEX_CACHE.get(folder, {}).get(bp)
+        if etag:
+            return f"blob:{bp}@{etag}"
+    return "url:" + _canon_for_dedupe(ref)
+
+def _cached_image(ref: str) -> bytes | None:
+    """Bytes of one image (blob path or URL), from the local image cache when it has them."""
+    cache = get_image_cache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024)
     try:
-        pdfmetrics.registerFont(TTFont("SpecialElite", "fonts/SpecialElite-Regular.ttf"))
-        pdfmetrics.registerFont(TTFont("PatrickHand", "fonts/PatrickHand-Regular.ttf"))
-        pdfmetrics.registerFont(TTFont("Inter-Bold", "fonts/Inter-Bold.ttf"))
-        return "SpecialElite", "Inter-Bold", "PatrickHand"
-    except:
-        return "Helvetica", "Helvetica-Bold", "Courier"
-
-# ── Storybook colour palette (all RGB 0-1) ────────────────────
-_SB_CREAM      = (0.992, 0.973, 0.941)
-_SB_IVORY      = (0.976, 0.953, 0.914)
-_SB_NAVY       = (0.102, 0.180, 0.290)
-_SB_GOLD       = (0.769, 0.573, 0.227)
-_SB_RUST       = (0.549, 0.239, 0.149)
-_SB_MUTED      = (0.580, 0.560, 0.540)
-_SB_TEXT       = (0.160, 0.160, 0.160)
-_SB_WHITE      = (1.000, 1.000, 1.000)
-_SB_SHADOW     = (0.820, 0.808, 0.790)
-# Soft page-tint palette for variety
-_SB_SAGE       = (0.930, 0.950, 0.930)   # soft green
-_SB_BLUSH      = (0.975, 0.940, 0.940)   # warm pink
-_SB_SKY        = (0.930, 0.945, 0.968)   # dusty blue
-_SB_LINEN      = (0.965, 0.955, 0.935)   # warm linen
-_SB_LAVENDER   = (0.945, 0.935, 0.960)   # soft purple
-_PAGE_TINTS    = [_SB_CREAM, _SB_SAGE, _SB_BLUSH, _SB_SKY, _SB_LINEN, _SB_LAVENDER]
-_TAPE_COLORS   = [
-    (0.94, 0.91, 0.84),   # classic beige
-    (0.88, 0.92, 0.88),   # sage green
-    (0.93, 0.88, 0.88),   # dusty rose
-    (0.88, 0.90, 0.94),   # sky blue
-    (0.92, 0.89, 0.94),   # lavender
-]
-
-# Inspirational quotes for interlude pages
-_MEMORY_QUOTES = [
-    ("The best thing about memories is making them.", ""),
-    ("Life is not measured by the breaths we take,\nbut by the moments that take our breath away.", ""),
-    ("Sometimes you will never know the value\nof a moment until it becomes a memory.", "Dr. Seuss"),
-    ("We do not remember days,\nwe remember moments.", "Cesare Pavese"),
-    ("In the end, it's not the years in your life that count.\nIt's the life in your years.", "Abraham Lincoln"),
-    ("Collect moments, not things.", ""),
-    ("The camera is an instrument that teaches\npeople how to see without a camera.", "Dorothea Lange"),
-    ("A photograph is a pause button on life.", ""),
-]
-
-def _sf(c, rgb): c.setFillColorRGB(*rgb)
-def _ss(c, rgb): c.setStrokeColorRGB(*rgb)
-
-def _ornament_corners(c, x, y, w, h, size=18, color=None):
-    color = color or _SB_GOLD
-    _ss(c, color)
-    c.setLineWidth(1.2)
-    for (cx, cy), (sx, sy) in zip(
-        [(x, y+h), (x+w, y+h), (x, y), (x+w, y)],
-        [( 1,-1),  (-1,-1),    ( 1, 1), (-1,  1)]
-    ):
-        c.line(cx, cy, cx + sx*size, cy)
-        c.line(cx, cy, cx, cy + sy*size)
-
-def _divider(c, cx, y, half_w=80, color=None):
-    color = color or _SB_GOLD
-    _ss(c, color)
-    c.setLineWidth(0.8)
-    c.line(cx - half_w, y, cx - 10, y)
-    c.line(cx + 10, y, cx + half_w, y)
-    c.saveState()
-    c.translate(cx, y)
-    c.rotate(45)
-    _sf(c, color)
-    c.rect(-3.5, -3.5, 7, 7, fill=True, stroke=False)
-    c.restoreState()
-
-def _star_divider(c, cx, y, half_w=90, color=None):
-    color = color or _SB_GOLD
-    _ss(c, color)
-    c.setLineWidth(0.6)
-    c.line(cx - half_w, y, cx - 18, y)
-    c.line(cx + 18, y, cx + half_w, y)
-    _sf(c, color)
-    for dx in [-8, 0, 8]:
-        c.saveState()
-        c.translate(cx + dx, y)
-        c.rotate(45)
-        sz = 3.0 if dx == 0 else 2.0
-        c.rect(-sz, -sz, sz*2, sz*2, fill=True, stroke=False)
-        c.restoreState()
-
-def _double_border(c, x, y, w, h, gap=5, color=None):
-    color = color or _SB_NAVY
-    _ss(c, color)
-    c.setLineWidth(1.5)
-    c.rect(x, y, w, h, fill=False, stroke=True)
-    c.setLineWidth(0.5)
-    c.rect(x+gap, y+gap, w-2*gap, h-2*gap, fill=False, stroke=True)
-
-def _corner_flourish(c, x, y, size=30, flip_x=False, flip_y=False, color=None):
-    """Draw a simple elegant corner mark with a small leaf-like accent."""
-    color = color or _SB_GOLD
-    _ss(c, color)
-    _sf(c, color)
-    sx = -1 if flip_x else 1
-    sy = -1 if flip_y else 1
-    # L-shaped corner line
-    c.setLineWidth(0.6)
-    c.line(x, y, x + sx * size, y)
-    c.line(x, y, x, y + sy * size)
-    # Small diamond accent at corner
-    c.saveState()
-    c.translate(x, y)
-    c.rotate(45)
-    c.rect(-2.5, -2.5, 5, 5, fill=True, stroke=False)
-    c.restoreState()
-
-def _fetch_img(url: str) -> "ImageReader | None":
-    """Fetch image for PDF rendering."""
-    try:
-        r = requests.get(to_display_url(url), timeout=14)
-        r.raise_for_status()
-        return ImageReader(BytesIO(r.content))
+        return cache.get_or_fetch(_image_cache_key(ref), lambda: download_image([to_display_url(ref)]))
     except Exception:
         return None
 
-def _draw_tape(c, cx, cy, tw=40, th=14, angle=0, color=None):
-    color = color or _TAPE_COLORS[0]
-    c.saveState()
-    c.translate(cx, cy)
-    if angle:
-        c.rotate(angle)
-    _sf(c, color)
-    c.roundRect(-tw/2, -th/2, tw, th, 2, fill=True, stroke=False)
-    # Tape edge lines
-    darker = tuple(max(0, v - 0.04) for v in color)
-    _ss(c, darker)
-    c.setLineWidth(0.2)
-    c.line(-tw/2 + 2, -th/2 + 2, tw/2 - 2, -th/2 + 2)
-    c.line(-tw/2 + 2, th/2 - 2, tw/2 - 2, th/2 - 2)
-    c.restoreState()
-
-def _draw_photo_corners(c, cx, cy, dw, dh, color=None):
-    """Draw vintage album-style photo corner mounts (simple triangles)."""
-    color = color or (0.82, 0.78, 0.68)
-    sz = 11
-    _sf(c, color)
-    # Four corners: draw small rotated squares clipped to triangles
-    for ox, oy, rot in [(-dw/2, -dh/2, 0), (dw/2, -dh/2, 90),
-                         (-dw/2, dh/2, -90), (dw/2, dh/2, 180)]:
-        c.saveState()
-        c.translate(cx + ox, cy + oy)
-        c.rotate(rot)
-        c.rotate(45)
-        c.rect(-sz*0.35, -sz*0.35, sz*0.7, sz*0.7, fill=True, stroke=False)
-        c.restoreState()
-
-def _framed_photo(c, img_reader, cx, cy, pw, ph,
-                  caption="", date_str="", angle=0, style="polaroid",
-                  tape_color=None):
+def _gallery_images(refs) -> dict:
+    """ref -> bytes for a chapter's gallery images; cache misses are downloaded concurrently."""
+    refs = list(dict.fromkeys(refs))
+    if not refs:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(GALLERY_FETCH_WORKERS, len(refs))) as pool:
+        return {ref: data for ref, data in zip(refs, pool.map(_cached_image, refs)) if data}
+
+def _image_urls(url: str, max_px: int | None = None) -> list:
+    """Signed URLs for a PDF image, best first: the smallest stored thumbnail covering max_px, then the original."""
+    urls = []
+    for ref in dict.fromkeys([_sized_image_ref(url, max_px), url]):
+        try:
+            urls.append(to_display_url(ref))
+        except Exception:
+            continue
+    return urls
+
+def _download_img(url: str, max_px: int | None = None) -> bytes | None:
     """
-    Draw a beautifully framed photo centred on (cx, cy).
-    Styles: 'polaroid', 'clean', 'tape', 'vintage', 'magazine'.
+    Image bytes for PDF rendering, fitted to max_px: the smallest stored
+    thumbnail covering max_px, else the original, through the image cache.
     """
-    if img_reader:
-        iw, ih = img_reader.getSize()
-        scale = min(pw / iw, ph / ih)
-        dw, dh = iw * scale, ih * scale
-    else:
-        dw, dh = pw * 0.5, ph * 0.5
-
-    c.saveState()
-    c.translate(cx, cy)
-    if angle:
-        c.rotate(angle)
-
-    if style == "polaroid":
-        pad_x, pad_top = 12, 12
-        pad_bot = 48 if caption else 20
-        fw = dw + 2 * pad_x
-        fh = dh + pad_top + pad_bot
-
-        # Layered shadow for depth
-        _sf(c, (0.86, 0.85, 0.83))
-        c.roundRect(-fw/2 + 5, -fh/2 - 5, fw, fh, 4, fill=True, stroke=False)
-        _sf(c, _SB_SHADOW)
-        c.roundRect(-fw/2 + 3, -fh/2 - 3, fw, fh, 4, fill=True, stroke=False)
-
-        # White frame
-        _sf(c, _SB_WHITE)
-        _ss(c, (0.88, 0.86, 0.83))
-        c.setLineWidth(0.4)
-        c.roundRect(-fw/2, -fh/2, fw, fh, 4, fill=True, stroke=True)
-
-        if img_reader:
-            c.drawImage(img_reader, -dw/2, -fh/2 + pad_bot, width=dw, height=dh, mask='auto')
-            # Subtle inner shadow line on photo
-            _ss(c, (0.75, 0.73, 0.70))
-            c.setLineWidth(0.3)
-            c.rect(-dw/2, -fh/2 + pad_bot, dw, dh, fill=False, stroke=True)
-
-        if caption:
-            _sf(c, _SB_TEXT)
-            c.setFont("Courier", 7.5)
-            # Italic-style open/close quotes
-            lines = wrap(caption.strip(), int(fw / 4.8)) or [""]
-            ty = -fh/2 + 6
-            for li, line in enumerate(lines[:3]):
-                prefix = "\u201c " if li == 0 else ""
-                suffix = " \u201d" if li == min(2, len(lines)-1) else ""
-                c.drawCentredString(0, ty, f"{prefix}{line}{suffix}")
-                ty += 10
-
-        if date_str:
-            _sf(c, _SB_RUST)
-            c.setFont("Courier", 6.5)
-            c.drawRightString(fw/2 - 6, fh/2 - 11, date_str)
-
-    elif style == "clean":
-        border = 3
-        fw = dw + border * 2
-        cap_h = 28 if caption else 6
-        fh = dh + border * 2 + cap_h
-
-        # Shadow
-        c.setFillColorRGB(0.87, 0.86, 0.84)
-        c.roundRect(-fw/2 + 3, -fh/2 - 3, fw, fh, 2, fill=True, stroke=False)
-
-        _sf(c, _SB_WHITE)
-        _ss(c, (0.90, 0.88, 0.85))
-        c.setLineWidth(0.3)
-        c.roundRect(-fw/2, -fh/2, fw, fh, 2, fill=True, stroke=True)
-
-        if img_reader:
-            c.drawImage(img_reader, -dw/2, -fh/2 + cap_h, width=dw, height=dh, mask='auto')
-
-        if caption:
-            _sf(c, _SB_MUTED)
-            c.setFont("Courier", 6.5)
-            lines = wrap(caption.strip(), int(fw / 4.4)) or [""]
-            ty = -fh/2 + 4
-            for line in lines[:2]:
-                c.drawCentredString(0, ty, line)
-                ty += 9
-
-        if date_str:
-            _sf(c, _SB_GOLD)
-            c.setFont("Courier", 6)
-            c.drawRightString(fw/2 - 4, fh/2 - 9, date_str)
-
-    elif style == "tape":
-        if img_reader:
-            c.drawImage(img_reader, -dw/2, -dh/2, width=dw, height=dh, mask='auto')
-            _ss(c, (0.90, 0.88, 0.85))
-            c.setLineWidth(0.3)
-            c.rect(-dw/2, -dh/2, dw, dh, fill=False, stroke=True)
-
-        tc = tape_color or _TAPE_COLORS[0]
-        _draw_tape(c, -dw/2 + 18, dh/2 - 1, tw=38, th=12, angle=22, color=tc)
-        _draw_tape(c, dw/2 - 18, dh/2 - 1, tw=38, th=12, angle=-22, color=tc)
-
-        if caption:
-            _sf(c, _SB_TEXT)
-            c.setFont("Courier", 6.5)
-            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
-            ty = -dh/2 - 13
-            for line in lines[:2]:
-                c.drawCentredString(0, ty, line)
-                ty -= 9
-
-        if date_str:
-            _sf(c, _SB_MUTED)
-            c.setFont("Courier", 6)
-            c.drawRightString(dw/2, dh/2 + 14, date_str)
-
-    elif style == "vintage":
-        # Photo with vintage corner mounts (no frame border)
-        if img_reader:
-            c.drawImage(img_reader, -dw/2, -dh/2, width=dw, height=dh, mask='auto')
-        _draw_photo_corners(c, 0, 0, dw, dh)
-
-        if caption:
-            _sf(c, _SB_TEXT)
-            c.setFont("Courier", 6.5)
-            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
-            ty = -dh/2 - 13
-            for line in lines[:2]:
-                c.drawCentredString(0, ty, line)
-                ty -= 9
-
-        if date_str:
-            _sf(c, _SB_RUST)
-            c.setFont("Courier", 6.5)
-            c.drawCentredString(0, dh/2 + 10, date_str)
-
-    elif style == "magazine":
-        # Borderless with gold accent line below
-        if img_reader:
-            c.drawImage(img_reader, -dw/2, -dh/2 + 8, width=dw, height=dh, mask='auto')
-
-        # Gold accent bar under photo
-        _sf(c, _SB_GOLD)
-        c.rect(-dw/2, -dh/2 + 4, dw, 2, fill=True, stroke=False)
-
-        if caption:
-            _sf(c, _SB_NAVY)
-            c.setFont("Courier", 7)
-            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
-            ty = -dh/2 - 8
-            for line in lines[:2]:
-                c.drawCentredString(0, ty, line)
-                ty -= 9
-
-        if date_str:
-            _sf(c, _SB_GOLD)
-            c.setFont("Courier", 7)
-            c.drawString(-dw/2, -dh/2 - 6, date_str)
-
-    c.restoreState()
-
-def _page_bg(c, W, H, page_num, header=True, footer=True, chap_title="", fonts=None, tint=None):
-    """Render a beautiful content page background with header/footer."""
-    tf, bf, cf = fonts or ("Helvetica", "Helvetica-Bold", "Courier")
-    bg = tint or _PAGE_TINTS[page_num % len(_PAGE_TINTS)]
-
-    # Page background
-    _sf(c, bg)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    # Decorative corner flourishes
-    _corner_flourish(c, 22, H - 22, size=26, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, W - 22, H - 22, size=26, flip_x=True, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, 22, 22, size=26, color=_SB_GOLD)
-    _corner_flourish(c, W - 22, 22, size=26, flip_x=True, color=_SB_GOLD)
-
-    # Thin decorative border
-    _ss(c, (0.88, 0.86, 0.83))
-    c.setLineWidth(0.3)
-    c.roundRect(18, 18, W - 36, H - 36, 3, fill=False, stroke=True)
-
-    if header and chap_title:
-        # Elegant header
-        _sf(c, _SB_NAVY)
-        c.setFont(cf, 7)
-        c.drawCentredString(W/2, H - 28, chap_title.upper())
-        # Thin gold rule
-        _sf(c, _SB_GOLD)
-        c.rect(W/2 - 50, H - 33, 100, 0.4, fill=True, stroke=False)
-
-    if footer:
-        # Decorative footer with diamond
-        _sf(c, _SB_MUTED)
-        c.setFont(cf, 7)
-        c.drawCentredString(W/2, 14, f"-  {page_num}  -")
-        # Tiny gold dots flanking page number
-        _sf(c, _SB_GOLD)
-        c.circle(W/2 - 22, 17, 1.2, fill=True, stroke=False)
-        c.circle(W/2 + 22, 17, 1.2, fill=True, stroke=False)
-
-def _page_decorative_border(c, W, H, M=24):
-    """Subtle decorative border for content pages (legacy compat)."""
-    _ss(c, (0.88, 0.86, 0.83))
-    c.setLineWidth(0.3)
-    c.rect(M, M, W - 2*M, H - 2*M, fill=False, stroke=True)
-    _sf(c, _SB_GOLD)
-    for x, y in [(M, M), (W-M, M), (M, H-M), (W-M, H-M)]:
-        c.circle(x, y, 2, fill=True, stroke=False)
-
-# ── Individual page renderers ──────────────────────────────────
-
-def _page_cover(c, W, H, user_name: str, summary: str, chapters: list, fonts: tuple):
-    tf, bf, cf = fonts
-    M = 28
-
-    # Navy background
-    _sf(c, _SB_NAVY)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    # Gold bands
-    _sf(c, _SB_GOLD)
-    c.rect(0, H - 52, W, 52, fill=True, stroke=False)
-    c.rect(0, 0, W, 40, fill=True, stroke=False)
-
-    # Cream accent lines
-    _sf(c, _SB_CREAM)
-    c.rect(0, H - 54, W, 1, fill=True, stroke=False)
-    c.rect(0, 40, W, 1, fill=True, stroke=False)
-
-    # Borders
-    _double_border(c, M, 44, W - 2*M, H - 100, gap=6, color=_SB_CREAM)
-    _ss(c, _SB_GOLD)
-    c.setLineWidth(0.5)
-    c.rect(M+10, 52, W - 2*M - 20, H - 116, fill=False, stroke=True)
-    _ornament_corners(c, M+14, 56, W - 2*M - 28, H - 124, size=24, color=_SB_GOLD)
-
-    # Corner flourishes on navy body
-    _corner_flourish(c, M+20, H - 60, size=35, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, W-M-20, H - 60, size=35, flip_x=True, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, M+20, 50, size=35, color=_SB_GOLD)
-    _corner_flourish(c, W-M-20, 50, size=35, flip_x=True, color=_SB_GOLD)
-
-    # Eyebrow
-    _sf(c, _SB_GOLD)
-    c.setFont(tf, 9)
-    c.drawCentredString(W/2, H - 84, "F A C E B O O K    M E M O R I E S")
-    _star_divider(c, W/2, H - 98, half_w=100, color=_SB_GOLD)
-
-    # User name
-    _sf(c, _SB_CREAM)
-    font_size = 38 if len(user_name) <= 16 else (28 if len(user_name) <= 24 else 22)
-    c.setFont(bf, font_size)
-    c.drawCentredString(W/2, H/2 + 80, user_name)
-
-    # Thin gold rule
-    _sf(c, _SB_GOLD)
-    c.rect(W/2 - 70, H/2 + 70, 140, 0.8, fill=True, stroke=False)
-
-    # Subtitle
-    c.setFont(tf, 14)
-    c.drawCentredString(W/2, H/2 + 48, "A Life in Memories")
-    _divider(c, W/2, H/2 + 32, half_w=75, color=_SB_GOLD)
-
-    # Summary
-    if summary:
-        _sf(c, (0.78, 0.76, 0.73))
-        c.setFont(cf, 9)
-        lines = wrap(summary.strip()[:380], 56)
-        ty = H/2 + 10
-        for line in lines[:5]:
-            c.drawCentredString(W/2, ty, line)
-            ty -= 13
-
-    # Chapter count
-    _star_divider(c, W/2, H/2 - 80, half_w=55, color=_SB_GOLD)
-    _sf(c, (0.60, 0.58, 0.55))
-    c.setFont(cf, 9)
-    c.drawCentredString(W/2, H/2 - 98, f"{len(chapters)} Chapters  \u00b7  {datetime.now().year}")
-
-    # Branding
-    _sf(c, _SB_NAVY)
-    c.setFont(bf, 10)
-    c.drawCentredString(W/2, 14, "LiveOn")
-
-
-def _page_toc(c, W, H, chapters: list, fonts: tuple):
-    tf, bf, cf = fonts
-    M = 46
-    roman = ["I","II","III","IV","V","VI","VII","VIII","IX","X","XI","XII"]
-
-    _sf(c, _SB_CREAM)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    # Navy top band
-    _sf(c, _SB_NAVY)
-    c.rect(0, H - 66, W, 66, fill=True, stroke=False)
-    _sf(c, _SB_GOLD)
-    c.rect(0, H - 68, W, 2, fill=True, stroke=False)
-
-    _sf(c, _SB_CREAM)
-    c.setFont(bf, 18)
-    c.drawCentredString(W/2, H - 46, "Table of Contents")
-    _sf(c, _SB_GOLD)
-    c.setFont(tf, 8)
-    c.drawCentredString(W/2, H - 58, "- your story in chapters -")
-
-    _double_border(c, M - 10, M - 10, W - 2*M + 20, H - 2*M - 50, gap=5, color=_SB_NAVY)
-    _ornament_corners(c, M - 2, M - 2, W - 2*M + 4, H - 2*M - 66, size=16, color=_SB_GOLD)
-
-    # Flourishes
-    _corner_flourish(c, M, H - 78, size=22, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, W - M, H - 78, size=22, flip_x=True, flip_y=True, color=_SB_GOLD)
-
-    # Fixed column positions for clean alignment
-    col_num   = M + 10            # roman numeral left edge
-    col_dot   = M + 38            # dot separator
-    col_title = M + 46            # chapter title left edge
-    col_end   = W - M - 10        # right edge for page numbers
-    leader_end = col_end - 4
-
-    start_y = H - 108
-    row_h = 34
-    for i, chap in enumerate(chapters):
-        ry = start_y - i * row_h
-        if ry < M + 10:
-            break
-        if i % 2 == 0:
-            _sf(c, _SB_IVORY)
-            c.rect(M, ry - 6, W - 2*M, row_h - 2, fill=True, stroke=False)
-
-        # Roman numeral — right-aligned in its column
-        num = roman[i] if i < len(roman) else str(i + 1)
-        _sf(c, _SB_GOLD)
-        c.setFont(bf, 10)
-        c.drawRightString(col_dot - 6, ry + 8, num)
-
-        # Gold dot separator
-        c.circle(col_dot, ry + 12, 1.5, fill=True, stroke=False)
-
-        # Chapter title — fixed left position
-        _sf(c, _SB_NAVY)
-        c.setFont(tf, 11)
-        c.drawString(col_title, ry + 8, chap)
-
-        # Dotted leader — starts after actual text width
-        title_width = c.stringWidth(chap, tf, 11)
-        leader_start = col_title + title_width + 8
-        if leader_start < leader_end - 20:
-            _ss(c, _SB_MUTED)
-            c.setLineWidth(0.4)
-            c.setDash([1, 4])
-            c.line(leader_start, ry + 12, leader_end, ry + 12)
-            c.setDash()
-
-    _sf(c, _SB_MUTED)
-    c.setFont(cf, 8)
-    c.drawCentredString(W/2, M/2, "- i -")
-
-
-def _page_chapter_title(c, W, H, title: str, num: int, fonts: tuple):
-    tf, bf, cf = fonts
-    roman = ["I","II","III","IV","V","VI","VII","VIII","IX","X","XI","XII"]
-    num_str = roman[num - 1] if num <= 12 else str(num)
-
-    _sf(c, _SB_IVORY)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    # Spine
-    _sf(c, _SB_NAVY)
-    c.rect(0, 0, 48, H, fill=True, stroke=False)
-    _sf(c, _SB_GOLD)
-    c.rect(48, 0, 3, H, fill=True, stroke=False)
-    _sf(c, _SB_CREAM)
-    c.rect(47, 0, 0.5, H, fill=True, stroke=False)
-
-    c.saveState()
-    c.translate(24, H / 2)
-    c.rotate(90)
-    _sf(c, _SB_GOLD)
-    c.setFont(bf, 9)
-    c.drawCentredString(0, 0, f"CHAPTER  {num_str}")
-    c.restoreState()
-
-    # Ghost numeral
-    _sf(c, (0.968, 0.945, 0.906))
-    c.setFont(bf, 150)
-    c.drawRightString(W - 16, H * 0.04, num_str)
-
-    # Corner flourishes on right page
-    cx = 55 + (W - 55) / 2
-    _corner_flourish(c, 62, H - 30, size=28, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, W - 22, H - 30, size=28, flip_x=True, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, 62, 30, size=28, color=_SB_GOLD)
-    _corner_flourish(c, W - 22, 30, size=28, flip_x=True, color=_SB_GOLD)
-
-    # Content
-    _sf(c, _SB_GOLD)
-    c.setFont(cf, 10)
-    c.drawCentredString(cx, H * 0.66, f"Chapter {num_str}")
-    _star_divider(c, cx, H * 0.62, half_w=85, color=_SB_GOLD)
-
-    font_size = 28 if len(title) <= 22 else 20
-    _sf(c, _SB_NAVY)
-    c.setFont(tf, font_size)
-    c.drawCentredString(cx, H * 0.54, title)
-
-    _star_divider(c, cx, H * 0.48, half_w=85, color=_SB_GOLD)
-
-    _sf(c, _SB_MUTED)
-    c.setFont(cf, 9)
-    c.drawCentredString(cx, H * 0.43, "A collection of cherished moments")
-
-    # Gold bottom rule
-    _sf(c, _SB_GOLD)
-    c.rect(55, 0, W - 55, 4, fill=True, stroke=False)
-
-
-def _page_quote(c, W, H, quote_text: str, attribution: str, fonts: tuple):
-    """Render an inspirational quote interlude page."""
-    tf, bf, cf = fonts
-
-    # Soft background
-    _sf(c, _SB_IVORY)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    # Decorative border
-    _ss(c, _SB_GOLD)
-    c.setLineWidth(0.4)
-    c.roundRect(36, 36, W - 72, H - 72, 4, fill=False, stroke=True)
-    _ornament_corners(c, 42, 42, W - 84, H - 84, size=18, color=_SB_GOLD)
-
-    # Large decorative open-quote mark
-    _sf(c, (0.92, 0.90, 0.86))
-    c.setFont(bf, 120)
-    c.drawCentredString(W/2, H * 0.68, "\u201c")
-
-    # Quote text
-    _sf(c, _SB_NAVY)
-    c.setFont(tf, 14)
-    lines = quote_text.split("\n")
-    ty = H * 0.54
-    for line in lines:
-        c.drawCentredString(W/2, ty, line.strip())
-        ty -= 20
-
-    _divider(c, W/2, ty - 8, half_w=60, color=_SB_GOLD)
-
-    # Attribution
-    if attribution:
-        _sf(c, _SB_MUTED)
-        c.setFont(cf, 9)
-        c.drawCentredString(W/2, ty - 26, f"- {attribution}")
-
-
-# ── Content page layout styles ────────────────────────────────
-
-def _layout_hero(c, W, H, chap_title, items, page_num, fonts):
-    """Single stunning large photo."""
-    tf, bf, cf = fonts
-    item = items[0]
-    img = _fetch_img(item.get("img", ""))
-    cap = item.get("caption", "")
-    if cap == "\U0001f4f7": cap = ""
-    date_s = _format_date(item.get("date", ""))
-
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
-
-    _framed_photo(c, img, W/2, H/2 + 10, W * 0.72, H * 0.64,
-                  cap, date_s, angle=0, style="polaroid")
-
-
-def _layout_duo(c, W, H, chap_title, items, page_num, fonts):
-    """Two photos side by side, contrasting styles."""
-    tf, bf, cf = fonts
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
-
-    pw, ph = W * 0.40, H * 0.56
-    x1, x2 = W * 0.27, W * 0.73
-    cy = H * 0.47
-
-    style_pairs = [("polaroid", "tape"), ("clean", "vintage"), ("vintage", "polaroid")]
-    s1, s2 = style_pairs[page_num % len(style_pairs)]
-    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
-
-    for i, item in enumerate(items[:2]):
-        img = _fetch_img(item.get("img", ""))
-        cap = item.get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(item.get("date", ""))
-        _framed_photo(c, img, x1 if i == 0 else x2, cy, pw, ph,
-                      cap, date_s, angle=[-2.0, 1.8][i],
-                      style=s1 if i == 0 else s2, tape_color=tc)
-
-
-def _layout_trio(c, W, H, chap_title, items, page_num, fonts):
-    """One large featured photo top, two smaller below."""
-    tf, bf, cf = fonts
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
-    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
-
-    configs = [
-        (W/2,      H * 0.64, W * 0.54, H * 0.36, 0,    "magazine"),
-        (W * 0.28, H * 0.22, W * 0.36, H * 0.28, -1.5, "polaroid"),
-        (W * 0.72, H * 0.22, W * 0.36, H * 0.28, 1.5,  "tape"),
-    ]
-    for i, item in enumerate(items[:3]):
-        if i >= len(configs): break
-        cx, cy, pw, ph, angle, style = configs[i]
-        img = _fetch_img(item.get("img", ""))
-        cap = item.get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(item.get("date", ""))
-        _framed_photo(c, img, cx, cy, pw, ph, cap, date_s, angle, style,
-                      tape_color=tc)
-
-
-def _layout_grid(c, W, H, chap_title, items, page_num, fonts):
-    """2x2 grid with mixed frame styles."""
-    tf, bf, cf = fonts
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
-    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
-
-    pw, ph = W * 0.40, H * 0.35
-    x1, x2 = W * 0.27, W * 0.73
-    y_top, y_bot = H * 0.67, H * 0.29
-
-    style_sets = [
-        ["polaroid", "tape", "vintage", "clean"],
-        ["clean", "polaroid", "tape", "vintage"],
-        ["vintage", "clean", "polaroid", "tape"],
-    ]
-    styles = style_sets[page_num % len(style_sets)]
-    angles = [-1.0, 1.2, 1.0, -1.2]
-    positions = [(x1, y_top), (x2, y_top), (x1, y_bot), (x2, y_bot)]
-
-    for i, item in enumerate(items[:4]):
-        cx, cy = positions[i]
-        img = _fetch_img(item.get("img", ""))
-        cap = item.get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(item.get("date", ""))
-        _framed_photo(c, img, cx, cy, pw, ph, cap, date_s, angles[i],
-                      styles[i], tape_color=tc)
-
-
-def _layout_staggered(c, W, H, chap_title, items, page_num, fonts):
-    """Asymmetric: one tall left, two stacked right."""
-    tf, bf, cf = fonts
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
-    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
-
-    n = min(len(items), 3)
-    if n >= 1:
-        img = _fetch_img(items[0].get("img", ""))
-        cap = items[0].get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(items[0].get("date", ""))
-        _framed_photo(c, img, W * 0.30, H * 0.47, W * 0.42, H * 0.62,
-                      cap, date_s, angle=-0.8, style="polaroid")
-    if n >= 2:
-        img = _fetch_img(items[1].get("img", ""))
-        cap = items[1].get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(items[1].get("date", ""))
-        _framed_photo(c, img, W * 0.74, H * 0.62, W * 0.36, H * 0.30,
-                      cap, date_s, angle=1.5, style="tape", tape_color=tc)
-    if n >= 3:
-        img = _fetch_img(items[2].get("img", ""))
-        cap = items[2].get("caption", "")
-        if cap == "\U0001f4f7": cap = ""
-        date_s = _format_date(items[2].get("date", ""))
-        _framed_photo(c, img, W * 0.72, H * 0.26, W * 0.34, H * 0.28,
-                      cap, date_s, angle=-1.0, style="vintage")
-
-
-def _layout_magazine(c, W, H, chap_title, items, page_num, fonts):
-    """Magazine-style: large photo left, caption panel right."""
-    tf, bf, cf = fonts
-    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts, tint=_SB_CREAM)
-
-    item = items[0]
-    img = _fetch_img(item.get("img", ""))
-    cap = item.get("caption", "")
-    if cap == "\U0001f4f7": cap = ""
-    date_s = _format_date(item.get("date", ""))
-
-    # Large photo taking left 60%
-    _framed_photo(c, img, W * 0.33, H * 0.50, W * 0.52, H * 0.68,
-                  "", "", angle=0, style="magazine")
-
-    # Right side text panel
-    panel_x = W * 0.64
-    panel_w = W * 0.30
-
-    if date_s:
-        _sf(c, _SB_GOLD)
-        c.setFont(cf, 8)
-        c.drawString(panel_x, H * 0.68, date_s)
-        _sf(c, _SB_GOLD)
-        c.rect(panel_x, H * 0.66, 40, 0.5, fill=True, stroke=False)
-
-    if cap:
-        _sf(c, _SB_NAVY)
-        c.setFont(tf, 11)
-        lines = wrap(cap.strip(), int(panel_w / 6.5)) or [""]
-        ty = H * 0.62
-        for line in lines[:6]:
-            c.drawString(panel_x, ty, line)
-            ty -= 14
-
-    # Small decorative element
-    _divider(c, panel_x + panel_w/2, H * 0.30, half_w=35, color=_SB_GOLD)
-
-
-def _format_date(raw_d):
-    if not raw_d:
-        return ""
-    try:
-        dt = datetime.fromisoformat(raw_d.replace("Z", "+00:00"))
-        return dt.strftime("%b %Y")
-    except Exception:
-        return str(raw_d)[:7]
-
-
-def _page_photos(c, W, H, chap_title: str, items: list, page_num: int, fonts: tuple):
-    """Route to the best layout based on item count and page variety."""
-    n = len(items)
-    if n == 1:
-        # Alternate hero and magazine for single photos
-        if page_num % 3 == 0:
-            _layout_magazine(c, W, H, chap_title, items, page_num, fonts)
-        else:
-            _layout_hero(c, W, H, chap_title, items, page_num, fonts)
-    elif n == 2:
-        if page_num % 2 == 0:
-            _layout_duo(c, W, H, chap_title, items, page_num, fonts)
-        else:
-            _layout_staggered(c, W, H, chap_title, items, page_num, fonts)
-    elif n == 3:
-        if page_num % 2 == 0:
-            _layout_trio(c, W, H, chap_title, items, page_num, fonts)
-        else:
-            _layout_staggered(c, W, H, chap_title, items, page_num, fonts)
-    else:
-        _layout_grid(c, W, H, chap_title, items, page_num, fonts)
-
-
-def _page_back_cover(c, W, H, fonts: tuple):
-    tf, bf, cf = fonts
-    M = 28
-
-    _sf(c, _SB_NAVY)
-    c.rect(0, 0, W, H, fill=True, stroke=False)
-
-    _sf(c, _SB_GOLD)
-    c.rect(0, H - 52, W, 52, fill=True, stroke=False)
-    c.rect(0, 0, W, 40, fill=True, stroke=False)
-    _sf(c, _SB_CREAM)
-    c.rect(0, H - 54, W, 1, fill=True, stroke=False)
-    c.rect(0, 40, W, 1, fill=True, stroke=False)
-
-    _double_border(c, M, 44, W - 2*M, H - 100, gap=6, color=_SB_CREAM)
-    _ss(c, _SB_GOLD)
-    c.setLineWidth(0.5)
-    c.rect(M+10, 52, W - 2*M - 20, H - 116, fill=False, stroke=True)
-    _ornament_corners(c, M+14, 56, W - 2*M - 28, H - 124, size=20, color=_SB_GOLD)
-
-    _corner_flourish(c, M+20, H - 58, size=32, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, W-M-20, H - 58, size=32, flip_x=True, flip_y=True, color=_SB_GOLD)
-    _corner_flourish(c, M+20, 48, size=32, color=_SB_GOLD)
-    _corner_flourish(c, W-M-20, 48, size=32, flip_x=True, color=_SB_GOLD)
-
-    _sf(c, _SB_CREAM)
-    c.setFont(tf, 22)
-    c.drawCentredString(W/2, H/2 + 48, "Thank you")
-    c.setFont(tf, 15)
-    c.drawCentredString(W/2, H/2 + 24, "for the memories.")
-    _star_divider(c, W/2, H/2 + 6, half_w=80, color=_SB_GOLD)
-
-    _sf(c, (0.62, 0.60, 0.57))
-    c.setFont(cf, 9)
-    c.drawCentredString(W/2, H/2 - 16, "Every photo tells a story.")
-    c.drawCentredString(W/2, H/2 - 30, "Every story deserves to be remembered.")
+    for ref in dict.fromkeys([_sized_image_ref(url, max_px), url]):
+        data = _cached_image(ref)
+        if data:
+            return normalize_image(data, max_px)
+    return None
 
-    _divider(c, W/2, H/2 - 52, half_w=50, color=_SB_GOLD)
-    _sf(c, (0.55, 0.53, 0.50))
-    c.setFont(cf, 8)
-    c.drawCentredString(W/2, H/2 - 68, f"Generated {datetime.now().strftime('%B %Y')}")
+PDF_PREFETCH_WORKERS = 12
+# Prefetched image bytes held at once; anything past this is fetched by whoever draws its page
+PDF_PREFETCH_MAX_BYTES = 256 * 1024 * 1024
 
-    _sf(c, _SB_NAVY)
-    c.setFont(bf, 10)
-    c.drawCentredString(W/2, 14, "LiveOn")
+def _prefetch_pdf_images(photo_pages: list, W, H, workers: int = PDF_PREFETCH_WORKERS,
+                         max_bytes: int = PDF_PREFETCH_MAX_BYTES) -> None:
+    """
+    Download every image the photo pages will draw, concurrently and at the
+    size of its layout slot, and attach the bytes to its item as "_img_bytes".
+    Items whose download failed, or that are past the max_bytes budget, get
+    their signed "_img_urls" instead so the drawing side can try again.
+    photo_pages: [(items, page_num)] in draw order.
+    """
+    wanted = {}  # (img, px) -> [items]
+    for items, page_num in photo_pages:
+        for item, (fw, fh) in zip(items, LAYOUT_SLOTS[layout_for(len(items), page_num)]):
+            if item.get("img"):
+                wanted.setdefault((item["img"], slot_px(W * fw, H * fh)), []).append(item)
+    if not wanted:
+        return
+    held = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(wanted)))) as pool:
+        futures = {pool.submit(_download_img, img, px): (img, px) for img, px in wanted}
+        for fut in as_completed(futures):
+            try:
+                data = fut.result()
+            except Exception:
+                data = None
+            if not data or held + len(data) > max_bytes:
+                # Failed or over budget: whoever draws the page downloads it (again)
+                urls = _image_urls(*futures[fut])
+                for item in wanted[futures[fut]]:
+                    item["_img_urls"] = urls
+                continue
+            held += len(data)
+            for item in wanted[futures[fut]]:
+                item["_img_bytes"] = data
 
 
 # ── Main PDF assembler ─────────────────────────────────────────
 
 def build_pdf_bytes(classification, chapters, blob_folder, profile_summary, template="polaroid", user_name=None):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
     W, H = A4
-    fonts = _register_scrapbook_fonts()
 
     # Use provided name, fall back to blob path segment, then default
     if not user_name:
@@ -2558,15 +1826,14 @@ def build_pdf_bytes(classification, chapters, blob_folder, profile_summary, temp
     pdf_img_idx = _build_image_index(blob_folder)
 
     # ── Cover ──────────────────────────────────────────────────
-    _page_cover(c, W, H, user_name, profile_summary or "", active, fonts)
-    c.showPage()
+    plan = [("cover", user_name, profile_summary or "", active)]
 
     # ── Table of Contents ──────────────────────────────────────
     if active:
-        _page_toc(c, W, H, active, fonts)
-        c.showPage()
+        plan.append(("toc", active))
 
     # ── Chapters ───────────────────────────────────────────────
+    # Plan every page first so all photos can be fetched concurrently, then draw
     page_num = 1
     quote_idx = 0
     for chap_idx, chap in enumerate(active):
@@ -2575,15 +1842,13 @@ def build_pdf_bytes(classification, chapters, blob_folder, profile_summary, temp
             continue
 
         # Insert a quote interlude page between chapters (not before first)
-        if chap_idx > 0 and quote_idx < len(_MEMORY_QUOTES):
-            qt, attr = _MEMORY_QUOTES[quote_idx % len(_MEMORY_QUOTES)]
-            _page_quote(c, W, H, qt, attr, fonts)
-            c.showPage()
+        if chap_idx > 0 and quote_idx < len(MEMORY_QUOTES):
+            qt, attr = MEMORY_QUOTES[quote_idx % len(MEMORY_QUOTES)]
+            plan.append(("quote", qt, attr))
             quote_idx += 1
 
         # Chapter divider page
-        _page_chapter_title(c, W, H, chap, chap_idx + 1, fonts)
-        c.showPage()
+        plan.append(("chapter", chap, chap_idx + 1))
 
         # Collect displayable images (with blob index fallback)
         items = []
@@ -2621,25 +1886,25 @@ def build_pdf_bytes(classification, chapters, blob_folder, profile_summary, temp
             if remaining <= batch_size + 1:
                 batch_size = remaining
             batch = items[idx:idx + batch_size]
-            _page_photos(c, W, H, chap, batch, page_num, fonts)
-            c.showPage()
+            plan.append(("photos", chap, batch, page_num))
             page_num += 1
             idx += batch_size
             pat_pos += 1
 
     # ── Back cover ─────────────────────────────────────────────
-    _page_back_cover(c, W, H, fonts)
-    c.showPage()
+    plan.append(("back",))
 
-    c.save()
-    val = buffer.getvalue()
-    buffer.close()
-    return val
+    # Cover, TOC, each chapter and the back cover are drawn in parallel and merged. Fragments
+    # unchanged since an earlier build are reused, so only their pages' images get fetched.
+    return render_document(plan, prepare=lambda pages: _prefetch_pdf_images(
+        [(page[2], page[3]) for page in pages if page[0] == "photos"], W, H))
 
 @st.cache_data(show_spinner=False)
 def _build_pdf_cached(classification, chapters, blob_folder, profile_summary, template, _ck, user_name=None):
     return build_pdf_bytes(classification, chapters, blob_folder, profile_summary, template, user_name=user_name)
 
+# Whole-document key for _build_pdf_cached; on a miss, chapters whose pages are unchanged
+# still come from scrapbook_pdf's fragment cache
 def _scrapbook_ck(classification, chapters, blob_folder, template):
     raw = json.dumps([classification, chapters, blob_folder, template], sort_keys=True)
     return hashlib.sha256(raw.encode()).hexdigest()
@@ -2653,7 +1918,7 @@ if st.sidebar.button("🔄 Reload Posts"):
 _existing_paid = False
 _existing_pdf = False
 try:
-    _existing_paid = container_client.get_blob_client(f"{blob_folder}/.paid.scrapbook").exists()
+    _existing_paid = resolve_entitlements(container_client, blob_folder)["scrapbook"]
     _existing_pdf = container_client.get_blob_client(f"{blob_folder}/scrapbook.pdf").exists()
 except Exception:
     pass
@@ -2678,22 +1943,7 @@ if _existing_paid and _existing_pdf:
         # which would block at its own login gate.
         _sas = None
         try:
-            import re as _re
-            _conn = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
-            _m = _re.search(r"AccountName=([^;]+)", _conn or "")
-            _k = _re.search(r"AccountKey=([^;]+)", _conn or "")
-            if _m and _k:
-                from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-                from datetime import datetime as _dt, timedelta as _td
-                _sas_token = generate_blob_sas(
-                    account_name=_m.group(1),
-                    container_name=CONTAINER,
-                    blob_name=f"{blob_folder}/scrapbook.pdf",
-                    account_key=_k.group(1),
-                    permission=BlobSasPermissions(read=True),
-                    expiry=_dt.utcnow() + _td(minutes=30),
-                )
-                _sas = f"https://{_m.group(1)}.blob.core.windows.net/{CONTAINER}/{blob_folder}/scrapbook.pdf?{_sas_token}"
+            _sas = _signer().url(f"{blob_folder}/scrapbook.pdf", minutes=30)
         except Exception:
             pass
         st.success("✅ Your scrapbook is ready!")
@@ -4,23 +4,28 @@
 import streamlit as st
 import os
 import json
-import logging
 from datetime import datetime, timezone
-from azure.storage.blob import BlobServiceClient
 import requests
 import hashlib
 from pathlib import Path
-from urllib.parse import quote_plus
-import shutil, zipfile, concurrent.futures, random, uuid
+import uuid
 import time
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
-from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-from datetime import timedelta
-from datetime import timedelta
 import stripe
 import hmac, hashlib, base64
 import secrets as pysecrets
 from urllib.parse import urlencode
+from pages.utils.graph_api import GraphPager, GraphAPIError, graph_get, graph_prefetch
+from pages.utils.backup_checkpoint import BackupCheckpoint, checkpoint_blob_path
+from pages.utils.backup_manifest import backup_blob_names
+from pages.utils.sas import get_signer
+from pages.utils.blob_client import get_blob_service_client
+from pages.utils.entitlements import resolve_entitlements, invalidate_entitlements
+from pages.utils.blob_delete import start_prefix_delete, active_deletes
+from pages.utils.backup_catalog import load_catalog, save_catalog, remove_backup, scan_user_backups
+from pages.utils.backup_job import StatusWriter, read_status, status_is_live, STEP_LABELS
+from pages.utils.backup_worker import configure_logging, make_runner
 
 DEBUG = str(st.secrets.get("DEBUG", "false")).strip().lower() == "true"
 # SHOW_MEMORIES_BUTTON — enables the scrapbook / memories feature
@@ -34,13 +39,7 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-logger = logging.getLogger("liveon.app")
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
-    logger.addHandler(handler)
-logger.propagate = False
+logger = configure_logging()
 
 
 def log_event(event_type: str, success: bool, *, meta_user_id: str | None = None, **fields) -> None:
@@ -217,13 +216,6 @@ for key in ["fb_token", "fb_id", "fb_name"]:
     if key not in st.session_state:
         st.session_state[key] = None
 
-@st.cache_resource
-def get_blob_service_client():
-    AZ_CONN = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
-    if AZ_CONN:
-        return BlobServiceClient.from_connection_string(AZ_CONN)
-    return None
-
 if get_blob_service_client() is None:
     st.error("Missing AZURE_CONNECTION_STRING in Secrets. Set it in Streamlit Cloud → Settings → Secrets.")
     st.stop()
@@ -305,14 +297,13 @@ if BILLING_READY:
 # ---------------------------------------
 # Fb profile (ensures name/id in session)
 # ---------------------------------------
+ME_PROFILE = "me?fields=id,name"
+
 if "fb_token" in st.session_state and st.session_state["fb_token"]:
     try:
-        response = requests.get(
-            f"https://graph.facebook.com/me?fields=id,name&access_token={st.session_state['fb_token']}",
-            timeout=10
-        )
-        response.raise_for_status()
-        profile = response.json()
+        # /me and /me/permissions go out as one batch call; check_permission() reads the cached result
+        graph_prefetch(st.session_state["fb_token"], [ME_PROFILE, "me/permissions"])
+        profile = graph_get(st.session_state["fb_token"], ME_PROFILE, timeout=10)
         st.session_state["fb_id"] = str(profile.get("id")).strip()
         st.session_state["fb_name"] = profile.get("name")
         # NEW: persist token + minimal profile so refresh can restore (per-user file only)
@@ -490,6 +481,7 @@ def _write_entitlements(prefix: str, session) -> None:
     # markers (zero-byte files are fine)
     container_client.get_blob_client(f"{prefix}/.paid.memories").upload_blob(b"", overwrite=True)
     container_client.get_blob_client(f"{prefix}/.paid.download").upload_blob(b"", overwrite=True)
+    invalidate_entitlements(prefix)
     log_event(
         "entitlements_written",
         True,
@@ -680,40 +672,116 @@ CONTAINER = "backup"
 # REMOVED: Global BACKUP_DIR/IMG_DIR (caused data leakage)
 MAX_FB_PAGES = int(st.secrets.get("FB_MAX_PAGES", os.getenv("FB_MAX_PAGES", "1000")))
 DEFAULT_PAGE_SIZE = int(st.secrets.get("FB_PAGE_SIZE", os.getenv("FB_PAGE_SIZE", "100")))
-def fetch_data(endpoint, token, since=None, until=None, fields=None):
-    if endpoint is None: return {}
-    # add limit param
-    url = f"https://graph.facebook.com/me/{endpoint}?access_token={token}&limit={DEFAULT_PAGE_SIZE}"
-    if fields: url += f"&fields={fields}"
-    if since:  url += f"&since={since}"
-    if until:  url += f"&until={until}"
-
-    data, pages = [], 0
-    # remove hard 20-page cap; use high configurable max instead
-    while url and pages < MAX_FB_PAGES:
+# Photo pipeline concurrency (download → caption/upload overlap)
+DOWNLOAD_WORKERS = int(st.secrets.get("BACKUP_DOWNLOAD_WORKERS", os.getenv("BACKUP_DOWNLOAD_WORKERS", "8")))
+PER_HOST_CONNECTIONS = int(st.secrets.get("BACKUP_PER_HOST_CONNECTIONS", os.getenv("BACKUP_PER_HOST_CONNECTIONS", "6")))
+CAPTION_WORKERS = int(st.secrets.get("BACKUP_CAPTION_WORKERS", os.getenv("BACKUP_CAPTION_WORKERS", "5")))
+# VISION_MAX_TPS — Vision tier rate limit (S1: 10/s, F0: 20/min ≈ 0.33/s) for this server, all backups together
+VISION_MAX_TPS = float(st.secrets.get("VISION_MAX_TPS", os.getenv("VISION_MAX_TPS", "10")))
+UPLOAD_WORKERS = int(st.secrets.get("BACKUP_UPLOAD_WORKERS", os.getenv("BACKUP_UPLOAD_WORKERS", "4")))
+# Parallel block staging within a single large blob (ZIPs, big videos)
+BLOB_MAX_CONCURRENCY = int(st.secrets.get("BLOB_MAX_CONCURRENCY", os.getenv("BLOB_MAX_CONCURRENCY", "4")))
+# BACKUP_STREAMING — pipe fbcdn bodies straight into blob storage (no facebook_data/ staging dir)
+STREAM_BACKUP = str(
+    st.secrets.get("BACKUP_STREAMING", os.getenv("BACKUP_STREAMING", "false"))
+).strip().lower() in ("1", "true", "yes", "on")
+# BACKUP_RUNNER — "process" (default) or "thread"; BACKUP_WORKER_PROCESSES — concurrent backups per server
+BACKUP_RUNNER = str(st.secrets.get("BACKUP_RUNNER", os.getenv("BACKUP_RUNNER", "process"))).strip().lower()
+BACKUP_WORKER_PROCESSES = int(st.secrets.get("BACKUP_WORKER_PROCESSES", os.getenv("BACKUP_WORKER_PROCESSES", "2")))
+BACKUP_POLL_SECONDS = 2
+# The caption rate limiter is per process, so process workers split VISION_MAX_TPS between them
+CAPTION_TPS_PER_JOB = VISION_MAX_TPS / max(1, BACKUP_WORKER_PROCESSES) if BACKUP_RUNNER == "process" else VISION_MAX_TPS
+
+@st.cache_resource
+def get_backup_runner():
+    """One job runner per server process; backups run there instead of in the script thread."""
+    return make_runner(BACKUP_RUNNER, workers=BACKUP_WORKER_PROCESSES)
+
+def _submit_backup_job(token, user_id, name_slug, folder_prefix, base_prefix=None, resumed=False):
+    """Queue a backup run on the worker and switch this page to polling its status."""
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "token": token,
+        "user_id": user_id,
+        "name_slug": name_slug,
+        "prefix": folder_prefix,
+        "base_prefix": base_prefix,
+        "container": CONTAINER,
+        "stream": STREAM_BACKUP,
+        "debug": DEBUG,
+        "page_size": DEFAULT_PAGE_SIZE,
+        "max_pages": MAX_FB_PAGES,
+        "download_workers": DOWNLOAD_WORKERS,
+        "per_host": PER_HOST_CONNECTIONS,
+        "caption_workers": CAPTION_WORKERS,
+        "vision_max_tps": CAPTION_TPS_PER_JOB,
+        "upload_workers": UPLOAD_WORKERS,
+        "blob_max_concurrency": BLOB_MAX_CONCURRENCY,
+    }
+    queued = StatusWriter(container_client, user_id, job_id=job_id, prefix=folder_prefix)
+    queued.update(force=True)
+    job["queued_at"] = queued.state["queued_at"]
+    try:
         try:
-            response = requests.get(url, timeout=20)
-            response.raise_for_status()
-            res = response.json()
-            if "error" in res:
-                error_msg = res.get("error", {}).get("message", "Unknown Facebook API error")
-                st.warning(f"Skipping {endpoint}: {error_msg}")
-                break
-            data.extend(res.get("data", []))
-            url = res.get("paging", {}).get("next")
-            pages += 1
-        except requests.exceptions.RequestException as e:
-            st.warning(f"Network error on {endpoint}: {e}")
-            break
-        except Exception as e:
-            st.warning(f"Unexpected error on {endpoint}: {e}")
-            break
+            get_backup_runner().submit(job, _backup_job_secrets())
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM) and took the cached pool with it: start a fresh one
+            get_backup_runner.clear()
+            get_backup_runner().submit(job, _backup_job_secrets())
+    except Exception as e:
+        # Don't leave a "queued" status behind to block the next attempt
+        queued.update(force=True, state="failed", error=str(e), message=f"Backup failed: {e}")
+        log_event("backup_start_requested", False, meta_user_id=user_id, backup_prefix=folder_prefix, error=str(e))
+        st.error(f"❌ Couldn't start the backup: {e}. Please try again.")
+        return
+    log_event(
+        "backup_start_requested",
+        True,
+        meta_user_id=user_id,
+        backup_prefix=folder_prefix,
+        base_prefix=base_prefix,
+        resumed=resumed,
+    )
+    st.session_state.update({"backup_running": True, "backup_job_id": job_id, "show_creator": True})
+    # Enhanced toast notification
+    st.toast("🚀 Starting your backup… this can take several minutes. You'll see each step complete below.", icon="⏳")
+    st.rerun()
+
+def _backup_job_secrets() -> dict:
+    return {
+        "AZURE_CONNECTION_STRING": st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING"),
+        "AZURE_VISION_ENDPOINT": st.secrets.get("AZURE_VISION_ENDPOINT"),
+        "AZURE_VISION_KEY": st.secrets.get("AZURE_VISION_KEY"),
+    }
+
+def iter_data(endpoint, token, since=None, until=None, fields=None, start_url=None, on_page=None):
+    """
+    Yield /me/<endpoint> items as each page arrives; the next page is already in flight meanwhile.
+    `on_page(page_url)` is called before each page's items; `start_url` resumes from such a page.
+    """
+    if endpoint is None: return
+    pager = GraphPager(f"me/{endpoint}", token, fields=fields, limit=DEFAULT_PAGE_SIZE,
+                       max_pages=MAX_FB_PAGES, since=since, until=until, start_url=start_url)
+    try:
+        for page in pager:
+            if on_page:
+                on_page(pager.page_url)
+            yield from page
+    except GraphAPIError as e:
+        st.warning(f"Skipping {endpoint}: {e}")
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Network error on {endpoint}: {e}")
+    except Exception as e:
+        st.warning(f"Unexpected error on {endpoint}: {e}")
 
     # optional heads-up if you actually hit the max and still had a next page
-    if url and pages >= MAX_FB_PAGES:
+    if pager.truncated:
         st.warning(f"Stopped at FB_MAX_PAGES={MAX_FB_PAGES}. Increase FB_MAX_PAGES if you need more.")
 
-    return data
+def fetch_data(endpoint, token, since=None, until=None, fields=None):
+    if endpoint is None: return {}
+    return list(iter_data(endpoint, token, since=since, until=until, fields=fields))
 
 def check_permission(permission_name):
     """Check if specific permission is granted (cached in session)."""
@@ -729,8 +797,7 @@ def check_permission(permission_name):
         return False
         
     try:
-        r = requests.get(f"https://graph.facebook.com/me/permissions?access_token={token}", timeout=5)
-        data = r.json().get("data", [])
+        data = graph_get(token, "me/permissions", timeout=5).get("data", [])
         for p in data:
             if p.get("permission") == permission_name and p.get("status") == "granted":
                 st.session_state[cache_key] = True
@@ -765,96 +832,6 @@ def build_step_up_auth_url(additional_scopes, extra_state=None):
     }
     return "https://www.facebook.com/v18.0/dialog/oauth?" + urlencode(params)
 
-def save_json(obj, name, backup_dir: Path):
-    fp = backup_dir / f"{name}.json"
-    fp.write_text(json.dumps(obj, indent=2, ensure_ascii=False), encoding="utf-8")
-    return fp
-
-def upload_folder(backup_dir: Path, blob_prefix):
-    container = blob_service_client.get_container_client(CONTAINER)
-    try:
-        container.create_container()
-    except Exception:
-        pass
-
-    # Collect files first
-    files = []
-    for root, _, filenames in os.walk(backup_dir):
-        for file in filenames:
-            local_path = Path(root) / file
-            relative_path = str(local_path.relative_to(backup_dir))
-            blob_path = f"{blob_prefix}/{relative_path}".replace("\\", "/")
-            files.append((local_path, blob_path))
-
-    # Ensure posts+cap.json is uploaded LAST (this is what the worker should process)
-    def _order(t):
-        _, blob_path = t
-        return 1 if blob_path.endswith("posts+cap.json") else 0
-    files.sort(key=_order)
-
-    # Upload
-    for local_path, blob_path in files:
-        with open(local_path, "rb") as f:
-            container.get_blob_client(blob_path).upload_blob(f, overwrite=True)
-
-def download_image(url, name_id, img_dir: Path):
-    ext = url.split(".")[-1].split("?")[0]
-    if len(ext) > 5 or "/" in ext: ext = "jpg"
-    fname = f"{name_id}.{ext}"
-    local_path = img_dir / fname
-    r = requests.get(url, stream=True, timeout=10)
-    if r.status_code == 200:
-        with open(local_path, 'wb') as f: shutil.copyfileobj(r.raw, f)
-    else:
-        raise Exception(f"Image download failed: {r.status_code}")
-    return local_path
-
-def generate_blob_url(folder_prefix: str, image_name: str) -> str:
-    account_name = blob_service_client.account_name
-    return f"https://{account_name}.blob.core.windows.net/{CONTAINER}/{folder_prefix}/images/{quote_plus(image_name)}"
-
-def dense_caption(img_path):
-    # Validate required secrets
-    vision_endpoint = st.secrets.get("AZURE_VISION_ENDPOINT")
-    vision_key = st.secrets.get("AZURE_VISION_KEY")
-    
-    if not vision_endpoint or not vision_key:
-        return "No caption (Azure Vision API not configured)"
-    
-    endpoint = vision_endpoint.rstrip("/") + "/vision/v3.2/analyze?visualFeatures=Description,Tags,Objects"
-    headers = {"Ocp-Apim-Subscription-Key": vision_key, "Content-Type": "application/octet-stream"}
-    try:
-        with open(img_path, "rb") as f: data = f.read()
-        r = requests.post(endpoint, headers=headers, data=data, timeout=8)
-        r.raise_for_status()
-        result = r.json()
-        captions = (result.get("description", {}).get("captions") or [{}])
-        return captions[0].get("text", "") or ""
-    except requests.exceptions.Timeout:
-        return "No caption (timeout)"
-    except Exception as e:
-        return f"No caption (API error: {e})"
-
-def zip_backup(zip_name, backup_dir: Path, img_dir: Path):
-    zip_path = Path(zip_name)
-    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
-        # 1) summary.json at the root (if it exists)
-        summary_fp = backup_dir / "summary.json"
-        if summary_fp.exists():
-            zipf.write(summary_fp, arcname="summary.json")
-
-        # 2) everything under images/ (preserve folder structure)
-        # 2) everything under images/ (preserve folder structure)
-        if img_dir.exists():
-            for folder, _, files in os.walk(img_dir):
-                for file in files:
-                    fp = Path(folder) / file
-                    # arcname relative to BACKUP_DIR ensures "images/..." in the zip
-                    arcname = os.path.relpath(fp, backup_dir)
-                    zipf.write(fp, arcname)
-
-    return zip_path
-
 def extract_image_urls(post):
     urls = set()
     def add(url):
@@ -879,75 +856,79 @@ def _render_steps(ph, steps):
         lines.append(f"{icon} {s['label']}")
     ph.markdown("<div class='progress-steps'>" + "<br/>".join(lines) + "</div>", unsafe_allow_html=True)
 
+# estimate_remaining_time() names for each backup step
+_STEP_ESTIMATE_NAMES = ["Fetched posts", "Processed posts & captions", "Files prepared",
+                        "Uploaded backup folder", "ZIP uploaded", "Cleanup complete"]
+
+def _render_backup_progress(status: dict):
+    """Live view of a queued/running backup job, rebuilt from its status blob on every poll."""
+    started = status.get("started_at") or status.get("queued_at")
+    try:
+        elapsed = (datetime.now(timezone.utc) - datetime.fromisoformat(started)).total_seconds()
+    except Exception:
+        elapsed = 0
+    pct = int(status.get("progress") or 0)
+    steps = status.get("steps") or [{"label": label, "done": False} for label in STEP_LABELS]
+    last_done = max((i for i, s in enumerate(steps) if s.get("done")), default=0)
+    st.progress(pct, text=status.get("message") or "Working on your backup…")
+    st.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, pct, _STEP_ESTIMATE_NAMES[last_done])}")
+    with st.status("🔄 Working on your backup…", state="running", expanded=True):
+        _render_steps(st.empty(), steps)
+        for warning in status.get("warnings") or []:
+            st.warning(warning)
+    st.caption("💡 The backup keeps running on our servers even if you close this tab.")
+
 # ---------- Backup prefix helpers ----------
+def list_user_backups(user_id: str) -> list[dict]:
+    """Catalog entries ({"id": prefix, "summary": {...}}) newest first; one small read once the catalog exists."""
+    entries = load_catalog(container_client, user_id)
+    if entries is not None:
+        return entries
+    entries = scan_user_backups(container_client, user_id)
+    try:
+        save_catalog(container_client, user_id, entries)
+    except Exception:
+        pass  # listed again next time
+    return entries
+
 def list_user_backup_prefixes(user_id: str):
-    prefixes = {}
-    for blob in container_client.list_blobs(name_starts_with=f"{user_id}/"):
-        parts = blob.name.split("/")
-        if len(parts) < 3:
-            continue
-        uid, folder, filename = parts[0], parts[1], "/".join(parts[2:])
-        if uid != user_id or folder.startswith("projects/"):
-            continue
-        pfx = f"{uid}/{folder}"
-        rec = prefixes.setdefault(pfx, {"has_summary": False, "has_posts": False, "ts": None})
-        if filename == "summary.json":
-            try:
-                raw = container_client.get_blob_client(blob.name).download_blob().readall().decode("utf-8")
-                summary = json.loads(raw)
-                ts = summary.get("timestamp")
-                if ts:
-                    rec["ts"] = datetime.fromisoformat(ts)
-                else:
-                    rec["ts"] = getattr(blob, "last_modified", datetime.now(timezone.utc))
-            except Exception:
-                rec["ts"] = getattr(blob, "last_modified", datetime.now(timezone.utc))
-            rec["has_summary"] = True
-    valid = []
-    for pfx, info in prefixes.items():
-        if info["has_summary"]:
-            valid.append((pfx, info["ts"] or datetime.now(timezone.utc)))
-    valid.sort(key=lambda x: x[1], reverse=True)
-    return [p for p, _ in valid]
+    return [e["id"] for e in list_user_backups(user_id)]
 
 def _delete_prefix_silent(prefix: str):
     try:
-        to_delete = list(container_client.list_blobs(name_starts_with=f"{prefix}/"))
-        for b in to_delete:
-            try:
-                container_client.get_blob_client(b.name).delete_blob(delete_snapshots="include")
-            except Exception:
-                if DEBUG:
-                    st.write(f"Silent delete error for {b.name}")
+        remove_backup(container_client, prefix.split("/", 1)[0], prefix)
+    except Exception:
+        pass
+    try:
+        # Batched and in the background; the rerun doesn't wait for it
+        start_prefix_delete(container_client, prefix)
     except Exception as e:
         if DEBUG:
             st.write(f"Silent delete failed: {e}")
 
-def enforce_single_backup(user_id: str):
-    prefixes = list_user_backup_prefixes(user_id)
-    if len(prefixes) <= 1:
-        return
-    for pfx in prefixes[1:]:
-        _delete_prefix_silent(pfx)
+def enforce_single_backup(user_id: str) -> list[dict]:
+    """Delete all but the newest backup; returns the remaining catalog entries."""
+    entries = list_user_backups(user_id)
+    for entry in entries[1:]:
+        _delete_prefix_silent(entry["id"])
+    return entries[:1]
 
 def delete_backup_prefix(prefix: str):
     try:
-        # 1. List all blobs fast
-        to_delete = list(container_client.list_blobs(name_starts_with=f"{prefix}/"))
-        
-        if not to_delete:
-            return
+        # Drop it from the catalog first so the listing never shows a half-deleted backup
+        try:
+            remove_backup(container_client, prefix.split("/", 1)[0], prefix)
+        except Exception:
+            pass
 
-        # 2. Parallel delete (Dramatic speedup)
-        def _del_blob(b):
-            try:
-                container_client.get_blob_client(b.name).delete_blob(delete_snapshots="include")
-            except Exception:
-                pass
+        # 1-2. Batch-delete every blob under the prefix in the background (256 per request);
+        # summary.json goes first, so the folder is no longer a backup by the time we rerun
+        start_prefix_delete(container_client, prefix)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            # Submit all delete tasks at once
-            list(executor.map(_del_blob, to_delete))
+        # A run that died after writing summary.json can leave its checkpoint behind
+        ckpt = BackupCheckpoint.load(container_client, checkpoint_blob_path(prefix.split("/", 1)[0]))
+        if ckpt and ckpt.prefix.rstrip("/") == prefix.rstrip("/"):
+            ckpt.clear()
 
         # 3. Cleanup session state
         lb = st.session_state.get("latest_backup")
@@ -986,87 +967,18 @@ def delete_backup_prefix(prefix: str):
 def _memories_is_paid(prefix: str) -> bool:
     """
     Returns True if this backup prefix is paid for Memories.
-    Looks for:
-      - entitlements.json  (preferred)
-      - project_meta.json  (legacy)
-      - tiny marker files: .paid.memories / .paid / paid.flag  (fallback)
+    Looks for entitlements.json (preferred), project_meta.json (legacy) and
+    the .paid.memories / .paid / paid.flag markers — see utils/entitlements.py.
     """
-    try:
-        # Preferred: entitlements.json
-        bc = container_client.get_blob_client(f"{prefix}/entitlements.json")
-        if bc.exists():
-            try:
-                ent = json.loads(bc.download_blob().readall().decode("utf-8"))
-            except Exception:
-                ent = {}
-            if bool(
-                ent.get("memories") or
-                ent.get("download") or
-                ent.get("is_paid") or
-                ent.get("paid")
-            ):
-                return True
-
-        # Legacy JSON
-        for name in ("project_meta.json", "project_meta.json.json"):
-            bc = container_client.get_blob_client(f"{prefix}/{name}")
-            if bc.exists():
-                try:
-                    meta = json.loads(bc.download_blob().readall().decode("utf-8"))
-                except Exception:
-                    meta = {}
-                if bool(
-                    meta.get("is_paid") or
-                    meta.get("paid") or
-                    (meta.get("entitlements", {}) or {}).get("memories")
-                ):
-                    return True
-
-        # Fallback marker files (zero-byte files are fine)
-        for name in (".paid.memories", ".paid", "paid.flag"):
-            if container_client.get_blob_client(f"{prefix}/{name}").exists():
-                return True
-    except Exception:
-        pass
-    return False
+    return resolve_entitlements(container_client, prefix)["memories"]
 
 def _download_is_paid(prefix: str) -> bool:
-    """
-    True if user is entitled to DOWNLOAD this backup.
-    Looks for:
-      - entitlements.json with download/is_paid/paid flags
-      - marker files: .paid.download / .paid.memories / .paid / paid.flag
-    """
-    try:
-        bc = container_client.get_blob_client(f"{prefix}/entitlements.json")
-        if bc.exists():
-            try:
-                ent = json.loads(bc.download_blob().readall().decode("utf-8"))
-            except Exception:
-                ent = {}
-            if bool(ent.get("download") or ent.get("is_paid") or ent.get("paid")):
-                return True
-
-        for name in (".paid.download", ".paid.memories", ".paid", "paid.flag"):
-            if container_client.get_blob_client(f"{prefix}/{name}").exists():
-                return True
-    except Exception:
-        pass
-    return False
+    """True if user is entitled to DOWNLOAD this backup."""
+    return resolve_entitlements(container_client, prefix)["download"]
 
 def _scrapbook_is_paid(prefix: str) -> bool:
     """Check if user has paid for the scrapbook PDF."""
-    try:
-        if container_client.get_blob_client(f"{prefix}/.paid.scrapbook").exists():
-            return True
-        bc = container_client.get_blob_client(f"{prefix}/scrapbook_entitlements.json")
-        if bc.exists():
-            ent = json.loads(bc.download_blob().readall().decode("utf-8"))
-            if bool(ent.get("scrapbook") or ent.get("paid")):
-                return True
-    except Exception:
-        pass
-    return False
+    return resolve_entitlements(container_client, prefix)["scrapbook"]
 
 def _scrapbook_pdf_exists(prefix: str) -> bool:
     """Check if a pre-built scrapbook PDF exists in blob storage."""
@@ -1087,23 +999,9 @@ def _sas_url_for_blob(blob_path: str, minutes: int = 20, download_as: str | None
     """
     try:
         conn = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
-        parts = dict(p.split("=", 1) for p in conn.split(";") if "=" in p)
-        account_name = parts.get("AccountName") or blob_service_client.account_name
-        account_key = parts.get("AccountKey")
-        if not account_key:
-            return None  # connection string doesn't carry a key (e.g., SAS-based)
-        sas_kwargs = dict(
-            account_name=account_name,
-            container_name=CONTAINER,
-            blob_name=blob_path,
-            account_key=account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(minutes=minutes),
-        )
-        if download_as:
-            sas_kwargs["content_disposition"] = f'attachment; filename="{download_as}"'
-        sas = generate_blob_sas(**sas_kwargs)
-        return f"https://{account_name}.blob.core.windows.net/{CONTAINER}/{blob_path}?{sas}"
+        # Shared signer: the connection string is parsed once and tokens are reused
+        signer = get_signer(conn, CONTAINER, service_client=blob_service_client)
+        return signer.url(blob_path, minutes=minutes, download_as=download_as)
     except Exception:
         return None
 
@@ -1131,33 +1029,60 @@ with backup_loading_ph.container():
 backups = []
 try:
     user_id = str(st.session_state["fb_id"]).strip()
-    enforce_single_backup(user_id)
-    prefixes = list_user_backup_prefixes(user_id)
-    if prefixes:
-        pfx = prefixes[0]
-        summary_blob = container_client.get_blob_client(f"{pfx}/summary.json")
-        if summary_blob.exists():
-            try:
-                summary = json.loads(summary_blob.download_blob().readall().decode("utf-8"))
-                created_dt = datetime.fromisoformat(summary.get("timestamp", "2000-01-01"))
-                backups.append({
-                    "id": pfx,
-                    "name": summary.get("user") or pfx.split("/", 1)[1].replace("_", " "),
-                    "date": created_dt.strftime("%b %d, %Y"),
-                    "posts": summary.get("posts", 0),
-                    "status": "Completed",
-                    "raw_date": created_dt
-                })
-            except Exception:
-                pass
+    entries = enforce_single_backup(user_id)
+    if entries:
+        pfx, summary = entries[0]["id"], entries[0].get("summary") or {}
+        try:
+            created_dt = datetime.fromisoformat(summary.get("timestamp", "2000-01-01"))
+            backups.append({
+                "id": pfx,
+                "name": summary.get("user") or pfx.split("/", 1)[1].replace("_", " "),
+                "date": created_dt.strftime("%b %d, %Y"),
+                "posts": summary.get("posts", 0),
+                "status": "Completed",
+                "raw_date": created_dt
+            })
+        except Exception:
+            pass
     has_backup = len(backups) == 1
 except Exception as e:
     st.error(f"Azure connection error: {e}")
     has_backup = False
 
+# Background backup job for this user: queued / running, or just finished
+backup_status = read_status(container_client, str(fb_id).strip()) if fb_id else None
+st.session_state["backup_running"] = status_is_live(backup_status)
+if st.session_state["backup_running"]:
+    st.session_state["show_creator"] = True
+    # summary.json is written mid-run; don't list the half-built backup yet
+    backups = [b for b in backups if b["id"] != backup_status.get("prefix")]
+    has_backup = len(backups) == 1
+elif backup_status and backup_status.get("job_id") == st.session_state.get("backup_job_id"):
+    # The job this session started is over
+    st.session_state.pop("backup_job_id", None)
+    if backup_status.get("state") == "complete":
+        latest_backup = backup_status.get("latest_backup") or {}
+        cache_file = ensure_cache_dir() / f"backup_cache_{hashlib.md5(fb_token.encode()).hexdigest()}.json"
+        with open(cache_file, "w", encoding="utf-8") as f:
+            json.dump({"fb_token": fb_token, "latest_backup": latest_backup, "new_backup_done": True}, f, indent=2)
+        st.session_state.update({
+            "new_backup_done": True,
+            "latest_backup": latest_backup,
+            "show_creator": False,
+        })
+        st.toast("🎉 Backup complete! Your scrapbook is ready to preview.", icon="🎉")
+    else:
+        reason = backup_status.get("error") or "the backup worker stopped responding"
+        st.error(f"❌ Backup failed: {reason}. Start it again to pick up where it stopped.")
+
 # Clear skeleton loading
 backup_loading_ph.empty()
 
+# Deletions still finishing in the background
+if fb_id:
+    for task in active_deletes(f"{str(fb_id).strip()}/"):
+        st.caption(f"🗑️ Removing {task.prefix}… {task.progress}%")
+
 # If we just finished a backup, inject it (defensive)
 if st.session_state.pop("new_backup_done", False):
     latest = st.session_state.pop("latest_backup", None)
@@ -1189,6 +1114,19 @@ if not st.session_state["show_creator"]:
     with left_btn_col:
         if has_backup:
             st.info("You already have one backup. Delete it below to create a new one.")
+            # Incremental update: a new backup that carries this one over and only fetches newer photos
+            pending = BackupCheckpoint.load(container_client, checkpoint_blob_path(str(fb_id).strip()))
+            label = "⏯️ Resume adding new photos" if pending else "🔄 Add new photos"
+            if st.button(label, use_container_width=True, key="incremental_backup_btn",
+                         help="Creates an updated backup with photos added since this one; existing photos are copied over, not downloaded again."):
+                name_slug = (fb_name or "user").replace(" ", "_")
+                if pending:
+                    new_prefix, base = pending.prefix, pending.state.get("base_prefix")
+                else:
+                    new_prefix = f"{str(fb_id).strip()}/{name_slug}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
+                    base = backups[0]["id"]
+                _submit_backup_job(fb_token, str(fb_id).strip(), name_slug, new_prefix,
+                                   base_prefix=base, resumed=bool(pending))
         else:
             if st.button("＋ New Backup", type="primary", use_container_width=True, key="new_backup_btn"):
                 st.session_state["show_creator"] = True
@@ -1199,7 +1137,7 @@ else:
     # Clear upfront warning about duration
     st.info(
         "Heads up: Creating your backup can take **several minutes**. "
-        "Please keep this tab open; you'll see live progress below."
+        "It runs in the background, so you can leave and come back; you'll see live progress below."
     )
     st.caption("📸 **Initial backup includes your photos.** Posts permission will be requested later when you create your storybook.")
 
@@ -1208,17 +1146,22 @@ else:
     <ol><li><strong>Click "Start My Backup"</strong></li></ol>
     <em>Large backups may take several minutes.</em></div>""", unsafe_allow_html=True)
 
+    if st.session_state.get("backup_running"):
+        # Poll the worker's status blob until the job finishes (summary.json lands mid-run,
+        # so this has to come before the has_backup check)
+        _render_backup_progress(backup_status)
+        time.sleep(BACKUP_POLL_SECONDS)
+        st.rerun()
+
     if has_backup:
         st.warning("You already have an active backup. Delete it first.")
     else:
         token = st.session_state["fb_token"]
         try:
-            response = requests.get(f"https://graph.facebook.com/me?fields=id,name&access_token={token}", timeout=10)
-            response.raise_for_status()
-            fb_profile = response.json()
+            fb_profile = graph_get(token, ME_PROFILE, timeout=10)
             fb_name_slug = (fb_profile.get("name", "user") or "user").replace(" ", "_")
             fb_id_val = fb_profile.get("id")
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, GraphAPIError) as e:
             if DEBUG:
                 st.error(f"Failed to fetch Facebook profile: {e}")
                 st.code(f"Debug info: Token length={len(token)}")
@@ -1233,7 +1176,10 @@ else:
                 st.error(f"Unexpected error fetching profile: {e}")
             st.stop()
         folder_prefix = f"{fb_id_val}/{fb_name_slug}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
-
+        # An interrupted run left a checkpoint behind: resume it into the same folder
+        checkpoint = BackupCheckpoint.load(container_client, checkpoint_blob_path(fb_id_val))
+        if checkpoint:
+            folder_prefix = checkpoint.prefix
 
         start_disabled = st.session_state.get("backup_running", False)
 
@@ -1260,213 +1206,17 @@ else:
             st.caption("🔒 We'll redirect you to Facebook to approve photo access, then bring you right back here.")
 
         else:
-            if st.button("⬇️ Start My Backup", disabled=start_disabled):
-                st.session_state["backup_running"] = True
-                backup_start_time = time.time()
-                log_event(
-                    "backup_start_requested",
-                    True,
-                    meta_user_id=fb_id_val,
-                    backup_prefix=folder_prefix,
-                )
-            
-                # --- SECURITY FIX: ISOLATE DATA ---
-                # Create a unique directory for this specific backup session
-                session_id = str(uuid.uuid4())
-                session_backup_dir = Path("facebook_data") / session_id
-                session_img_dir = session_backup_dir / "images"
-                session_backup_dir.mkdir(parents=True, exist_ok=True)
-                session_img_dir.mkdir(parents=True, exist_ok=True)
-                # ----------------------------------
-
-                # Enhanced toast notification
-                st.toast("🚀 Starting your backup… this can take several minutes. Please keep this tab open.", icon="⏳")
-                st.caption("💡 Tip: Don't close this browser tab while we work. You'll see each step complete below.")
-
-                # Enhanced progress with time estimation
-                overall = st.progress(0, text="Preparing to start… (estimated time: 2-5 minutes)")
-                time_estimate_ph = st.empty()
-
-                with st.status("🔄 Working on your backup…", state="running", expanded=True) as status:
-                    steps = [
-                        {"label": "Fetched photos", "done": False},
-                        {"label": "Processed photos", "done": False},
-                        {"label": "Files prepared", "done": False},
-                        {"label": "Uploaded backup folder", "done": False},
-                        {"label": "ZIP uploaded", "done": False},
-                        {"label": "Cleanup complete", "done": False},
-                    ]
-                    step_ph = st.empty()
-                    _render_steps(step_ph, steps)
-
-                    steps[0]["active"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 20, 'Fetched posts')}")
-                    
-                    # Stage 1: Fetch photos only (no posts permission needed yet)
-                    # Try photos/uploaded first (more reliable for user-uploaded photos)
-                    photos = fetch_data("photos/uploaded", token, fields="id,created_time,images,name")
-                    
-                    # Fallback to regular photos endpoint if uploaded returns nothing
-                    if len(photos) == 0:
-                        st.info("📸 No uploaded photos found, trying all photos...")
-                        photos = fetch_data("photos", token, fields="id,created_time,images,name")
-                    
-                    # Debug: Log photo fetch results
-                    if DEBUG or len(photos) == 0:
-                        st.warning(f"📊 Debug: Fetched {len(photos)} photos from Facebook API")
-                        if len(photos) == 0:
-                            st.error("⚠️ No photos were returned from Facebook. This could be due to: 1) No photos in your account, 2) Missing permissions, or 3) API access issues.")
-                            log_event(
-                                "backup_no_photos_found",
-                                False,
-                                meta_user_id=fb_id_val,
-                                backup_prefix=folder_prefix,
-                            )
-                    
-                    # Convert photos to post-like format for compatibility
-                    posts = []
-                    for photo in photos:
-                        # Extract image URLs from photo
-                        image_urls = []
-                        if isinstance(photo.get("images"), list):
-                            # Get the largest image
-                            largest = max(photo.get("images", []), key=lambda x: x.get("width", 0) * x.get("height", 0), default={})
-                            if largest.get("source"):
-                                image_urls.append(largest["source"])
-                        
-                        if image_urls:
-                            posts.append({
-                                "id": photo.get("id"),
-                                "created_time": photo.get("created_time"),
-                                "message": photo.get("name", ""),
-                                "images": image_urls,
-                                "full_picture": image_urls[0] if image_urls else None,
-                                "is_photo": True  # Flag to indicate this came from photos, not posts
-                            })
-                    
-                    save_json(posts, "posts", session_backup_dir)
-                    steps[0]["active"] = False; steps[0]["done"] = True; _render_steps(step_ph, steps)
-                    
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(20, text=f"✅ Fetched {len(posts)} photos")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 20, 'Fetched posts')}")
-
-                    steps[1]["active"] = True; _render_steps(step_ph, steps)
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                        futures = []
-                        for post in posts:
-                            # Safe array access: get first image if images array exists and is not empty
-                            img_url = post.get("images")[0] if post.get("images") else None
-                            if not img_url:
-                                continue
-                            try:
-                                # Generate fallback ID if post doesn't have one
-                                post_id = post.get("id", hashlib.md5(f"{post.get('message','')}{img_url}".encode()).hexdigest()[:12])
-                                img_path = download_image(img_url, post_id, session_img_dir)
-                                futures.append((post, executor.submit(dense_caption, img_path)))
-                                signed_url = generate_blob_url(folder_prefix, Path(img_path).name)
-                                post["picture"] = signed_url
-                                post.setdefault("images", [])
-                                if signed_url not in post["images"]:
-                                    post["images"].insert(0, signed_url)
-                            except Exception as e:
-                                post["picture"] = "download failed"
-                                post["context_caption"] = f"Image download failed: {e}"
-
-                        total = max(1, len(futures))
-                        done_count = 0
-                        for post, fut in futures:
-                            try:
-                                post["context_caption"] = fut.result()
-                            except Exception:
-                                post["context_caption"] = "caption failed"
-                            done_count += 1
-                            pct = 20 + int(25 * (done_count / total))
-                            elapsed = time.time() - backup_start_time
-                            remaining = estimate_remaining_time(elapsed, pct, 'Processed posts & captions')
-                            overall.progress(pct, text=f"🖼️ Processing images & captions… ({done_count}/{total})")
-                            time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {remaining}")
-
-                    steps[1]["active"] = False; steps[1]["done"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(45, text="✅ Images & captions processed")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 45, 'Processed posts & captions')}")
-
-                    steps[2]["active"] = True; _render_steps(step_ph, steps)
-                    summary = {"user": fb_name_slug, "user_id": fb_id_val, "timestamp": datetime.now(timezone.utc).isoformat(), "posts": len(posts), "photos": len(posts), "backup_type": "photos_only"}
-                    save_json(summary, "summary", session_backup_dir)
-                    steps[2]["active"] = False; steps[2]["done"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(60, text="✅ Files prepared")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 60, 'Files prepared')}")
-
-                    steps[3]["active"] = True; _render_steps(step_ph, steps)
-                    upload_folder(session_backup_dir, folder_prefix)
-
-                    steps[3]["active"] = False; steps[3]["done"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(80, text="✅ Uploaded backup folder")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 80, 'Uploaded backup folder')}")
-
-                    steps[4]["active"] = True; _render_steps(step_ph, steps)
-                    zip_path = zip_backup(f"{fb_name_slug}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip", session_backup_dir, session_img_dir)
-                    with open(zip_path, "rb") as f:
-                        container = blob_service_client.get_container_client(CONTAINER)
-                        container.get_blob_client(f"{folder_prefix}/{zip_path.name}").upload_blob(f, overwrite=True)
-                    steps[4]["active"] = False; steps[4]["done"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(90, text="✅ ZIP uploaded")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 90, 'ZIP uploaded')}")
-
-                    steps[5]["active"] = True; _render_steps(step_ph, steps)
-                    
-                    # Cleanup unique directory
-                    try:
-                        shutil.rmtree(session_backup_dir)
-                        if zip_path.exists():
-                            zip_path.unlink()
-                    except Exception:
-                        pass
-                    
-                    steps[5]["active"] = False; steps[5]["done"] = True; _render_steps(step_ph, steps)
-                    elapsed = time.time() - backup_start_time
-                    overall.progress(95, text="✅ Cleanup complete")
-                    time_estimate_ph.caption(f"⏱️ Elapsed: {int(elapsed)}s | Estimated remaining: {estimate_remaining_time(elapsed, 95, 'Cleanup complete')}")
-
-                    cache_file = ensure_cache_dir() / f"backup_cache_{hashlib.md5(token.encode()).hexdigest()}.json"
-                    latest_backup = {
-                        "Name": fb_name_slug,
-                        "Created On": datetime.now().strftime("%b %d, %Y"),
-                        "# Posts": len(posts),
-                        "Folder": folder_prefix.rstrip("/"),
-                        "user_id": fb_id_val
-                    }
-                    with open(cache_file, "w", encoding="utf-8") as f:
-                        json.dump({"fb_token": token, "latest_backup": latest_backup, "new_backup_done": True}, f, indent=2)
-
-                    total_time = time.time() - backup_start_time
-                    overall.progress(100, text="🎉 Backup complete!")
-                    time_estimate_ph.caption(f"⏱️ Total time: {int(total_time)}s")
-                    log_event(
-                        "backup_completed",
-                        True,
-                        meta_user_id=fb_id_val,
-                        backup_prefix=folder_prefix,
-                        posts=len(posts),
-                        total_seconds=int(total_time),
-                    )
-                    status.update(label="🎉 Backup complete!", state="complete")
-                    st.toast("🎉 Backup complete! Your scrapbook is ready to preview.", icon="🎉")
-
-                st.session_state.update({
-                    "fb_token": token,
-                    "new_backup_done": True,
-                    "latest_backup": latest_backup,
-                    "show_creator": False,
-                    "backup_running": False,
-                })
-                st.rerun()   # CHANGED
+            if checkpoint and not start_disabled:
+                st.info(f"⏯️ Your last backup was interrupted after {len(checkpoint.done)} photos. Starting again picks up where it left off.")
+                if st.button("Discard it and start fresh", key="discard_checkpoint"):
+                    checkpoint.clear()
+                    _delete_prefix_silent(checkpoint.prefix)
+                    st.rerun()
+
+            if st.button("⬇️ Resume My Backup" if checkpoint else "⬇️ Start My Backup", disabled=start_disabled):
+                _submit_backup_job(token, fb_id_val, fb_name_slug, folder_prefix,
+                                   base_prefix=checkpoint.state.get("base_prefix") if checkpoint else None,
+                                   resumed=bool(checkpoint))
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -1506,10 +1256,11 @@ if backups:
             # Try to find a .zip under this backup prefix; fall back to the JSON if not found
             zip_blob_path, zip_name = None, None
             try:
-                for b in container_client.list_blobs(name_starts_with=f"{backup['id']}/"):
-                    if b.name.lower().endswith(".zip"):
-                        zip_blob_path = b.name
-                        zip_name = b.name.rsplit("/", 1)[-1]
+                for name in backup_blob_names(container_client, backup["id"]):
+                    # only the backup ZIP at the prefix root (downloads/ holds curated copies)
+                    if name.lower().endswith(".zip") and "/" not in name[len(backup['id']) + 1:]:
+                        zip_blob_path = name
+                        zip_name = name.rsplit("/", 1)[-1]
                         break
             except Exception:
                 pass
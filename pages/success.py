@@ -1,8 +1,11 @@
-import os, io, json, hashlib, zipfile
+import os, json, hashlib
 from pathlib import Path
 import streamlit as st
-from azure.storage.blob import BlobServiceClient
 import stripe
+from pages.utils.zip_stream import zip_blobs_to_blob
+from pages.utils.thumbs import is_thumb_path
+from pages.utils.sas import get_signer
+from pages.utils.blob_client import get_blob_service_client
 
 st.set_page_config(page_title="Payment Success", page_icon="✅")
 
@@ -22,6 +25,10 @@ AZ_CONN = st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTI
 STRIPE_SECRET_KEY = st.secrets.get("STRIPE_SECRET_KEY") or os.getenv("STRIPE_SECRET_KEY")
 if STRIPE_SECRET_KEY:
     stripe.api_key = STRIPE_SECRET_KEY
+# Upcoming image blobs fetched in parallel while the ZIP is assembled
+ZIP_PREFETCH = int(st.secrets.get("ZIP_PREFETCH", os.getenv("ZIP_PREFETCH", "8")))
+# Largest archive we'll pass through st.download_button when no SAS can be signed
+INLINE_DOWNLOAD_MAX_BYTES = 200 * 1024 * 1024
 
 # Query params from success_url
 blob_rel_path = st.query_params.get("blob", "")      # e.g. "<prefix>/posts+cap.json" or "<prefix>/something.zip"
@@ -57,58 +64,125 @@ else:
 
 # Connect to Azure
 try:
-    bsc = BlobServiceClient.from_connection_string(AZ_CONN)
+    bsc = get_blob_service_client()
+    if bsc is None:
+        raise RuntimeError("AZURE_CONNECTION_STRING is not set")
     cc  = bsc.get_container_client("backup")
 except Exception as e:
     st.error(f"Azure connection failed: {e}")
     st.stop()
 
-# Build curated ZIP (only images/ + profile.json)
+# Force the outgoing filename to .zip, set a nice default if missing
+if not download_name:
+    download_name = prefix.replace("/", "_") + "_images_profile.zip"
+if not download_name.lower().endswith(".zip"):
+    download_name = download_name.rsplit(".", 1)[0] + ".zip"
+
+# Build curated ZIP (only images/ + profile.json) server-side: images are streamed
+# blob → archive and the archive is staged straight into a block blob, so the
+# assembly needs constant memory no matter how big the backup is.
 images_prefix = f"{prefix}/images/"
 profile_blob  = f"{prefix}/profile.json"
+curated_blob  = f"{prefix}/downloads/{download_name.replace('/', '_')}"
+
+extras = {}
+# arcname -> etag of every blob the curated ZIP is built from; a prebuilt ZIP is
+# reused only if it was built from exactly this set
+source_etags = {}
+# False once a source couldn't be read; such a ZIP is never reused
+sources_complete = True
+
+# Add profile.json (if present)
+try:
+    bc_profile = cc.get_blob_client(profile_blob)
+    if bc_profile.exists():
+        downloader = bc_profile.download_blob()
+        extras["profile.json"] = downloader.readall()
+        source_etags["profile.json"] = getattr(downloader.properties, "etag", None)
+    else:
+        extras["profile.json"] = json.dumps({"warning": "profile.json not found"}, indent=2)
+except Exception as e:
+    extras["profile.json"] = json.dumps({"error": f"could not fetch profile.json: {e}"}, indent=2)
+    sources_complete = False
+
+# Add all images/* under this prefix
+entries = []
+try:
+    for blob in cc.list_blobs(name_starts_with=images_prefix):
+        if is_thumb_path(blob.name):
+            continue  # derived display copies, not part of the download
+        entries.append((blob.name, blob.name[len(prefix)+1:]))  # keep "images/..." inside the zip
+        source_etags[blob.name[len(prefix)+1:]] = getattr(blob, "etag", None)
+except Exception as e:
+    extras["images/README.txt"] = f"Could not list images: {e}"
+    sources_complete = False
+
+# Digest of the entry-name/etag set, stored in the ZIP blob's metadata (the set itself can outgrow the 8 KB limit)
+sources_digest = hashlib.sha256(json.dumps(sorted(source_etags.items())).encode("utf-8")).hexdigest()
 
-buf = io.BytesIO()
-with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-    # Add profile.json (if present)
+def _prebuilt_is_fresh() -> bool:
+    """Reuse an earlier curated ZIP only if it was built from exactly the entries (names and etags) it would hold now."""
+    if not sources_complete:
+        return False
     try:
-        bc_profile = cc.get_blob_client(profile_blob)
-        if bc_profile.exists():
-            zf.writestr("profile.json", bc_profile.download_blob().readall())
-        else:
-            zf.writestr("profile.json", json.dumps({"warning": "profile.json not found"}, indent=2))
-    except Exception as e:
-        zf.writestr("profile.json", json.dumps({"error": f"could not fetch profile.json: {e}"}, indent=2))
-
-    # Add all images/* under this prefix
+        props = cc.get_blob_client(curated_blob).get_blob_properties()
+    except Exception:
+        return False
+    return (props.metadata or {}).get("sources_sha256") == sources_digest
+
+def _curated_sas_url(minutes: int = 30) -> str | None:
+    """Read-only SAS for the curated ZIP that makes the browser save it as download_name."""
     try:
-        for blob in cc.list_blobs(name_starts_with=images_prefix):
-            arcname = blob.name[len(prefix)+1:]  # keep "images/..." inside the zip
-            try:
-                img_bytes = cc.get_blob_client(blob.name).download_blob().readall()
-                zf.writestr(arcname, img_bytes)
-            except Exception as e_img:
-                zf.writestr(arcname + ".txt", f"Could not fetch image: {e_img}")
-    except Exception as e:
-        zf.writestr("images/README.txt", f"Could not list images: {e}")
-
-data = buf.getvalue()
+        return get_signer(AZ_CONN, "backup", service_client=bsc).url(
+            curated_blob, minutes=minutes, download_as=download_name,
+        )
+    except Exception:
+        return None
 
-# Force the outgoing filename to .zip, set a nice default if missing
-if not download_name:
-    download_name = prefix.replace("/", "_") + "_images_profile.zip"
-if not download_name.lower().endswith(".zip"):
-    download_name = download_name.rsplit(".", 1)[0] + ".zip"
+try:
+    if not _prebuilt_is_fresh():
+        failed = []
+
+        def _on_zip_error(arcname, e_img):
+            failed.append(arcname)
+            return arcname + ".txt", f"Could not fetch image: {e_img}"
+
+        with st.spinner("Preparing your download…"):
+            zip_blobs_to_blob(cc, curated_blob, entries, extras=extras, on_error=_on_zip_error, prefetch=ZIP_PREFETCH)
+        if not failed and sources_complete:
+            # Only a complete archive is marked reusable; one with placeholders is rebuilt next time
+            cc.get_blob_client(curated_blob).set_blob_metadata({"sources_sha256": sources_digest})
+except Exception as e:
+    st.error(f"Could not prepare your download: {e}")
+    st.stop()
 
-# Download button (ZIP only)
-st.download_button(
-    "⬇️ Download your backup",
-    data=data,
-    file_name=download_name,
-    mime="application/zip",
-    type="primary",
-    use_container_width=True,
-    key="dl_zip_btn",
-)
+# Hand the browser a SAS link to the prebuilt ZIP: the bytes go straight from
+# blob storage to the buyer, so this page never holds the archive in memory.
+sas_url = _curated_sas_url()
+if sas_url:
+    st.link_button(
+        "⬇️ Download your backup",
+        sas_url,
+        type="primary",
+        use_container_width=True,
+    )
+else:
+    # No account key to sign with: only small archives are served through Streamlit.
+    curated_bc = cc.get_blob_client(curated_blob)
+    size = curated_bc.get_blob_properties().size
+    if size > INLINE_DOWNLOAD_MAX_BYTES:
+        st.error("Your backup is too large to download here. Please contact support for a download link.")
+        st.stop()
+    # Download button (ZIP only)
+    st.download_button(
+        "⬇️ Download your backup",
+        data=curated_bc.download_blob().readall(),
+        file_name=download_name,
+        mime="application/zip",
+        type="primary",
+        use_container_width=True,
+        key="dl_zip_btn",
+    )
 
 st.info(f"File ready: **{download_name}**")
 
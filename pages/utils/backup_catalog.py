@@ -0,0 +1,145 @@
+# FILE: utils/backup_catalog.py
+"""
+Per-user list of finished backups.
+
+<user_id>/backup_catalog.json holds one entry per backup, {"id": prefix,
+"summary": <its summary.json>}, so the Projects page learns which backups
+exist, and what to show for them, from one small read. The backup writer
+adds entries and the delete paths remove them. Both sides update it with an
+etag-conditional write and re-apply their change if the other got there
+first, so a concurrent add and remove can't undo each other. Users whose
+backups predate the catalog get one built by scan_user_backups() the first
+time it is missing.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError
+
+CATALOG_VERSION = 1
+# Conditional-write attempts before a catalog update gives up
+CATALOG_WRITE_ATTEMPTS = 5
+
+
+def catalog_blob_path(user_id: str) -> str:
+    # At the user root, like the checkpoint and status blobs
+    return f"{user_id}/backup_catalog.json"
+
+
+def _entry_time(entry: dict) -> datetime:
+    try:
+        ts = datetime.fromisoformat((entry.get("summary") or {}).get("timestamp"))
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    except Exception:
+        return datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _load_catalog(container, user_id: str) -> tuple[list | None, str | None]:
+    """(entries newest first, etag of the blob they came from); (None, None) without a catalog."""
+    try:
+        downloader = container.get_blob_client(catalog_blob_path(user_id)).download_blob()
+        state = json.loads(downloader.readall())
+    except Exception:
+        return None, None
+    if not isinstance(state, dict) or state.get("version") != CATALOG_VERSION:
+        return None, None
+    return sorted(state.get("backups") or [], key=_entry_time, reverse=True), downloader.properties.etag
+
+
+def load_catalog(container, user_id: str) -> list | None:
+    """Catalog entries newest first, or None if this user has no catalog yet."""
+    return _load_catalog(container, user_id)[0]
+
+
+def save_catalog(container, user_id: str, entries: list, etag: str | None = None) -> None:
+    """
+    Write the catalog only if it is still at `etag` (ResourceModifiedError otherwise).
+    Without an etag it is only created, never overwritten (ResourceExistsError).
+    """
+    state = {
+        "version": CATALOG_VERSION,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "backups": sorted(entries, key=_entry_time, reverse=True),
+    }
+    data = json.dumps(state, ensure_ascii=False).encode("utf-8")
+    bc = container.get_blob_client(catalog_blob_path(user_id))
+    if etag:
+        bc.upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified)
+    else:
+        bc.upload_blob(data, overwrite=False)
+
+
+def _update_catalog(container, user_id: str, change) -> None:
+    """
+    Read-modify-write with optimistic concurrency: change(entries) returns the
+    new entries (or None to leave the catalog alone) and is re-applied to a
+    fresh read whenever another writer got in between.
+    """
+    for attempt in range(CATALOG_WRITE_ATTEMPTS):
+        entries, etag = _load_catalog(container, user_id)
+        if entries is None:
+            return  # the first reader builds the catalog from a listing, which also finds older backups
+        updated = change(entries)
+        if updated is None:
+            return
+        try:
+            save_catalog(container, user_id, updated, etag=etag)
+            return
+        except ResourceModifiedError:
+            if attempt == CATALOG_WRITE_ATTEMPTS - 1:
+                raise
+
+
+def add_backup(container, user_id: str, prefix: str, summary: dict) -> None:
+    prefix = prefix.rstrip("/")
+
+    def _add(entries):
+        return [e for e in entries if e.get("id") != prefix] + [{"id": prefix, "summary": summary}]
+
+    _update_catalog(container, user_id, _add)
+
+
+def remove_backup(container, user_id: str, prefix: str) -> None:
+    prefix = prefix.rstrip("/").lower()
+
+    def _remove(entries):
+        kept = [e for e in entries if str(e.get("id", "")).rstrip("/").lower() != prefix]
+        return kept if len(kept) != len(entries) else None
+
+    _update_catalog(container, user_id, _remove)
+
+
+def _read_summary(container, pfx: str) -> dict | None:
+    try:
+        downloader = container.get_blob_client(f"{pfx}/summary.json").download_blob()
+    except Exception:
+        return None  # not a backup (or not finished writing one)
+    try:
+        summary = json.loads(downloader.readall().decode("utf-8"))
+        if not isinstance(summary, dict):
+            summary = {}
+    except Exception:
+        summary = {}
+    if not summary.get("timestamp"):
+        last_modified = getattr(downloader.properties, "last_modified", None) or datetime.now(timezone.utc)
+        summary["timestamp"] = last_modified.isoformat()
+    return summary
+
+
+def scan_user_backups(container, user_id: str, workers: int = 8) -> list:
+    """
+    Catalog entries rebuilt from storage, newest first. Folders are found with a
+    delimiter listing of <user_id>/ (one result per backup, however many photos
+    each holds) and their summary.json files are read in parallel.
+    """
+    folders = [
+        item.name.rstrip("/")
+        for item in container.walk_blobs(name_starts_with=f"{user_id}/", delimiter="/")
+        if item.name.endswith("/") and item.name.rstrip("/").split("/")[-1] != "projects"
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(folders) or 1))) as pool:
+        summaries = list(pool.map(lambda pfx: _read_summary(container, pfx), folders))
+    entries = [{"id": pfx, "summary": summary} for pfx, summary in zip(folders, summaries) if summary is not None]
+    return sorted(entries, key=_entry_time, reverse=True)
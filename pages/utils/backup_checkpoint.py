@@ -0,0 +1,142 @@
+# FILE: utils/backup_checkpoint.py
+"""
+Checkpoint manifest for resumable backup runs.
+
+While a backup runs, a small JSON manifest records which Graph page to
+resume listing from and every photo that already made it into blob storage
+(its finished post record included). If the session dies mid-run, the next
+run loads the manifest, keeps the same backup prefix, restores the finished
+posts and only downloads/captions what is still missing.
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+CHECKPOINT_VERSION = 1
+# Manifest writes are throttled to one per SAVE_INTERVAL seconds; page boundaries always write
+SAVE_INTERVAL = 15
+
+
+def checkpoint_blob_path(user_id: str) -> str:
+    # At the user root (two path parts), so list_user_backup_prefixes never mistakes it for a backup
+    return f"{user_id}/backup_checkpoint.json"
+
+
+class BackupCheckpoint:
+    """
+    State of one in-progress backup, persisted to `blob_path`.
+
+    Photos are tracked per Graph page: `resume_url` is the first listed page
+    that still has unfinished photos (or the last page, once all are done),
+    so a resumed run re-lists from there and skips photos in `done`.
+    """
+
+    def __init__(self, container, blob_path: str, state: dict):
+        self._container = container
+        self.blob_path = blob_path
+        self.state = state
+        self._pages: list = []      # [(page_url, set(pending photo keys))] seen this run
+        self._page_of: dict = {}    # photo key -> index into _pages
+        self._last_save = 0.0
+        self._dirty = False
+
+    # ---------- load / create ----------
+    @classmethod
+    def load(cls, container, blob_path: str) -> "BackupCheckpoint | None":
+        try:
+            state = json.loads(container.get_blob_client(blob_path).download_blob().readall())
+        except Exception:
+            return None
+        if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION or not state.get("prefix"):
+            return None
+        state.setdefault("done", {})
+        return cls(container, blob_path, state)
+
+    @classmethod
+    def start(cls, container, blob_path: str, prefix: str, **meta) -> "BackupCheckpoint":
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "prefix": prefix,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "endpoint": None,
+            "resume_url": None,
+            "done": {},
+            **meta,
+        }
+        ckpt = cls(container, blob_path, state)
+        ckpt.save(force=True)
+        return ckpt
+
+    # ---------- accessors ----------
+    @property
+    def prefix(self) -> str:
+        return self.state["prefix"]
+
+    @property
+    def endpoint(self) -> str | None:
+        return self.state.get("endpoint")
+
+    @property
+    def resume_url(self) -> str | None:
+        return self.state.get("resume_url")
+
+    @property
+    def done(self) -> dict:
+        """photo key -> {"post": finished post record, "blob": image blob path}"""
+        return self.state["done"]
+
+    # ---------- progress ----------
+    def set_endpoint(self, endpoint: str) -> None:
+        if self.state.get("endpoint") != endpoint:
+            self.state["endpoint"] = endpoint
+            self.state["resume_url"] = None
+            self._dirty = True
+
+    def page_started(self, page_url: str) -> None:
+        """A new Graph page was listed; photos added until the next call belong to it."""
+        self._pages.append((page_url, set()))
+        self._refresh_resume_url()
+        self.save(force=True)
+
+    def photo_queued(self, key: str) -> None:
+        if self._pages:
+            self._pages[-1][1].add(key)
+            self._page_of[key] = len(self._pages) - 1
+
+    def photo_done(self, key: str, post: dict, blob_path: str) -> None:
+        """Record a photo whose image is in blob storage; its post record is final."""
+        self.done[key] = {"post": post, "blob": blob_path}
+        page = self._page_of.pop(key, None)
+        if page is not None:
+            self._pages[page][1].discard(key)
+            self._refresh_resume_url()
+        self._dirty = True
+        self.save()
+
+    def _refresh_resume_url(self) -> None:
+        if not self._pages:
+            return
+        url = next((u for u, pending in self._pages if pending), self._pages[-1][0])
+        if url != self.state.get("resume_url"):
+            self.state["resume_url"] = url
+            self._dirty = True
+
+    # ---------- persistence ----------
+    def save(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and (not self._dirty or now - self._last_save < SAVE_INTERVAL):
+            return
+        self.state["updated_at"] = datetime.now(timezone.utc).isoformat()
+        data = json.dumps(self.state, ensure_ascii=False).encode("utf-8")
+        try:
+            self._container.get_blob_client(self.blob_path).upload_blob(data, overwrite=True)
+            self._last_save, self._dirty = now, False
+        except Exception:
+            pass  # a missed checkpoint only costs re-doing some photos on resume
+
+    def clear(self) -> None:
+        """Backup finished (or was discarded): drop the manifest."""
+        try:
+            self._container.get_blob_client(self.blob_path).delete_blob()
+        except Exception:
+            pass
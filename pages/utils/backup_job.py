@@ -0,0 +1,684 @@
+# FILE: utils/backup_job.py
+"""
+The photo backup run, independent of Streamlit.
+
+run_backup_job() performs fetch → download/caption/upload → JSON → ZIP for
+one user and reports progress by rewriting a small status blob
+(<user_id>/backup_status.json) that the Projects page polls. It only takes
+plain data, so it can run in a worker process or behind a queue consumer
+(see backup_worker.py).
+"""
+import functools
+import hashlib
+import json
+import logging
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote_plus
+
+import requests
+from azure.storage.blob import ContentSettings
+
+from pages.utils.http_pool import make_session, get_with_retry
+from pages.utils.graph_api import GraphPager, GraphAPIError, graph_prefetch
+from pages.utils.backup_pipeline import run_photo_pipeline
+from pages.utils.backup_checkpoint import BackupCheckpoint, checkpoint_blob_path
+from pages.utils.blob_io import TeeReader, StreamedBlob, upload_files, copy_blob, make_blob_service_client
+from pages.utils.zip_stream import zip_blobs_to_blob
+from pages.utils.captioning import CaptionService, DEFAULT_MAX_TPS, content_hash
+from pages.utils.thumbs import upload_thumbnails, is_thumb_path
+from pages.utils.backup_catalog import add_backup
+from pages.utils.entitlements import JSON_BLOBS, MARKER_BLOBS
+from pages.utils.backup_manifest import (backup_blob_names, build_manifest, image_hashes, load_manifest,
+                                         write_manifest)
+
+logger = logging.getLogger("liveon.app")
+
+# Only what photo_to_post() reads
+PHOTO_FIELDS = "id,created_time,images,name"
+# photos/uploaded is more reliable for user-uploaded photos; photos is the fallback
+PHOTO_ENDPOINTS = ("photos/uploaded", "photos")
+CAPTION_MAX_BYTES = 4 * 1024 * 1024  # Vision v3.2 rejects images over 4 MB
+DEFAULT_CAPTION_BACKLOG = 64
+STEP_LABELS = [
+    "Fetched photos",
+    "Processed photos",
+    "Files prepared",
+    "Uploaded backup folder",
+    "ZIP uploaded",
+    "Cleanup complete",
+]
+# Paid-feature markers carried over when an incremental backup replaces its base: everything
+# resolve_entitlements() reads, including the legacy project_meta.json(.json)
+ENTITLEMENT_BLOBS = JSON_BLOBS + MARKER_BLOBS
+# Throttled status writes go out at most this often (seconds)
+STATUS_WRITE_INTERVAL = 2
+# A queued/running status that hasn't been rewritten for this long belongs to a dead worker
+STATUS_STALE_SECONDS = 600
+
+
+@functools.lru_cache(maxsize=4)
+def _service_client(conn_str: str):
+    # One pooled client per worker process, reused by every job it runs
+    return make_blob_service_client(conn_str)
+
+
+def status_blob_path(user_id: str) -> str:
+    # At the user root, like the checkpoint, so backup listing never picks it up
+    return f"{user_id}/backup_status.json"
+
+
+def read_status(container, user_id: str) -> dict | None:
+    try:
+        return json.loads(container.get_blob_client(status_blob_path(user_id)).download_blob().readall())
+    except Exception:
+        return None
+
+
+def status_is_live(status: dict | None) -> bool:
+    """True while a job is queued or running and its worker is still writing heartbeats."""
+    if not status or status.get("state") not in ("queued", "running"):
+        return False
+    try:
+        updated = datetime.fromisoformat(status["updated_at"])
+    except Exception:
+        return False
+    return (datetime.now(timezone.utc) - updated).total_seconds() < STATUS_STALE_SECONDS
+
+
+class StatusWriter:
+    """Progress of one job, mirrored into the user's status blob."""
+
+    def __init__(self, container, user_id: str, **fields):
+        self._bc = container.get_blob_client(status_blob_path(user_id))
+        self.state = {
+            "state": "queued",
+            "progress": 0,
+            "message": "Waiting for a backup worker…",
+            "steps": [{"label": label, "done": False} for label in STEP_LABELS],
+            "warnings": [],
+            "queued_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        }
+        self._last_write = 0.0
+
+    def update(self, force: bool = False, **fields) -> None:
+        self.state.update(fields)
+        now = time.monotonic()
+        if force or now - self._last_write >= STATUS_WRITE_INTERVAL:
+            self.state["updated_at"] = datetime.now(timezone.utc).isoformat()
+            try:
+                self._bc.upload_blob(json.dumps(self.state, ensure_ascii=False).encode("utf-8"), overwrite=True)
+                self._last_write = now
+            except Exception as e:
+                logger.warning("backup_status_write_failed %s", e)
+
+    def step(self, index: int, *, done: bool = False, **fields) -> None:
+        self.state["steps"][index].update({"active": not done, "done": done})
+        self.update(force=True, **fields)
+
+    def warn(self, message: str) -> None:
+        self.state["warnings"].append(message)
+        self.update(force=True)
+
+
+def _log_event(event_type: str, success: bool, *, meta_user_id: str | None = None, **fields) -> None:
+    """Same structured audit line as the pages' log_event, minus the session lookup."""
+    payload = {
+        "event_type": event_type,
+        "meta_user_id": meta_user_id or "",
+        "success": bool(success),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+    if fields:
+        payload["details"] = {k: v for k, v in fields.items() if v is not None}
+    logger.info("liveon_event %s", json.dumps(payload, default=str))
+
+
+def photo_to_post(photo: dict) -> dict | None:
+    """Convert a Graph photo to the post-like format the rest of the app reads (largest image only)."""
+    # Extract image URLs from photo
+    image_urls = []
+    if isinstance(photo.get("images"), list):
+        # Get the largest image
+        largest = max(photo.get("images", []), key=lambda x: x.get("width", 0) * x.get("height", 0), default={})
+        if largest.get("source"):
+            image_urls.append(largest["source"])
+    if not image_urls:
+        return None
+    return {
+        "id": photo.get("id"),
+        "created_time": photo.get("created_time"),
+        "message": photo.get("name", ""),
+        "images": image_urls,
+        "full_picture": image_urls[0] if image_urls else None,
+        "is_photo": True  # Flag to indicate this came from photos, not posts
+    }
+
+
+def photo_key_for(post: dict) -> str:
+    img_url = (post.get("images") or [""])[0]
+    # Generate fallback ID if post doesn't have one
+    return post.get("id", hashlib.md5(f"{post.get('message','')}{img_url}".encode()).hexdigest()[:12])
+
+
+def _parse_created_time(value) -> datetime | None:
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")  # Graph's "2024-05-01T10:00:00+0000"
+    except (TypeError, ValueError):
+        return None
+
+
+def save_json(obj, name, backup_dir: Path):
+    fp = backup_dir / f"{name}.json"
+    fp.write_text(json.dumps(obj, indent=2, ensure_ascii=False), encoding="utf-8")
+    return fp
+
+
+class BackupRun:
+    """
+    One backup job. `job` carries the user, token, target prefix and tuning
+    knobs; `secrets` the storage connection string and Vision credentials.
+    """
+
+    def __init__(self, job: dict, secrets: dict):
+        self.job = job
+        self.token = job["token"]
+        self.user_id = job["user_id"]
+        self.name_slug = job["name_slug"]
+        self.prefix = job["prefix"]
+        # Incremental mode: carry this backup over and only fetch photos newer than its newest one
+        self.base_prefix = job.get("base_prefix")
+        self.copy_workers = int(job.get("copy_workers", 16))
+        self.stream = bool(job.get("stream"))
+        self.debug = bool(job.get("debug"))
+        self.page_size = int(job.get("page_size", 100))
+        self.max_pages = int(job.get("max_pages", 1000))
+        self.download_workers = int(job.get("download_workers", 8))
+        self.per_host = int(job.get("per_host", 6))
+        self.caption_workers = int(job.get("caption_workers", 5))
+        # Photos allowed to sit downloaded but uncaptioned (each holds up to CAPTION_MAX_BYTES in stream mode)
+        self.caption_backlog = int(job.get("caption_backlog", DEFAULT_CAPTION_BACKLOG))
+        self.upload_workers = int(job.get("upload_workers", 4))
+        self.blob_max_concurrency = int(job.get("blob_max_concurrency", 4))
+        self.thumbnails = bool(job.get("thumbnails", True))
+        # image blob path -> sha256, recorded in manifest.json
+        self.image_hashes: dict = {}
+
+        self.bsc = _service_client(secrets["AZURE_CONNECTION_STRING"])
+        self.container_name = job.get("container", "backup")
+        self.container = self.bsc.get_container_client(self.container_name)
+        try:
+            self.container.create_container()
+        except Exception:
+            pass
+        self.captioner = CaptionService(
+            secrets.get("AZURE_VISION_ENDPOINT"), secrets.get("AZURE_VISION_KEY"),
+            container=self.container,
+            max_concurrency=self.caption_workers,
+            max_tps=float(job.get("vision_max_tps") or DEFAULT_MAX_TPS),
+        )
+        self.status = StatusWriter(self.container, self.user_id, job_id=job.get("job_id"), prefix=self.prefix,
+                                   queued_at=job.get("queued_at") or datetime.now(timezone.utc).isoformat())
+
+    # ---------- Graph ----------
+    def iter_photos(self, endpoint: str, start_url=None, on_page=None, since=None):
+        """Yield /me/<endpoint> photos as each page arrives; problems end the listing with a status warning."""
+        pager = GraphPager(f"me/{endpoint}", self.token, fields=PHOTO_FIELDS, limit=self.page_size,
+                           max_pages=self.max_pages, start_url=start_url, since=since)
+        try:
+            for page in pager:
+                if on_page:
+                    on_page(pager.page_url)
+                yield from page
+        except GraphAPIError as e:
+            self.status.warn(f"Skipping {endpoint}: {e}")
+        except requests.exceptions.RequestException as e:
+            self.status.warn(f"Network error on {endpoint}: {e}")
+        except Exception as e:
+            self.status.warn(f"Unexpected error on {endpoint}: {e}")
+
+        # heads-up if we actually hit the max and still had a next page
+        if pager.truncated:
+            self.status.warn(f"Stopped at FB_MAX_PAGES={self.max_pages}. Increase FB_MAX_PAGES if you need more.")
+
+    # ---------- images ----------
+    def download_image(self, url, name_id, img_dir: Path | None, session=None, blob_prefix: str | None = None):
+        """
+        Download one photo. With blob_prefix set (streaming mode) the response body is
+        piped straight into <blob_prefix>/images/<name> and a StreamedBlob is returned
+        instead of a local path.
+        """
+        ext = url.split(".")[-1].split("?")[0]
+        if len(ext) > 5 or "/" in ext: ext = "jpg"
+        fname = f"{name_id}.{ext}"
+        # Retries 429/5xx with jittered backoff; the session caps connections per fbcdn host
+        r = get_with_retry(session or requests, url, stream=True, timeout=10)
+        with r:
+            if r.status_code != 200:
+                raise Exception(f"Image download failed: {r.status_code}")
+            if blob_prefix:
+                return self._stream_response_to_blob(r, f"{blob_prefix}/images/{fname}")
+            local_path = img_dir / fname
+            with open(local_path, 'wb') as f: shutil.copyfileobj(r.raw, f)
+        return local_path
+
+    def _stream_response_to_blob(self, r, blob_path: str) -> StreamedBlob:
+        """Upload an open streaming response to blob_path (staged blocks for large bodies), keeping a copy for captioning."""
+        length = None if r.headers.get("Content-Encoding") else r.headers.get("Content-Length")
+        body = TeeReader(r.raw, keep_limit=CAPTION_MAX_BYTES)
+        self.container.get_blob_client(blob_path).upload_blob(
+            body,
+            length=int(length) if length else None,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=r.headers.get("Content-Type") or "image/jpeg"),
+        )
+        return StreamedBlob(blob_path, blob_path.rsplit("/", 1)[-1], body.bytes_read, body.kept_bytes())
+
+    def upload_image_blob(self, local_path: Path, blob_prefix: str) -> str:
+        """Upload one downloaded image to <blob_prefix>/images/<name> and return its blob path."""
+        blob_path = f"{blob_prefix}/images/{Path(local_path).name}"
+        with open(local_path, "rb") as f:
+            self.container.get_blob_client(blob_path).upload_blob(f, overwrite=True)
+        return blob_path
+
+    def image_stored(self, blob_path: str, data) -> None:
+        """
+        Follow-up for one uploaded original (bytes or local path): its content hash
+        for the manifest, then images/thumbs/<size>/. Best-effort: readers fall
+        back to the original.
+        """
+        if not data:
+            return
+        try:
+            if not isinstance(data, (bytes, bytearray)):
+                data = Path(data).read_bytes()
+            self.image_hashes[blob_path] = content_hash(data)
+            if self.thumbnails:
+                upload_thumbnails(self.container, blob_path, bytes(data))
+        except Exception as e:
+            logger.warning("thumbnail_failed blob=%s error=%s", blob_path, e)
+
+    def generate_blob_url(self, folder_prefix: str, image_name: str) -> str:
+        account_name = self.bsc.account_name
+        return f"https://{account_name}.blob.core.windows.net/{self.container_name}/{folder_prefix}/images/{quote_plus(image_name)}"
+
+    def dense_caption(self, img_path):
+        """Caption an image given its local path or raw bytes (cached by content hash)."""
+        return self.captioner.caption(img_path)
+
+    def _caption_streamed(self, img: StreamedBlob) -> str:
+        data = img.take_data()  # drop the copy once captioned so memory stays bounded
+        if not data:
+            return "No caption (image too large)"
+        self.image_stored(img.blob_path, data)
+        return self.dense_caption(data)
+
+    # ---------- backup folder / ZIP ----------
+    def upload_folder(self, backup_dir: Path, blob_prefix, skip=None):
+        """Upload everything under backup_dir; blob paths in `skip` were already uploaded by the pipeline."""
+        skip = set(skip or ())
+        files = []
+        for local_path in sorted(p for p in backup_dir.rglob("*") if p.is_file()):
+            blob_path = f"{blob_prefix}/{local_path.relative_to(backup_dir).as_posix()}"
+            if blob_path not in skip:
+                files.append((local_path, blob_path))
+
+        # posts+cap.json is uploaded LAST (this is what the worker should process):
+        # everything else goes up in parallel first, then the barrier releases it.
+        upload_files(
+            self.container,
+            files,
+            workers=self.upload_workers,
+            max_concurrency=self.blob_max_concurrency,
+            is_last=lambda blob_path: blob_path.endswith("posts+cap.json"),
+        )
+
+    def upload_json_files(self, files: dict, blob_prefix: str):
+        """Streaming-mode counterpart of upload_folder for the in-memory JSON files (posts+cap.json last)."""
+        for name in sorted(files, key=lambda n: 1 if n == "posts+cap" else 0):
+            data = json.dumps(files[name], indent=2, ensure_ascii=False).encode("utf-8")
+            self.container.get_blob_client(f"{blob_prefix}/{name}.json").upload_blob(data, overwrite=True)
+
+    def zip_backup(self, zip_name: str, blob_prefix: str, summary: dict | None, image_blobs, on_progress=None) -> str:
+        """
+        Assemble the backup ZIP server-side: images are streamed back out of blob
+        storage (stored, not deflated — they are already JPEGs) and the archive is
+        staged straight into <blob_prefix>/<zip_name>. No local file, constant memory.
+        """
+        extras = {}
+        if summary is not None:
+            # summary.json at the root
+            extras["summary.json"] = json.dumps(summary, indent=2, ensure_ascii=False)
+        # everything under images/ (arcname keeps "images/..." inside the zip)
+        entries = [(b, b[len(blob_prefix) + 1:]) for b in image_blobs]
+        zip_blob = f"{blob_prefix}/{zip_name}"
+        zip_blobs_to_blob(self.container, zip_blob, entries, extras=extras, on_progress=on_progress)
+        return zip_blob
+
+    # ---------- incremental ----------
+    def _load_base_posts(self) -> list:
+        for name in ("posts+cap.json", "posts.json"):
+            try:
+                data = json.loads(self.container.get_blob_client(f"{self.base_prefix}/{name}").download_blob().readall())
+            except Exception:
+                continue
+            if isinstance(data, list):
+                return data
+        raise RuntimeError(f"No posts found in previous backup {self.base_prefix}")
+
+    def carry_over_base(self, checkpoint, posts: list, uploaded_images: set) -> tuple[set, int | None]:
+        """
+        Copy the base backup's images server-side into this prefix and append its
+        posts (re-pointed at the new copies). Copies are checkpointed like downloads.
+        Returns (keys of every base photo, unix time of the newest one) so the
+        Graph listing can ask only for newer photos.
+        """
+        base, prefix = self.base_prefix, self.prefix
+        base_posts = self._load_base_posts()
+        # Images are named <photo key>.<ext>; posts.json may predate the picture URLs, so go by the listing
+        base_manifest = load_manifest(self.container, base)
+        base_hashes = image_hashes(base_manifest)
+        base_images, base_thumbs = {}, {}
+        for name in backup_blob_names(self.container, base, "images/", manifest=base_manifest):
+            img_name = name.rsplit("/", 1)[-1]
+            stem = img_name.rsplit(".", 1)[0]
+            if is_thumb_path(name):
+                base_thumbs.setdefault(stem, []).append(name[len(base) + 1:])
+            else:
+                base_images[stem] = img_name
+        base_keys, newest, to_copy = set(), None, []
+        for post in base_posts:
+            key = photo_key_for(post)
+            base_keys.add(key)
+            created = _parse_created_time(post.get("created_time"))
+            if created and (newest is None or created > newest):
+                newest = created
+            if key in checkpoint.done:
+                continue  # copied before the interruption; already restored
+            img_name = base_images.get(key)
+            if img_name is None:
+                posts.append(post)  # download failed last time; nothing to copy
+                continue
+            to_copy.append((key, post, img_name))
+
+        self.status.update(force=True, message=f"Copying {len(to_copy)} photos from your last backup…")
+
+        def _copy(item):
+            key, post, img_name = item
+            blob = copy_blob(self.container, f"{base}/images/{img_name}", f"{prefix}/images/{img_name}")
+            for rel in base_thumbs.get(key, ()):
+                try:
+                    copy_blob(self.container, f"{base}/{rel}", f"{prefix}/{rel}")
+                except Exception:
+                    pass  # readers fall back to the original
+            return key, post, img_name, blob
+
+        with ThreadPoolExecutor(max_workers=max(1, self.copy_workers)) as pool:
+            futures = [pool.submit(_copy, item) for item in to_copy]
+            for n, fut in enumerate(as_completed(futures), 1):
+                try:
+                    key, post, img_name, blob = fut.result()
+                except Exception as e:
+                    self.status.warn(f"Couldn't copy a photo from your last backup: {e}")
+                    continue
+                old_url = post.get("picture")
+                new_url = self.generate_blob_url(prefix, img_name)
+                post["picture"] = new_url
+                images = [u for u in post.get("images") or [] if u != old_url]
+                post["images"] = [new_url] + images
+                posts.append(post)
+                uploaded_images.add(blob)
+                if base_hashes.get(key):
+                    self.image_hashes[blob] = base_hashes[key]
+                checkpoint.photo_done(key, post, blob)
+                self.status.update(message=f"Copying photos from your last backup… ({n}/{len(to_copy)})")
+
+        # Paid features follow the backup
+        for name in ENTITLEMENT_BLOBS:
+            try:
+                copy_blob(self.container, f"{base}/{name}", f"{prefix}/{name}")
+            except Exception:
+                pass
+        return base_keys, int(newest.timestamp()) if newest else None
+
+    # ---------- the run ----------
+    def run(self) -> dict:
+        status = self.status
+        prefix = self.prefix
+        status.update(force=True, state="running", started_at=datetime.now(timezone.utc).isoformat(),
+                      message="Fetching your photos…")
+        status.step(0)
+
+        checkpoint = BackupCheckpoint.load(self.container, checkpoint_blob_path(self.user_id))
+        if not checkpoint or checkpoint.prefix != prefix:
+            checkpoint = BackupCheckpoint.start(self.container, checkpoint_blob_path(self.user_id), prefix,
+                                                user_id=self.user_id, base_prefix=self.base_prefix)
+
+        # --- SECURITY FIX: ISOLATE DATA ---
+        # Create a unique directory for this specific backup session
+        session_backup_dir = Path("facebook_data") / str(uuid.uuid4())
+        session_img_dir = session_backup_dir / "images"
+        if not self.stream:
+            session_img_dir.mkdir(parents=True, exist_ok=True)
+        # Streaming mode keeps the JSON files in memory instead of on disk
+        staged_json = {}
+
+        # Stage 1: Fetch photos only (no posts permission needed yet).
+        # Photos stream in page by page and each one is queued for download as
+        # soon as its page lands, while the next page is already being fetched.
+        posts, post_ids = [], {}
+        fetched = {"photos": 0}
+        uploaded_images = set()
+        # Photos an interrupted run already finished come back as-is
+        for rec in checkpoint.done.values():
+            posts.append(rec["post"])
+            uploaded_images.add(rec["blob"])
+        base_keys, since = set(), None
+        if self.base_prefix:
+            base_keys, since = self.carry_over_base(checkpoint, posts, uploaded_images)
+        restored = len(posts)
+        # First page of both endpoints in one batch call, so the fallback costs no extra round trip
+        graph_prefetch(self.token, [
+            GraphPager(f"me/{ep}", self.token, fields=PHOTO_FIELDS, limit=self.page_size, since=since).relative_url
+            for ep in PHOTO_ENDPOINTS
+        ])
+
+        def _photo_jobs():
+            # Try photos/uploaded first, then fall back to photos if uploaded returns nothing.
+            # A resumed run sticks to its endpoint and re-lists from the checkpointed page.
+            endpoints = (checkpoint.endpoint,) if checkpoint.endpoint else PHOTO_ENDPOINTS
+            for endpoint in endpoints:
+                if endpoint == "photos" and len(endpoints) > 1:
+                    if fetched["photos"]:
+                        break
+                    status.update(force=True, message="📸 No uploaded photos found, trying all photos...")
+                start_url = checkpoint.resume_url if endpoint == checkpoint.endpoint else None
+                checkpoint.set_endpoint(endpoint)
+                for photo in self.iter_photos(endpoint, start_url=start_url, on_page=checkpoint.page_started,
+                                              since=since):
+                    fetched["photos"] += 1
+                    post = photo_to_post(photo)
+                    if not post:
+                        continue
+                    img_url = post["images"][0]
+                    photo_key = photo_key_for(post)
+                    if photo_key in checkpoint.done or photo_key in base_keys:
+                        continue  # restored / carried over above
+                    posts.append(post)
+                    idx = len(posts) - 1
+                    post_ids[idx] = photo_key
+                    checkpoint.photo_queued(photo_key)
+                    status.update(message=f"Fetching your photos… ({len(posts)} so far)")
+                    yield idx, img_url
+
+        def _on_photos_fetched(total):
+            if self.base_prefix and total == 0:
+                status.update(message="No new photos since your last backup; carrying the existing ones over.")
+            if fetched["photos"] == 0 and not restored:
+                status.warn("⚠️ No photos were returned from Facebook. This could be due to: 1) No photos in your account, 2) Missing permissions, or 3) API access issues.")
+                _log_event("backup_no_photos_found", False, meta_user_id=self.user_id, backup_prefix=prefix)
+            elif self.debug:
+                status.warn(f"📊 Debug: Fetched {fetched['photos']} photos from Facebook API")
+            status.step(0, done=True)
+            status.step(1, progress=20, message=f"✅ Fetched {len(posts)} photos", photos_total=total)
+
+        def _on_photo_finished(idx, rec):
+            post = posts[idx]
+            if rec["error"] is not None:
+                post["picture"] = "download failed"
+                post["context_caption"] = f"Image download failed: {rec['error']}"
+                return
+            img_name = rec["path"].name if self.stream else Path(rec["path"]).name
+            signed_url = self.generate_blob_url(prefix, img_name)
+            post["picture"] = signed_url
+            post.setdefault("images", [])
+            if signed_url not in post["images"]:
+                post["images"].insert(0, signed_url)
+            post["context_caption"] = rec["caption"] or "caption failed"
+            blob = rec["path"].blob_path if self.stream else rec["blob"]
+            if blob:
+                uploaded_images.add(blob)
+                checkpoint.photo_done(post_ids[idx], post, blob)
+
+        def _on_photo_done(done_count, total):
+            pct = 20 + int(25 * (done_count / max(1, total)))
+            status.update(progress=pct, message=f"🖼️ Processing images & captions… ({done_count}/{total})",
+                          photos_done=done_count)
+
+        # Download, caption and upload overlap: each photo is captioned and
+        # pushed to blob storage as soon as its download lands.
+        http = make_session(per_host=self.per_host)
+        if self.stream:
+            # CDN body → block blob directly; nothing touches local disk
+            download = lambda idx, url: self.download_image(url, post_ids[idx], None, session=http, blob_prefix=prefix)
+            caption, upload = self._caption_streamed, None
+        else:
+            download = lambda idx, url: self.download_image(url, post_ids[idx], session_img_dir, session=http)
+            caption = self.dense_caption
+
+            def upload(idx, path):
+                blob = self.upload_image_blob(path, prefix)
+                self.image_stored(blob, path)
+                return blob
+
+        try:
+            run_photo_pipeline(
+                _photo_jobs(),
+                download=download,
+                caption=caption,
+                upload=upload,
+                download_workers=self.download_workers,
+                caption_workers=self.caption_workers,
+                upload_workers=self.upload_workers,
+                on_progress=_on_photo_done,
+                on_jobs_ready=_on_photos_fetched,
+                on_done=_on_photo_finished,
+                max_backlog=self.caption_backlog,
+            )
+        finally:
+            http.close()
+            self.captioner.close()
+            checkpoint.save(force=True)
+
+        status.step(1, done=True, progress=45, message="✅ Images & captions processed")
+        # Written only now that every post has its final picture/caption
+        if self.stream:
+            staged_json["posts"] = posts
+        else:
+            save_json(posts, "posts", session_backup_dir)
+
+        status.step(2)
+        summary = {"user": self.name_slug, "user_id": self.user_id, "timestamp": datetime.now(timezone.utc).isoformat(), "posts": len(posts), "photos": len(posts), "backup_type": "photos_only"}
+        if self.base_prefix:
+            summary["incremental_from"] = self.base_prefix
+            summary["new_photos"] = len(posts) - restored
+        if self.stream:
+            staged_json["summary"] = summary
+        else:
+            save_json(summary, "summary", session_backup_dir)
+        status.step(2, done=True, progress=60, message="✅ Files prepared")
+
+        status.step(3, message="Uploading backup folder…")
+        if self.stream:
+            self.upload_json_files(staged_json, prefix)
+        else:
+            self.upload_folder(session_backup_dir, prefix, skip=uploaded_images)
+        status.step(3, done=True, progress=80, message="✅ Uploaded backup folder")
+
+        status.step(4, message="Building ZIP…")
+        zip_name = f"{self.name_slug}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        zip_images = set(uploaded_images)
+        if not self.stream:
+            # images whose pipeline upload failed went up with the folder
+            zip_images.update(f"{prefix}/images/{p.name}" for p in session_img_dir.iterdir())
+        self.zip_backup(zip_name, prefix, summary, sorted(zip_images),
+                        on_progress=lambda i, n: status.update(message=f"Building ZIP… ({i}/{n})"))
+        # One listing now saves every reader a listing later
+        try:
+            write_manifest(self.container, prefix,
+                           build_manifest(self.container, prefix, hashes=self.image_hashes, summary=summary))
+        except Exception as e:
+            logger.warning("manifest_write_failed prefix=%s error=%s", prefix, e)
+        try:
+            add_backup(self.container, self.user_id, prefix, summary)
+        except Exception as e:
+            logger.warning("catalog_update_failed prefix=%s error=%s", prefix, e)
+        # The backup is whole now; nothing left to resume
+        checkpoint.clear()
+        status.step(4, done=True, progress=90, message="✅ ZIP uploaded")
+
+        status.step(5)
+        # Cleanup unique directory
+        try:
+            if session_backup_dir.exists():
+                shutil.rmtree(session_backup_dir)
+        except Exception:
+            pass
+        status.step(5, done=True, progress=95, message="✅ Cleanup complete")
+
+        latest_backup = {
+            "Name": self.name_slug,
+            "Created On": datetime.now().strftime("%b %d, %Y"),
+            "# Posts": len(posts),
+            "Folder": prefix.rstrip("/"),
+            "user_id": self.user_id,
+        }
+        started = datetime.fromisoformat(status.state["started_at"])
+        total_time = (datetime.now(timezone.utc) - started).total_seconds()
+        status.update(force=True, state="complete", progress=100, message="🎉 Backup complete!",
+                      latest_backup=latest_backup, total_seconds=int(total_time))
+        _log_event(
+            "backup_completed",
+            True,
+            meta_user_id=self.user_id,
+            backup_prefix=prefix,
+            posts=len(posts),
+            total_seconds=int(total_time),
+            captions_cached=self.captioner.hits,
+            captions_requested=self.captioner.misses,
+        )
+        return status.state
+
+
+def run_backup_job(job: dict, secrets: dict) -> dict:
+    """
+    Worker entry point. Never raises: failures end up in the status blob (the
+    checkpoint stays, so the user can resume) and in the returned status.
+    """
+    try:
+        run = BackupRun(job, secrets)
+    except Exception as e:
+        logger.exception("backup_job_setup_failed")
+        return {"state": "failed", "error": str(e)}
+    try:
+        return run.run()
+    except Exception as e:
+        logger.exception("backup_job_failed")
+        run.status.update(force=True, state="failed", error=str(e), message=f"Backup failed: {e}")
+        _log_event("backup_completed", False, meta_user_id=run.user_id, backup_prefix=run.prefix, error=str(e))
+        return run.status.state
@@ -0,0 +1,102 @@
+# FILE: utils/backup_manifest.py
+"""
+Per-backup blob index.
+
+When a backup finishes, the writer lists its prefix once and stores
+<prefix>/manifest.json: every blob's name (relative to the prefix), size and
+etag, plus the photo ID and SHA-256 of each original image where known.
+Readers call backup_blob_names() (or backup_blob_etags() when they need the
+etags too), which answer from that one small GET and only fall back to
+list_blobs for backups written before manifests existed. Anything written
+into a finished backup later must be added with record_blobs().
+"""
+import json
+from datetime import datetime, timezone
+
+from pages.utils.thumbs import is_thumb_path
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def manifest_blob_path(prefix: str) -> str:
+    return f"{prefix.rstrip('/')}/{MANIFEST_NAME}"
+
+
+def build_manifest(container, prefix: str, *, hashes: dict | None = None, summary: dict | None = None) -> dict:
+    """List `prefix` and describe every blob under it. `hashes` maps blob path -> sha256."""
+    prefix = prefix.rstrip("/")
+    hashes = hashes or {}
+    blobs = []
+    for b in container.list_blobs(name_starts_with=f"{prefix}/"):
+        rel = b.name[len(prefix) + 1:]
+        if rel == MANIFEST_NAME:
+            continue
+        rec = {"name": rel, "size": getattr(b, "size", None), "etag": getattr(b, "etag", None)}
+        if rel.startswith("images/") and not is_thumb_path(b.name):
+            rec["photo_id"] = rel.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            if hashes.get(b.name):
+                rec["sha256"] = hashes[b.name]
+        blobs.append(rec)
+    return {
+        "version": MANIFEST_VERSION,
+        "prefix": prefix,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "summary": summary,
+        "blobs": blobs,
+    }
+
+
+def write_manifest(container, prefix: str, manifest: dict) -> None:
+    data = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    container.get_blob_client(manifest_blob_path(prefix)).upload_blob(data, overwrite=True)
+
+
+def load_manifest(container, prefix: str) -> dict | None:
+    try:
+        manifest = json.loads(container.get_blob_client(manifest_blob_path(prefix)).download_blob().readall())
+    except Exception:
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def record_blobs(container, prefix: str, blob_names) -> None:
+    """
+    Add (or refresh) blobs written under `prefix` after its manifest was, so
+    readers that trust the manifest see them. No-op for backups without one.
+    """
+    prefix = prefix.rstrip("/")
+    manifest = load_manifest(container, prefix)
+    if manifest is None:
+        return
+    records = {b["name"]: b for b in manifest.get("blobs") or []}
+    for name in blob_names:
+        props = container.get_blob_client(name).get_blob_properties()
+        rel = name[len(prefix) + 1:]
+        records[rel] = {**records.get(rel, {}), "name": rel, "size": getattr(props, "size", None),
+                        "etag": getattr(props, "etag", None)}
+    manifest["blobs"] = list(records.values())
+    write_manifest(container, prefix, manifest)
+
+
+def backup_blob_etags(container, prefix: str, under: str = "", manifest: dict | None = None) -> dict:
+    """Full blob name -> etag (None if unknown) under <prefix>/<under>, from the manifest when there is one."""
+    prefix = prefix.rstrip("/")
+    manifest = manifest if manifest is not None else load_manifest(container, prefix)
+    if manifest is not None:
+        return {f"{prefix}/{b['name']}": b.get("etag") for b in manifest.get("blobs") or []
+                if b["name"].startswith(under)}
+    return {b.name: getattr(b, "etag", None) for b in container.list_blobs(name_starts_with=f"{prefix}/{under}")}
+
+
+def backup_blob_names(container, prefix: str, under: str = "", manifest: dict | None = None) -> list:
+    """Full blob names under <prefix>/<under>, from the manifest when there is one."""
+    return list(backup_blob_etags(container, prefix, under, manifest))
+
+
+def image_hashes(manifest: dict | None) -> dict:
+    """photo_id -> sha256 for the originals the manifest has hashes for."""
+    return {b["photo_id"]: b["sha256"] for b in (manifest or {}).get("blobs") or []
+            if b.get("photo_id") and b.get("sha256")}
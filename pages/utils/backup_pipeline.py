@@ -0,0 +1,113 @@
+# FILE: utils/backup_pipeline.py
+"""
+Bounded-concurrency photo pipeline for the backup run.
+
+Each photo goes download → (caption + upload). Every stage has its own
+thread pool, and the follow-up stages for a photo are submitted the moment
+its download lands, so all three overlap instead of running back-to-back.
+With `max_backlog` set, new downloads wait while that many photos are
+downloading or waiting for a caption, so a slow (rate-limited) caption stage
+can't make landed images pile up in memory or on disk.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def run_photo_pipeline(jobs, download, caption, upload=None, *,
+                       download_workers: int = 8, caption_workers: int = 5,
+                       upload_workers: int = 4, on_progress=None, on_jobs_ready=None,
+                       on_done=None, max_backlog: int | None = None) -> dict:
+    """
+    jobs:      iterable of (key, url); may be a lazy generator (e.g. fed by a
+               Graph pager) — each download is submitted the moment its job is
+               produced, so downloading starts while later pages are still loading
+    download:  download(key, url) -> local path (or any handle caption/upload accept)
+    caption:   caption(handle) -> str
+    upload:    optional upload(key, handle) -> blob path
+
+    `on_jobs_ready(total)` fires once `jobs` is exhausted, `on_done(key, record)`
+    as soon as a photo has finished all its stages (e.g. to checkpoint it), and
+    `on_progress(done, total)` after each photo once the total is known. All are
+    called on the calling thread, so it is safe to update Streamlit widgets from them.
+
+    max_backlog: cap on photos submitted for download but not yet captioned
+               (None = unbounded)
+
+    Returns {key: {"path", "caption", "blob", "error"}}; "error" holds the
+    download exception for photos that never landed.
+    """
+    results, outstanding, pending = {}, {}, {}
+    finished_keys = []  # photos done before the total is known
+    uncaptioned = 0  # downloading, or landed and waiting for its caption
+
+    notified = 0
+
+    def _drain():
+        nonlocal notified
+        while notified < len(finished_keys):
+            key = finished_keys[notified]
+            notified += 1
+            if on_done:
+                on_done(key, results[key])
+
+    def _settle(fut):
+        nonlocal uncaptioned
+        stage, key = pending.pop(fut)
+        rec = results[key]
+        outstanding[key] -= 1
+        try:
+            value = fut.result()
+        except Exception as e:
+            value = None
+            if stage == "download":
+                rec["error"] = e
+            elif stage == "caption":
+                rec["caption"] = "caption failed"
+        if stage == "caption" or (stage == "download" and rec["error"] is not None):
+            uncaptioned -= 1
+
+        if stage == "download" and rec["error"] is None:
+            rec["path"] = value
+            pending[cap_pool.submit(caption, value)] = ("caption", key)
+            outstanding[key] += 1
+            if upload is not None:
+                pending[up_pool.submit(upload, key, value)] = ("upload", key)
+                outstanding[key] += 1
+        elif stage == "caption" and value is not None:
+            rec["caption"] = value
+        elif stage == "upload" and value is not None:
+            rec["blob"] = value
+
+        if outstanding[key] == 0:
+            finished_keys.append(key)
+
+    with ThreadPoolExecutor(max_workers=max(1, download_workers)) as dl_pool, \
+         ThreadPoolExecutor(max_workers=max(1, caption_workers)) as cap_pool, \
+         ThreadPoolExecutor(max_workers=max(1, upload_workers)) as up_pool:
+        for key, url in jobs:
+            while max_backlog and uncaptioned >= max_backlog:
+                for fut in wait(pending, return_when=FIRST_COMPLETED).done:
+                    _settle(fut)
+                _drain()
+            results[key] = {"path": None, "caption": None, "blob": None, "error": None}
+            outstanding[key] = 1
+            pending[dl_pool.submit(download, key, url)] = ("download", key)
+            uncaptioned += 1
+            # Hand landed downloads on to caption/upload without waiting for the job stream to end
+            for fut in wait(pending, timeout=0).done:
+                _settle(fut)
+            _drain()
+        total = len(results)
+        if on_jobs_ready:
+            on_jobs_ready(total)
+
+        reported = 0
+        while pending or reported < len(finished_keys):
+            if pending:
+                for fut in wait(pending, return_when=FIRST_COMPLETED).done:
+                    _settle(fut)
+            _drain()
+            while reported < len(finished_keys):
+                reported += 1
+                if on_progress:
+                    on_progress(reported, total)
+    return results
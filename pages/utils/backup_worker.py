@@ -0,0 +1,86 @@
+# FILE: utils/backup_worker.py
+"""
+Job runners that execute backups outside the Streamlit script thread.
+
+The web tier only builds a job dict, writes a "queued" status blob and hands
+the job to a runner; the page then polls the status blob. Runners:
+
+- PoolRunner: a local process (or thread) pool in the Streamlit server.
+- QueueRunner: puts jobs on a queue for a separate consumer process that
+  calls consume(). Anything with put()/get(timeout=) works, so queue.Queue
+  is a local stand-in for a real message queue.
+"""
+import logging
+import multiprocessing
+import queue as queue_mod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pages.utils.backup_job import run_backup_job
+
+logger = logging.getLogger("liveon.app")
+
+
+def configure_logging() -> logging.Logger:
+    """
+    INFO-level "liveon.app" logger writing to stderr. Spawned worker processes
+    start with an unconfigured logger, so make_runner() runs this in each one;
+    without it the backup audit events would be dropped.
+    """
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+class PoolRunner:
+    def __init__(self, executor):
+        self._executor = executor
+
+    def submit(self, job: dict, secrets: dict):
+        return self._executor.submit(run_backup_job, job, secrets)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+class QueueRunner:
+    """Enqueue jobs for consume(); the consumer brings its own secrets."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def submit(self, job: dict, secrets: dict | None = None):
+        self.queue.put(job)
+
+
+def make_runner(kind: str = "process", workers: int = 2):
+    """`kind` is "process" (default) or "thread" (for hosts that can't spawn processes)."""
+    if kind == "thread":
+        return PoolRunner(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backup"))
+    # spawn, not fork: the Streamlit server is multi-threaded
+    return PoolRunner(ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=configure_logging))
+
+
+def consume(queue, secrets: dict, *, stop=None, poll: float = 1.0, handler=run_backup_job) -> int:
+    """
+    Run jobs from `queue` one at a time until `stop` (a threading/multiprocessing
+    Event) is set. Returns the number of jobs handled.
+    """
+    configure_logging()
+    handled = 0
+    while not (stop is not None and stop.is_set()):
+        try:
+            job = queue.get(timeout=poll)
+        except queue_mod.Empty:
+            continue
+        try:
+            handler(job, secrets)
+        except Exception:
+            # run_backup_job records failures itself; this only guards custom handlers
+            logger.exception("backup_consumer_job_failed")
+        handled += 1
+    return handled
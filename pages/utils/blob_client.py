@@ -0,0 +1,27 @@
+# FILE: utils/blob_client.py
+"""The process-wide BlobServiceClient every page shares (one pooled transport per server)."""
+import os
+
+import streamlit as st
+
+from pages.utils.blob_io import make_blob_service_client
+
+
+def connection_string() -> str | None:
+    return st.secrets.get("AZURE_CONNECTION_STRING") or os.getenv("AZURE_CONNECTION_STRING")
+
+
+@st.cache_resource(show_spinner=False)
+def _client_for(conn_str: str):
+    return make_blob_service_client(conn_str)
+
+
+def get_blob_service_client():
+    """Shared client for AZURE_CONNECTION_STRING, or None if it isn't configured."""
+    conn = connection_string()
+    return _client_for(conn) if conn else None
+
+
+def get_container_client(container: str = "backup"):
+    bsc = get_blob_service_client()
+    return bsc.get_container_client(container) if bsc else None
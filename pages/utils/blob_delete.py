@@ -0,0 +1,103 @@
+# FILE: utils/blob_delete.py
+"""
+Background deletion of a whole blob prefix via the Blob Batch API.
+
+start_prefix_delete() removes <prefix>/summary.json right away, so the
+folder stops counting as a backup. It then hands the rest to a process-wide
+worker pool that deletes in batches of BATCH_SIZE (the Batch API maximum)
+and returns straight away. Progress lives on the returned PrefixDelete and
+is visible to later reruns through active_deletes().
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("liveon.app")
+
+BATCH_SIZE = 256  # Blob Batch API limit per request
+BATCH_WORKERS = 4
+# Deleted first and synchronously: without it the folder no longer lists as a backup
+MARKER_BLOB = "summary.json"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefix-delete")
+_tasks: dict = {}
+_tasks_lock = threading.Lock()
+
+
+class PrefixDelete:
+    """Progress of one prefix deletion; `state` is running | complete | failed."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.state = "running"
+        self.total = None  # known once the prefix is listed
+        self.deleted = 0
+        self.failed = 0
+        self.error = None
+        self.future = None
+
+    @property
+    def progress(self) -> int:
+        if self.state != "running":
+            return 100
+        return int(100 * (self.deleted + self.failed) / self.total) if self.total else 0
+
+
+def _delete_batch(container, names: list) -> int:
+    """Delete one batch; returns how many blobs could not be deleted (already-gone blobs count as deleted)."""
+    try:
+        responses = container.delete_blobs(*names, delete_snapshots="include", raise_on_any_failure=False)
+        return sum(1 for r in responses if getattr(r, "status_code", 202) not in (200, 202, 404))
+    except Exception as e:
+        # Batch not supported (e.g. some SAS/emulator setups): fall back to single deletes
+        logger.info("batch_delete_unavailable error=%s", e)
+    failed = 0
+    for name in names:
+        try:
+            container.get_blob_client(name).delete_blob(delete_snapshots="include")
+        except Exception as e:
+            if getattr(e, "status_code", None) != 404:
+                failed += 1
+    return failed
+
+
+def delete_prefix(container, prefix: str, *, task: PrefixDelete | None = None,
+                  workers: int = BATCH_WORKERS) -> PrefixDelete:
+    """Delete everything under <prefix>/ in BATCH_SIZE batches, updating `task` as batches finish."""
+    task = task or PrefixDelete(prefix)
+    try:
+        names = [b.name for b in container.list_blobs(name_starts_with=f"{prefix.rstrip('/')}/")]
+        task.total = len(names)
+        batches = [names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for batch, failed in zip(batches, pool.map(lambda b: _delete_batch(container, b), batches)):
+                task.failed += failed
+                task.deleted += len(batch) - failed
+        task.state = "failed" if task.failed else "complete"
+    except Exception as e:
+        task.state, task.error = "failed", str(e)
+    if task.state == "failed":
+        logger.warning("prefix_delete_failed prefix=%s failed=%s error=%s", prefix, task.failed, task.error)
+    return task
+
+
+def start_prefix_delete(container, prefix: str) -> PrefixDelete:
+    """Queue a background delete of <prefix>/ (one per prefix at a time) and return its progress handle."""
+    prefix = prefix.rstrip("/")
+    with _tasks_lock:
+        task = _tasks.get(prefix)
+        if task is not None and task.state == "running":
+            return task
+        task = _tasks[prefix] = PrefixDelete(prefix)
+    try:
+        container.get_blob_client(f"{prefix}/{MARKER_BLOB}").delete_blob(delete_snapshots="include")
+    except Exception:
+        pass  # not there, or the batch picks it up
+    task.future = _executor.submit(delete_prefix, container, prefix, task=task)
+    return task
+
+
+def active_deletes(under: str = "") -> list:
+    """Deletions still running for prefixes starting with `under`."""
+    with _tasks_lock:
+        return [t for p, t in _tasks.items() if p.startswith(under) and t.state == "running"]
@@ -0,0 +1,207 @@
+# FILE: utils/blob_io.py
+"""Streaming and parallel upload helpers for Azure Blob Storage."""
+import base64
+import io
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobBlock, BlobServiceClient, ContentSettings
+
+from pages.utils.http_pool import make_session
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+# Files above this size get parallel block staging inside upload_blob
+LARGE_BLOB_BYTES = 32 * 1024 * 1024
+# Keep-alive connections per storage host; sized for the parallel copy/delete/ZIP/entitlement pools
+BLOB_POOL_SIZE = 64
+
+
+def make_blob_service_client(conn_str: str, pool_size: int = BLOB_POOL_SIZE) -> BlobServiceClient:
+    """
+    BlobServiceClient on a pooled requests Session, so concurrent calls reuse
+    warm TLS connections instead of each opening (and dropping) its own.
+    The client is thread-safe; build one per process and share it.
+    """
+    session = make_session(per_host=pool_size, hosts=4)
+    return BlobServiceClient.from_connection_string(
+        conn_str, transport=RequestsTransport(session=session, session_owner=False),
+    )
+
+
+class TeeReader(io.RawIOBase):
+    """
+    Read-through wrapper around an HTTP response body. Everything read is
+    passed on to the consumer (e.g. upload_blob) and, while the total stays
+    under `keep_limit`, also kept so it can be reused afterwards (captioning).
+    """
+
+    def __init__(self, raw, keep_limit: int = 0, decode_content: bool = True):
+        self._raw = raw
+        self._decode = decode_content
+        self._keep_limit = keep_limit
+        self._kept = bytearray()
+        self.overflowed = False
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._raw.read(len(b), decode_content=self._decode)
+        n = len(chunk)
+        b[:n] = chunk
+        self.bytes_read += n
+        if not self.overflowed:
+            if len(self._kept) + n <= self._keep_limit:
+                self._kept += chunk
+            else:
+                self.overflowed = True
+                self._kept = bytearray()
+        return n
+
+    def kept_bytes(self) -> bytes | None:
+        """Bytes seen so far, or None if the body outgrew keep_limit."""
+        return None if self.overflowed else bytes(self._kept)
+
+
+class StreamedBlob:
+    """Handle for an image that went straight from the CDN into blob storage."""
+    __slots__ = ("blob_path", "name", "size", "data")
+
+    def __init__(self, blob_path: str, name: str, size: int, data: bytes | None):
+        self.blob_path = blob_path
+        self.name = name
+        self.size = size
+        self.data = data  # small copy kept for captioning; cleared once used
+
+    def take_data(self) -> bytes | None:
+        data, self.data = self.data, None
+        return data
+
+
+class BlockBlobWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable file object that uploads to a block blob as it
+    goes: every `block_size` bytes are staged as one block and the block list
+    is committed on close(). Memory use is one block regardless of total size.
+
+    Used as a context manager, an exception inside the block skips the commit,
+    so a half-written archive never replaces an existing blob (uncommitted
+    blocks are discarded by the service).
+
+    Block IDs carry a per-writer random prefix, so two writers racing on the
+    same blob never stage over each other's blocks; the later commit fails
+    instead of committing a mix of both.
+    """
+
+    def __init__(self, blob_client, block_size: int = DEFAULT_BLOCK_SIZE, content_type: str | None = None):
+        self._bc = blob_client
+        self._block_size = block_size
+        self._content_type = content_type
+        self._buf = bytearray()
+        self._blocks: list = []
+        self._id_prefix = uuid.uuid4().hex
+        self._pos = 0
+        self._aborted = False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._pos
+
+    def write(self, b):
+        n = len(b)
+        self._buf += b
+        self._pos += n
+        while len(self._buf) >= self._block_size:
+            self._stage(bytes(self._buf[:self._block_size]))
+            del self._buf[:self._block_size]
+        return n
+
+    def _stage(self, chunk: bytes):
+        block_id = base64.b64encode(f"{self._id_prefix}{len(self._blocks):08d}".encode()).decode()
+        self._bc.stage_block(block_id=block_id, data=chunk, length=len(chunk))
+        self._blocks.append(BlobBlock(block_id=block_id))
+
+    def abort(self):
+        self._aborted = True
+        self._buf = bytearray()
+
+    def close(self):
+        if not self.closed and not self._aborted:
+            if self._buf:
+                self._stage(bytes(self._buf))
+                self._buf = bytearray()
+            kwargs = {}
+            if self._content_type:
+                kwargs["content_settings"] = ContentSettings(content_type=self._content_type)
+            self._bc.commit_block_list(self._blocks, **kwargs)
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        self.close()
+        return False
+
+
+def upload_files(container, files, *, workers: int = 8, max_concurrency: int = 4,
+                 is_last=None, large_blob_bytes: int = LARGE_BLOB_BYTES) -> int:
+    """
+    Upload [(local_path, blob_path), ...] with `workers` files in flight.
+    Large files additionally stage their blocks `max_concurrency` at a time.
+
+    Files matching `is_last(blob_path)` are held back until every other upload
+    has finished (an ordering barrier), so a marker such as posts+cap.json is
+    only committed once the rest of the backup is in place. The first failure
+    is re-raised after the pool drains, and the held-back files are then skipped.
+    Returns the number of files uploaded.
+    """
+    first, last = [], []
+    for local_path, blob_path in files:
+        (last if is_last and is_last(blob_path) else first).append((local_path, blob_path))
+
+    def _put(item):
+        local_path, blob_path = item
+        kwargs = {}
+        if os.path.getsize(local_path) > large_blob_bytes:
+            kwargs["max_concurrency"] = max_concurrency
+        with open(local_path, "rb") as f:
+            container.get_blob_client(blob_path).upload_blob(f, overwrite=True, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_put, item) for item in first]
+    for fut in futures:
+        fut.result()
+
+    for item in last:
+        _put(item)
+    return len(first) + len(last)
+
+
+def copy_blob(container, src_path: str, dst_path: str, *, timeout: float = 120, poll: float = 0.5) -> str:
+    """
+    Server-side copy within the same account (no bytes pass through us). Same-account
+    copies are authorised by the client's own credential and usually finish
+    synchronously; a pending copy is polled until done. Returns dst_path.
+    """
+    dst = container.get_blob_client(dst_path)
+    result = dst.start_copy_from_url(container.get_blob_client(src_path).url)
+    status = result.get("copy_status")
+    deadline = time.monotonic() + timeout
+    while status == "pending":
+        if time.monotonic() > deadline:
+            dst.abort_copy(result.get("copy_id"))
+            raise TimeoutError(f"Copy of {src_path} did not finish in {timeout}s")
+        time.sleep(poll)
+        status = dst.get_blob_properties().copy.status
+    if status != "success":
+        raise RuntimeError(f"Copy of {src_path} ended with status {status}")
+    return dst_path
@@ -0,0 +1,145 @@
+# FILE: utils/captioning.py
+"""
+Azure Vision captioning with a rate limit, 429-aware retries and a
+content-addressed caption cache in blob storage.
+
+Captions are keyed by the SHA-256 of the image bytes, so re-running a
+backup (or an incremental one that re-downloads a photo) never pays for
+the same image twice.
+"""
+import hashlib
+import json
+import threading
+import time
+
+import requests
+
+from pages.utils.http_pool import make_session, request_with_retry
+
+VISION_API_VERSION = "v3.2"
+CACHE_PREFIX = f"_caption_cache/{VISION_API_VERSION}"
+# Vision S1 allows 10 transactions/second; F0 is 20/minute (set VISION_MAX_TPS=0.33)
+DEFAULT_MAX_TPS = 10.0
+# Answers that mean "no caption this time" — never cached
+_NOT_CACHED_PREFIX = "No caption"
+
+_limiters: dict = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across all threads sharing it.
+    Limiters live in one process: with several worker processes, give each its
+    share of the resource's rate.
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _limiter_for(endpoint: str, rate: float) -> RateLimiter:
+    # One limiter per Vision resource per process, however many jobs share it
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = _limiters[endpoint] = RateLimiter(rate)
+        return limiter
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class CaptionService:
+    """
+    caption(image) -> str for bytes or a local path. At most `max_concurrency`
+    requests are in flight and they are paced to `max_tps` (per process, see
+    RateLimiter); 429/5xx answers
+    are retried with backoff honouring Retry-After. With a `container`,
+    successful captions are cached at _caption_cache/v3.2/<aa>/<sha256>.json.
+    """
+
+    def __init__(self, endpoint: str | None, key: str | None, *, container=None,
+                 max_concurrency: int = 5, max_tps: float = DEFAULT_MAX_TPS, timeout: int = 8):
+        self.endpoint = endpoint.rstrip("/") if endpoint else None
+        self.key = key
+        self.container = container
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._limiter = _limiter_for(self.endpoint or "", max_tps)
+        self._session = make_session(per_host=max(1, max_concurrency), hosts=2)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.endpoint and self.key)
+
+    def _cache_blob(self, digest: str):
+        return self.container.get_blob_client(f"{CACHE_PREFIX}/{digest[:2]}/{digest}.json")
+
+    def cached(self, digest: str) -> str | None:
+        if self.container is None:
+            return None
+        try:
+            return json.loads(self._cache_blob(digest).download_blob().readall()).get("caption")
+        except Exception:
+            return None
+
+    def _store(self, digest: str, caption: str) -> None:
+        if self.container is None:
+            return
+        try:
+            self._cache_blob(digest).upload_blob(json.dumps({"caption": caption}).encode("utf-8"), overwrite=True)
+        except Exception:
+            pass  # cache is best-effort
+
+    def _analyze(self, data: bytes) -> str:
+        url = f"{self.endpoint}/vision/{VISION_API_VERSION}/analyze?visualFeatures=Description,Tags,Objects"
+        headers = {"Ocp-Apim-Subscription-Key": self.key, "Content-Type": "application/octet-stream"}
+        with self._slots:
+            self._limiter.wait()
+            r = request_with_retry(self._session, "POST", url, headers=headers, data=data, timeout=self.timeout)
+        r.raise_for_status()
+        result = r.json()
+        captions = (result.get("description", {}).get("captions") or [{}])
+        return captions[0].get("text", "") or ""
+
+    def caption(self, image) -> str:
+        if not self.configured:
+            return "No caption (Azure Vision API not configured)"
+        try:
+            if isinstance(image, (bytes, bytearray)):
+                data = bytes(image)
+            else:
+                with open(image, "rb") as f: data = f.read()
+            digest = content_hash(data)
+            hit = self.cached(digest)
+            if hit is not None:
+                self.hits += 1
+                return hit
+            self.misses += 1
+            text = self._analyze(data)
+        except requests.exceptions.Timeout:
+            return "No caption (timeout)"
+        except Exception as e:
+            return f"No caption (API error: {e})"
+        if not text.startswith(_NOT_CACHED_PREFIX):
+            self._store(digest, text)
+        return text
+
+    def close(self) -> None:
+        self._session.close()
@@ -0,0 +1,89 @@
+# FILE: utils/entitlements.py
+"""
+What a backup prefix has been paid for, resolved in one call.
+
+Payment state is spread over several blobs, kept for compatibility:
+entitlements.json, the legacy project_meta.json(.json),
+scrapbook_entitlements.json and zero-byte .paid.* markers.
+resolve_entitlements() fetches all of them in parallel and returns
+{"memories", "download", "scrapbook"} flags. Results are cached per prefix
+in-process; payment writers call invalidate_entitlements().
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+JSON_BLOBS = ("entitlements.json", "project_meta.json", "project_meta.json.json", "scrapbook_entitlements.json")
+MARKER_BLOBS = (".paid.memories", ".paid.download", ".paid.scrapbook", ".paid", "paid.flag")
+# Paid flags don't go back to unpaid, so positive answers can live longer
+PAID_TTL = 600
+UNPAID_TTL = 30
+
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="entitlements")
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def _fetch(container, blob_path: str, want_body: bool):
+    """Blob body (or b"" for markers), or None if it doesn't exist / can't be read."""
+    try:
+        bc = container.get_blob_client(blob_path)
+        if want_body:
+            return bc.download_blob().readall()
+        return b"" if bc.exists() else None
+    except Exception:
+        return None
+
+
+def _json(raw) -> dict:
+    try:
+        data = json.loads(raw.decode("utf-8")) if raw else {}
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def read_entitlements(container, prefix: str) -> dict:
+    """Uncached resolution: every candidate blob fetched in parallel, one round trip deep."""
+    prefix = prefix.rstrip("/")
+    names = [(n, True) for n in JSON_BLOBS] + [(n, False) for n in MARKER_BLOBS]
+    found = dict(zip(
+        (n for n, _ in names),
+        _pool.map(lambda item: _fetch(container, f"{prefix}/{item[0]}", item[1]), names),
+    ))
+    ent = _json(found["entitlements.json"])
+    metas = [_json(found[n]) for n in ("project_meta.json", "project_meta.json.json")]
+    scrap = _json(found["scrapbook_entitlements.json"])
+    marker = lambda *ns: any(found[n] is not None for n in ns)
+
+    download = bool(ent.get("download") or ent.get("is_paid") or ent.get("paid")) \
+        or marker(".paid.download", ".paid.memories", ".paid", "paid.flag")
+    memories = bool(ent.get("memories") or ent.get("download") or ent.get("is_paid") or ent.get("paid")) \
+        or any(m.get("is_paid") or m.get("paid") or (m.get("entitlements", {}) or {}).get("memories") for m in metas) \
+        or marker(".paid.memories", ".paid", "paid.flag")
+    scrapbook = marker(".paid.scrapbook") or bool(scrap.get("scrapbook") or scrap.get("paid"))
+    return {"memories": memories, "download": download, "scrapbook": scrapbook}
+
+
+def resolve_entitlements(container, prefix: str) -> dict:
+    """Cached read_entitlements(); never raises (unreadable means unpaid)."""
+    key = prefix.rstrip("/")
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            return dict(hit[1])
+    try:
+        flags = read_entitlements(container, key)
+    except Exception:
+        return {"memories": False, "download": False, "scrapbook": False}
+    ttl = PAID_TTL if all(flags.values()) else UNPAID_TTL
+    with _cache_lock:
+        _cache[key] = (now + ttl, flags)
+    return dict(flags)
+
+
+def invalidate_entitlements(prefix: str) -> None:
+    with _cache_lock:
+        _cache.pop(prefix.rstrip("/"), None)
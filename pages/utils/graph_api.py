@@ -0,0 +1,214 @@
+# FILE: utils/graph_api.py
+"""
+Facebook Graph API helpers shared by the Projects and Memories pages.
+
+All calls go through one process-wide keep-alive session, so paging through
+a large account reuses a warm TLS connection instead of reconnecting per page.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+from pages.utils.http_pool import make_session, get_with_retry, request_with_retry
+
+GRAPH_BASE = "https://graph.facebook.com"
+# Graph accepts at most 50 sub-requests per batch call
+BATCH_LIMIT = 50
+# Cached GETs live long enough to cover one login / backup start, not longer
+CACHE_TTL = 120
+CACHE_MAX_ENTRIES = 512
+
+_session = None
+_session_lock = threading.Lock()
+_cache: dict = {}  # (token hash, relative_url) -> (expires_at, body)
+_cache_lock = threading.Lock()
+
+
+def graph_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session(per_host=8, hosts=4)
+        return _session
+
+
+class GraphAPIError(Exception):
+    """Graph returned an `error` object instead of data."""
+
+    def __init__(self, error: dict):
+        self.error = error or {}
+        super().__init__(self.error.get("message", "Unknown Facebook API error"))
+
+
+def _get_json(url: str, timeout: int):
+    resp = get_with_retry(graph_session(), url, timeout=timeout)
+    try:
+        body = resp.json()
+    except ValueError:
+        resp.raise_for_status()
+        raise
+    if isinstance(body, dict) and "error" in body:
+        raise GraphAPIError(body["error"])
+    resp.raise_for_status()
+    return body
+
+
+def relative_url(url: str) -> str:
+    """Strip the host and access_token from a Graph URL (e.g. a paging.next link) so it can be stored."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "access_token"]
+    return f"{parts.path.lstrip('/')}?{urlencode(query)}"
+
+
+def _cache_key(token: str, relative_url: str) -> tuple:
+    return hashlib.sha256(token.encode()).hexdigest()[:24], relative_url
+
+
+def _cache_get(key):
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > time.time():
+            return hit[1]
+        _cache.pop(key, None)
+    return None
+
+
+def _cache_put(key, body):
+    with _cache_lock:
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            now = time.time()
+            stale = [k for k, (expires, _) in _cache.items() if expires <= now]
+            # Nothing expired yet: drop the oldest quarter (dicts keep insertion order)
+            for k in stale or list(_cache)[:CACHE_MAX_ENTRIES // 4]:
+                del _cache[k]
+        _cache[key] = (time.time() + CACHE_TTL, body)
+
+
+def _parse_batch_item(item):
+    if item is None:  # Graph drops sub-requests it timed out on
+        return GraphAPIError({"message": "Batch sub-request timed out"})
+    try:
+        body = json.loads(item.get("body") or "null")
+    except ValueError:
+        body = None
+    if isinstance(body, dict) and "error" in body:
+        return GraphAPIError(body["error"])
+    if item.get("code") != 200 or body is None:
+        return GraphAPIError({"message": f"Batch sub-request failed with HTTP {item.get('code')}", "code": item.get("code")})
+    return body
+
+
+def graph_get_many(token: str, relative_urls: list[str], timeout: int = 20) -> list:
+    """
+    GET several Graph paths (e.g. "me?fields=id,name", "me/permissions") for
+    one token. Paths already in the per-token cache are served from it, the
+    rest go out as a single `batch=` POST (one plain GET if only one is left).
+
+    Returns a list aligned with `relative_urls`: the parsed body, or a
+    GraphAPIError instance for sub-requests that failed (those aren't cached).
+    Transport errors on the call itself propagate.
+    """
+    keys = [_cache_key(token, u) for u in relative_urls]
+    results = [_cache_get(k) for k in keys]
+    missing = list(dict.fromkeys(u for u, r in zip(relative_urls, results) if r is None))
+
+    fetched = {}
+    if len(missing) == 1:
+        url = missing[0]
+        sep = "&" if "?" in url else "?"
+        try:
+            fetched[url] = _get_json(f"{GRAPH_BASE}/{url}{sep}{urlencode({'access_token': token})}", timeout)
+        except GraphAPIError as e:
+            fetched[url] = e
+    for i in range(0, len(missing) if len(missing) > 1 else 0, BATCH_LIMIT):
+        chunk = missing[i:i + BATCH_LIMIT]
+        resp = request_with_retry(graph_session(), "POST", GRAPH_BASE, timeout=timeout, data={
+            "access_token": token,
+            "include_headers": "false",
+            "batch": json.dumps([{"method": "GET", "relative_url": u} for u in chunk]),
+        })
+        body = resp.json()
+        if isinstance(body, dict) and "error" in body:
+            raise GraphAPIError(body["error"])
+        resp.raise_for_status()
+        for url, item in zip(chunk, body):
+            fetched[url] = _parse_batch_item(item)
+
+    for url, body in fetched.items():
+        if not isinstance(body, GraphAPIError):
+            _cache_put(_cache_key(token, url), body)
+    return [r if r is not None else fetched[u] for u, r in zip(relative_urls, results)]
+
+
+def graph_get(token: str, relative_url: str, timeout: int = 20) -> dict:
+    """Cached single GET; raises GraphAPIError if Graph returned an error."""
+    body = graph_get_many(token, [relative_url], timeout=timeout)[0]
+    if isinstance(body, GraphAPIError):
+        raise body
+    return body
+
+
+def graph_prefetch(token: str, relative_urls: list[str], timeout: int = 20) -> None:
+    """Warm the cache for paths that will be read shortly, in one batch call. Never raises."""
+    try:
+        graph_get_many(token, relative_urls, timeout=timeout)
+    except Exception:
+        pass
+
+
+class GraphPager:
+    """
+    Iterate a Graph edge page by page: `for items in GraphPager(...)` yields
+    each page's `data` list. As soon as a page arrives the request for the
+    next cursor is started in the background, so the caller can work on page
+    N while page N+1 is in flight.
+
+    Only `fields` are requested (keep them trimmed to what the caller uses).
+    The first page is read through the per-token cache, so it can be warmed
+    together with other calls via graph_prefetch(token, [pager.relative_url, ...]).
+    `page_url` is the token-free URL of the page last yielded; passing one back
+    as `start_url` resumes listing from that page.
+    After iteration, `truncated` is True if max_pages stopped us while Graph
+    still had more pages. Errors raise GraphAPIError / requests exceptions;
+    pages already yielded stay with the caller.
+    """
+
+    def __init__(self, endpoint: str, token: str, *, fields: str | None = None, limit: int = 100,
+                 max_pages: int = 1000, timeout: int = 20, start_url: str | None = None, **params):
+        query = {"limit": limit}
+        if fields:
+            query["fields"] = fields
+        query.update({k: v for k, v in params.items() if v is not None})
+        self.token = token
+        self.relative_url = start_url or f"{endpoint.lstrip('/')}?{urlencode(query)}"
+        self.page_url = None
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.pages = 0
+        self.truncated = False
+
+    def __iter__(self):
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            fut = prefetch.submit(graph_get, self.token, self.relative_url, self.timeout)
+            url = self.relative_url
+            while fut is not None:
+                body = fut.result()
+                self.pages += 1
+                self.page_url = url
+                next_url = (body.get("paging") or {}).get("next")
+                fut = None
+                if next_url:
+                    if self.pages < self.max_pages:
+                        fut = prefetch.submit(_get_json, next_url, self.timeout)
+                        url = relative_url(next_url)
+                    else:
+                        self.truncated = True
+                yield body.get("data", [])
+
+    def items(self):
+        """Flatten pages into a stream of individual items."""
+        for page in self:
+            yield from page
@@ -0,0 +1,62 @@
+# FILE: utils/http_pool.py
+"""Pooled HTTP sessions and retry helpers shared by the backup pipeline."""
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth retrying: throttling plus transient server-side failures.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def make_session(per_host: int = 6, hosts: int = 32) -> requests.Session:
+    """
+    Build a keep-alive Session whose connection pool holds at most `per_host`
+    connections to any one host. pool_block=True makes extra threads wait for
+    a free connection instead of opening throwaway ones, so this doubles as the
+    per-host concurrency limit.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=per_host, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _retry_after(resp) -> float:
+    try:
+        return float(resp.headers.get("Retry-After") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def request_with_retry(session, method: str, url: str, *, retries: int = 4,
+                       backoff: float = 0.5, max_backoff: float = 20.0, **kwargs):
+    """
+    Issue `method url` on `session`, retrying 429/5xx responses and connection
+    errors with full-jitter exponential backoff (honours Retry-After).
+    The last response is returned as-is once retries are exhausted.
+    """
+    kwargs.setdefault("timeout", 10)
+    attempt = 0
+    while True:
+        resp = None
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= retries:
+                raise
+        if resp is not None and (resp.status_code not in RETRY_STATUSES or attempt >= retries):
+            return resp
+
+        delay = random.uniform(0, min(max_backoff, backoff * (2 ** attempt)))
+        if resp is not None:
+            delay = max(delay, min(max_backoff, _retry_after(resp)))
+            resp.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def get_with_retry(session, url: str, **kwargs):
+    return request_with_retry(session, "GET", url, **kwargs)
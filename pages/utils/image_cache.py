@@ -0,0 +1,147 @@
+# FILE: utils/image_cache.py
+"""
+Size-bounded, content-addressed image cache on local disk.
+
+Image bytes are stored once under objects/<aa>/<sha256>. A lookup key
+(the caller's choice, e.g. "blob:<path>@<etag>" or a canonical URL) maps to
+its object through a small file under keys/, so two keys for the same image
+share one copy. Reads bump the object's mtime; when the cache grows past
+max_bytes the least recently used objects are deleted until it is back
+under LOW_WATER of the limit.
+
+Everything is plain files written with an atomic rename, so the Streamlit
+server and its worker processes can share one directory. The size total
+is tracked per process, so the limit is approximate when several write at once.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Eviction stops once the cache is this fraction of max_bytes
+LOW_WATER = 0.8
+
+_caches: dict = {}
+_caches_lock = threading.Lock()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class ImageCache:
+    def __init__(self, root, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size = None  # bytes under objects/, counted on the first write
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key_path(self, key: str) -> Path:
+        digest = _sha256(key.encode("utf-8"))
+        return self.root / "keys" / digest[:2] / digest
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def _objects(self):
+        for path in self.root.glob("objects/*/*"):
+            if "." not in path.name:  # skip half-written .tmp files
+                yield path
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            path = self._object_path(self._key_path(key).read_text().strip())
+            data = path.read_bytes()
+            os.utime(path)  # mtime is the LRU clock (atime is often disabled)
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store `data` under `key`; returns its content hash."""
+        digest = _sha256(data)
+        path = self._object_path(digest)
+        if path.exists():
+            os.utime(path)
+        else:
+            _write_atomic(path, data)
+            self._grew(len(data))
+        _write_atomic(self._key_path(key), digest.encode("ascii"))
+        return digest
+
+    def get_or_fetch(self, key: str | None, fetch) -> bytes | None:
+        """Cached bytes for `key`, else fetch() (stored if it returns anything). A None key skips the cache."""
+        if key:
+            data = self.get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+        self.misses += 1
+        data = fetch()
+        if data and key:
+            try:
+                self.put(key, data)
+            except OSError:
+                pass  # full or read-only disk: the cache is best-effort
+        return data
+
+    def _grew(self, n: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._objects())
+            else:
+                self._size += n
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self._objects():
+            try:
+                st = path.stat()
+            except OSError:
+                continue  # evicted by another process
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * LOW_WATER
+        evicted = set()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted.add(path.name)
+        self._size = total
+        if evicted:
+            # Drop keys that now point at nothing
+            for key_path in self.root.glob("keys/*/*"):
+                try:
+                    if key_path.read_text().strip() in evicted:
+                        key_path.unlink()
+                except OSError:
+                    continue
+
+
+def get_image_cache(root, max_bytes: int = DEFAULT_MAX_BYTES) -> ImageCache:
+    """The shared cache for this directory (created on first use)."""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = ImageCache(root, max_bytes)
+        cache.max_bytes = max_bytes
+        return cache
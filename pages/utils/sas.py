@@ -0,0 +1,128 @@
+# FILE: utils/sas.py
+"""
+Process-wide read-only SAS signing.
+
+get_signer() hands out one SasSigner per (account, container). It parses
+the connection string once and reuses tokens until they are past half
+their lifetime. Two credential paths:
+
+- AccountKey in the connection string: tokens are signed with the key.
+- No key, but a service client with an Azure AD credential: a user
+  delegation key is fetched and cached, and tokens are signed with it.
+
+scope="blob" (the default) signs each blob separately. scope="container"
+signs one token and appends it to every URL. That is cheaper for
+galleries with hundreds of images, but anyone holding one URL can read
+the whole container, so only use it when the container is not shared
+between users.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from azure.storage.blob import (BlobSasPermissions, ContainerSasPermissions, generate_blob_sas,
+                                generate_container_sas)
+
+DEFAULT_MINUTES = 24 * 60
+# Signed per-blob tokens kept per signer before the cache starts over
+CACHE_MAX_ENTRIES = 50_000
+
+_signers: dict = {}
+_signers_lock = threading.Lock()
+
+
+def parse_connection_string(conn_str: str | None) -> dict:
+    return dict(p.split("=", 1) for p in (conn_str or "").split(";") if "=" in p)
+
+
+class SasSigner:
+    def __init__(self, account_name: str, container: str, *, account_key: str | None = None,
+                 service_client=None, scope: str = "blob"):
+        self.account_name = account_name
+        self.container = container
+        self.scope = scope
+        self._account_key = account_key
+        self._service_client = service_client
+        self._delegation = None  # (key, expiry)
+        self._delegation_unavailable = False
+        self._cache: dict = {}  # (blob_path | None, minutes, download_as) -> (url or token, refresh_at)
+        self._lock = threading.Lock()
+
+    @property
+    def can_sign(self) -> bool:
+        return bool(self._account_key or self._service_client is not None)
+
+    def _credential(self, expiry: datetime) -> dict | None:
+        if self._account_key:
+            return {"account_key": self._account_key}
+        if self._service_client is None or self._delegation_unavailable:
+            return None
+        with self._lock:
+            if self._delegation is None or self._delegation[1] < expiry:
+                start = datetime.now(timezone.utc) - timedelta(minutes=5)
+                key_expiry = max(expiry, start + timedelta(days=1))
+                try:
+                    key = self._service_client.get_user_delegation_key(start, key_expiry)
+                except Exception:
+                    # Shared-key or SAS connection: user delegation isn't available, don't ask again
+                    self._delegation_unavailable = True
+                    return None
+                self._delegation = (key, key_expiry)
+            return {"user_delegation_key": self._delegation[0]}
+
+    def _base_url(self, blob_path: str) -> str:
+        return f"https://{self.account_name}.blob.core.windows.net/{self.container}/{quote(blob_path, safe='/')}"
+
+    def _token(self, blob_path: str | None, minutes: int, download_as: str | None) -> str | None:
+        key = (blob_path if self.scope == "blob" or download_as else None, minutes, download_as)
+        now = datetime.now(timezone.utc)
+        hit = self._cache.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+        expiry = now + timedelta(minutes=minutes)
+        cred = self._credential(expiry)
+        if cred is None:
+            return None
+        if key[0] is None:
+            token = generate_container_sas(
+                account_name=self.account_name, container_name=self.container,
+                permission=ContainerSasPermissions(read=True), expiry=expiry, **cred,
+            )
+        else:
+            extra = {"content_disposition": f'attachment; filename="{download_as}"'} if download_as else {}
+            token = generate_blob_sas(
+                account_name=self.account_name, container_name=self.container, blob_name=blob_path,
+                permission=BlobSasPermissions(read=True), expiry=expiry, **cred, **extra,
+            )
+        if len(self._cache) >= CACHE_MAX_ENTRIES:
+            self._cache.clear()
+        # Re-sign once half the lifetime is gone so handed-out URLs always have time left
+        self._cache[key] = (token, now + timedelta(minutes=minutes / 2))
+        return token
+
+    def url(self, blob_path: str, *, minutes: int = DEFAULT_MINUTES, download_as: str | None = None) -> str | None:
+        """Read-only SAS URL for one blob, or None if no credential can sign."""
+        token = self._token(blob_path, minutes, download_as)
+        return f"{self._base_url(blob_path)}?{token}" if token else None
+
+    def urls(self, blob_paths, *, minutes: int = DEFAULT_MINUTES) -> dict:
+        """blob_path -> SAS URL for many blobs, sharing one credential lookup (and one token with scope="container")."""
+        paths = list(dict.fromkeys(blob_paths))
+        if not paths or self._credential(datetime.now(timezone.utc) + timedelta(minutes=minutes)) is None:
+            return {}
+        return {p: self.url(p, minutes=minutes) for p in paths}
+
+
+def get_signer(conn_str: str | None, container: str, *, service_client=None, scope: str = "blob") -> SasSigner:
+    """The shared signer for this account/container (created on first use)."""
+    parts = parse_connection_string(conn_str)
+    account_name = parts.get("AccountName") or getattr(service_client, "account_name", None)
+    key = (account_name, container, scope)
+    with _signers_lock:
+        signer = _signers.get(key)
+        if signer is None:
+            signer = _signers[key] = SasSigner(
+                account_name, container, account_key=parts.get("AccountKey"),
+                service_client=None if parts.get("AccountKey") else service_client, scope=scope,
+            )
+        return signer
@@ -0,0 +1,1111 @@
+# FILE: utils/scrapbook_pdf.py
+"""
+Scrapbook PDF drawing.
+
+A document is a list of page specs, plain tuples that pickle cheaply:
+
+    ("cover", user_name, summary, chapters)   ("toc", chapters)
+    ("quote", text, attribution)              ("chapter", title, number)
+    ("photos", chapter, items, page_num)      ("back",)
+
+Photo items are {"img", "caption", "date"} plus either "_img_bytes" (already
+fetched) or "_img_urls" (signed URLs to try in order). Page numbers travel
+with the photo pages, so any run of pages draws the same on its own.
+render_document() uses that to draw the cover, TOC, each chapter and the back
+cover as separate PDFs and stitch them together with pypdf. Fragments are
+drawn in a process pool (in this process if it can't start) and kept in an
+in-process cache keyed by their content, so a rebuild after one photo changes
+only draws that photo's chapter again. Without pypdf it draws everything on
+one canvas instead.
+
+Nothing in this module may import streamlit: the pool workers import it.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from textwrap import wrap
+
+import requests
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from pages.utils.thumbs import fit_jpeg
+
+try:
+    from pypdf import PdfReader, PdfWriter  # optional: needed to merge fragments drawn in parallel
+except Exception:
+    PdfReader = PdfWriter = None
+
+logger = logging.getLogger("liveon.app")
+
+# PDF photo slots are sized for this print resolution
+PDF_IMAGE_DPI = 150
+PDF_JPEG_QUALITY = 80
+PDF_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+# Rendered fragments kept for rebuilds, least recently used dropped first
+FRAGMENT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+# Per drawing thread: how many photos render_fragment() had to leave out
+_draw_state = threading.local()
+_fragments: OrderedDict = OrderedDict()  # fragment_key -> PDF bytes
+_fragments_size = 0
+_fragments_lock = threading.Lock()
+
+def register_fonts() -> tuple[str, str, str]:
+    try:
+        pdfmetrics.registerFont(TTFont("SpecialElite", "fonts/SpecialElite-Regular.ttf"))
+        pdfmetrics.registerFont(TTFont("PatrickHand", "fonts/PatrickHand-Regular.ttf"))
+        pdfmetrics.registerFont(TTFont("Inter-Bold", "fonts/Inter-Bold.ttf"))
+        return "SpecialElite", "Inter-Bold", "PatrickHand"
+    except:
+        return "Helvetica", "Helvetica-Bold", "Courier"
+
+# ── Storybook colour palette (all RGB 0-1) ────────────────────
+_SB_CREAM      = (0.992, 0.973, 0.941)
+_SB_IVORY      = (0.976, 0.953, 0.914)
+_SB_NAVY       = (0.102, 0.180, 0.290)
+_SB_GOLD       = (0.769, 0.573, 0.227)
+_SB_RUST       = (0.549, 0.239, 0.149)
+_SB_MUTED      = (0.580, 0.560, 0.540)
+_SB_TEXT       = (0.160, 0.160, 0.160)
+_SB_WHITE      = (1.000, 1.000, 1.000)
+_SB_SHADOW     = (0.820, 0.808, 0.790)
+# Soft page-tint palette for variety
+_SB_SAGE       = (0.930, 0.950, 0.930)   # soft green
+_SB_BLUSH      = (0.975, 0.940, 0.940)   # warm pink
+_SB_SKY        = (0.930, 0.945, 0.968)   # dusty blue
+_SB_LINEN      = (0.965, 0.955, 0.935)   # warm linen
+_SB_LAVENDER   = (0.945, 0.935, 0.960)   # soft purple
+_PAGE_TINTS    = [_SB_CREAM, _SB_SAGE, _SB_BLUSH, _SB_SKY, _SB_LINEN, _SB_LAVENDER]
+_TAPE_COLORS   = [
+    (0.94, 0.91, 0.84),   # classic beige
+    (0.88, 0.92, 0.88),   # sage green
+    (0.93, 0.88, 0.88),   # dusty rose
+    (0.88, 0.90, 0.94),   # sky blue
+    (0.92, 0.89, 0.94),   # lavender
+]
+
+# Inspirational quotes for interlude pages
+MEMORY_QUOTES = [
+    ("The best thing about memories is making them.", ""),
+    ("Life is not measured by the breaths we take,\nbut by the moments that take our breath away.", ""),
+    ("Sometimes you will never know the value\nof a moment until it becomes a memory.", "Dr. Seuss"),
+    ("We do not remember days,\nwe remember moments.", "Cesare Pavese"),
+    ("In the end, it's not the years in your life that count.\nIt's the life in your years.", "Abraham Lincoln"),
+    ("Collect moments, not things.", ""),
+    ("The camera is an instrument that teaches\npeople how to see without a camera.", "Dorothea Lange"),
+    ("A photograph is a pause button on life.", ""),
+]
+
+def _sf(c, rgb): c.setFillColorRGB(*rgb)
+def _ss(c, rgb): c.setStrokeColorRGB(*rgb)
+
+def _ornament_corners(c, x, y, w, h, size=18, color=None):
+    color = color or _SB_GOLD
+    _ss(c, color)
+    c.setLineWidth(1.2)
+    for (cx, cy), (sx, sy) in zip(
+        [(x, y+h), (x+w, y+h), (x, y), (x+w, y)],
+        [( 1,-1),  (-1,-1),    ( 1, 1), (-1,  1)]
+    ):
+        c.line(cx, cy, cx + sx*size, cy)
+        c.line(cx, cy, cx, cy + sy*size)
+
+def _divider(c, cx, y, half_w=80, color=None):
+    color = color or _SB_GOLD
+    _ss(c, color)
+    c.setLineWidth(0.8)
+    c.line(cx - half_w, y, cx - 10, y)
+    c.line(cx + 10, y, cx + half_w, y)
+    c.saveState()
+    c.translate(cx, y)
+    c.rotate(45)
+    _sf(c, color)
+    c.rect(-3.5, -3.5, 7, 7, fill=True, stroke=False)
+    c.restoreState()
+
+def _star_divider(c, cx, y, half_w=90, color=None):
+    color = color or _SB_GOLD
+    _ss(c, color)
+    c.setLineWidth(0.6)
+    c.line(cx - half_w, y, cx - 18, y)
+    c.line(cx + 18, y, cx + half_w, y)
+    _sf(c, color)
+    for dx in [-8, 0, 8]:
+        c.saveState()
+        c.translate(cx + dx, y)
+        c.rotate(45)
+        sz = 3.0 if dx == 0 else 2.0
+        c.rect(-sz, -sz, sz*2, sz*2, fill=True, stroke=False)
+        c.restoreState()
+
+def _double_border(c, x, y, w, h, gap=5, color=None):
+    color = color or _SB_NAVY
+    _ss(c, color)
+    c.setLineWidth(1.5)
+    c.rect(x, y, w, h, fill=False, stroke=True)
+    c.setLineWidth(0.5)
+    c.rect(x+gap, y+gap, w-2*gap, h-2*gap, fill=False, stroke=True)
+
+def _corner_flourish(c, x, y, size=30, flip_x=False, flip_y=False, color=None):
+    """Draw a simple elegant corner mark with a small leaf-like accent."""
+    color = color or _SB_GOLD
+    _ss(c, color)
+    _sf(c, color)
+    sx = -1 if flip_x else 1
+    sy = -1 if flip_y else 1
+    # L-shaped corner line
+    c.setLineWidth(0.6)
+    c.line(x, y, x + sx * size, y)
+    c.line(x, y, x, y + sy * size)
+    # Small diamond accent at corner
+    c.saveState()
+    c.translate(x, y)
+    c.rotate(45)
+    c.rect(-2.5, -2.5, 5, 5, fill=True, stroke=False)
+    c.restoreState()
+
+def slot_px(pw: float, ph: float) -> int:
+    """Pixels needed along the longest edge of a pw x ph (points) photo slot."""
+    return int(max(pw, ph) / 72 * PDF_IMAGE_DPI)
+
+def normalize_image(data: bytes, max_px: int | None) -> bytes:
+    """Downsample to the slot's print size and re-encode without EXIF, so the PDF embeds only what it shows."""
+    if not max_px:
+        return data
+    try:
+        return fit_jpeg(data, max_px, quality=PDF_JPEG_QUALITY)
+    except Exception:
+        return data  # no Pillow, or not an image it knows: let ImageReader have a go at the original
+
+def download_image(urls) -> bytes | None:
+    """Bytes of the first of `urls` that downloads."""
+    for url in urls:
+        try:
+            r = requests.get(url, timeout=14)
+            r.raise_for_status()
+            return r.content
+        except Exception:
+            continue
+    return None
+
+def fetch_image(urls, max_px: int | None = None) -> bytes | None:
+    """Bytes of the first of `urls` that downloads, fitted to max_px."""
+    data = download_image(urls)
+    return normalize_image(data, max_px) if data else None
+
+def _item_img(item: dict, max_px: int | None = None) -> "ImageReader | None":
+    """
+    A layout item's image: the prefetched "_img_bytes" if there are any, else
+    a download of its pre-signed "_img_urls".
+    """
+    data = item.pop("_img_bytes", None)  # dropped once drawn so the build's memory shrinks as it goes
+    if data is None:
+        data = fetch_image(item.get("_img_urls") or [], max_px)
+    try:
+        if data:
+            return ImageReader(BytesIO(data))
+    except Exception:
+        pass
+    if item.get("img"):
+        _draw_state.missing = getattr(_draw_state, "missing", 0) + 1
+    return None
+
+def _draw_tape(c, cx, cy, tw=40, th=14, angle=0, color=None):
+    color = color or _TAPE_COLORS[0]
+    c.saveState()
+    c.translate(cx, cy)
+    if angle:
+        c.rotate(angle)
+    _sf(c, color)
+    c.roundRect(-tw/2, -th/2, tw, th, 2, fill=True, stroke=False)
+    # Tape edge lines
+    darker = tuple(max(0, v - 0.04) for v in color)
+    _ss(c, darker)
+    c.setLineWidth(0.2)
+    c.line(-tw/2 + 2, -th/2 + 2, tw/2 - 2, -th/2 + 2)
+    c.line(-tw/2 + 2, th/2 - 2, tw/2 - 2, th/2 - 2)
+    c.restoreState()
+
+def _draw_photo_corners(c, cx, cy, dw, dh, color=None):
+    """Draw vintage album-style photo corner mounts (simple triangles)."""
+    color = color or (0.82, 0.78, 0.68)
+    sz = 11
+    _sf(c, color)
+    # Four corners: draw small rotated squares clipped to triangles
+    for ox, oy, rot in [(-dw/2, -dh/2, 0), (dw/2, -dh/2, 90),
+                         (-dw/2, dh/2, -90), (dw/2, dh/2, 180)]:
+        c.saveState()
+        c.translate(cx + ox, cy + oy)
+        c.rotate(rot)
+        c.rotate(45)
+        c.rect(-sz*0.35, -sz*0.35, sz*0.7, sz*0.7, fill=True, stroke=False)
+        c.restoreState()
+
+def _framed_photo(c, img_reader, cx, cy, pw, ph,
+                  caption="", date_str="", angle=0, style="polaroid",
+                  tape_color=None):
+    """
+    Draw a beautifully framed photo centred on (cx, cy).
+    Styles: 'polaroid', 'clean', 'tape', 'vintage', 'magazine'.
+    """
+    if img_reader:
+        iw, ih = img_reader.getSize()
+        scale = min(pw / iw, ph / ih)
+        dw, dh = iw * scale, ih * scale
+    else:
+        dw, dh = pw * 0.5, ph * 0.5
+
+    c.saveState()
+    c.translate(cx, cy)
+    if angle:
+        c.rotate(angle)
+
+    if style == "polaroid":
+        pad_x, pad_top = 12, 12
+        pad_bot = 48 if caption else 20
+        fw = dw + 2 * pad_x
+        fh = dh + pad_top + pad_bot
+
+        # Layered shadow for depth
+        _sf(c, (0.86, 0.85, 0.83))
+        c.roundRect(-fw/2 + 5, -fh/2 - 5, fw, fh, 4, fill=True, stroke=False)
+        _sf(c, _SB_SHADOW)
+        c.roundRect(-fw/2 + 3, -fh/2 - 3, fw, fh, 4, fill=True, stroke=False)
+
+        # White frame
+        _sf(c, _SB_WHITE)
+        _ss(c, (0.88, 0.86, 0.83))
+        c.setLineWidth(0.4)
+        c.roundRect(-fw/2, -fh/2, fw, fh, 4, fill=True, stroke=True)
+
+        if img_reader:
+            c.drawImage(img_reader, -dw/2, -fh/2 + pad_bot, width=dw, height=dh, mask='auto')
+            # Subtle inner shadow line on photo
+            _ss(c, (0.75, 0.73, 0.70))
+            c.setLineWidth(0.3)
+            c.rect(-dw/2, -fh/2 + pad_bot, dw, dh, fill=False, stroke=True)
+
+        if caption:
+            _sf(c, _SB_TEXT)
+            c.setFont("Courier", 7.5)
+            # Italic-style open/close quotes
+            lines = wrap(caption.strip(), int(fw / 4.8)) or [""]
+            ty = -fh/2 + 6
+            for li, line in enumerate(lines[:3]):
+                prefix = "\u201c " if li == 0 else ""
+                suffix = " \u201d" if li == min(2, len(lines)-1) else ""
+                c.drawCentredString(0, ty, f"{prefix}{line}{suffix}")
+                ty += 10
+
+        if date_str:
+            _sf(c, _SB_RUST)
+            c.setFont("Courier", 6.5)
+            c.drawRightString(fw/2 - 6, fh/2 - 11, date_str)
+
+    elif style == "clean":
+        border = 3
+        fw = dw + border * 2
+        cap_h = 28 if caption else 6
+        fh = dh + border * 2 + cap_h
+
+        # Shadow
+        c.setFillColorRGB(0.87, 0.86, 0.84)
+        c.roundRect(-fw/2 + 3, -fh/2 - 3, fw, fh, 2, fill=True, stroke=False)
+
+        _sf(c, _SB_WHITE)
+        _ss(c, (0.90, 0.88, 0.85))
+        c.setLineWidth(0.3)
+        c.roundRect(-fw/2, -fh/2, fw, fh, 2, fill=True, stroke=True)
+
+        if img_reader:
+            c.drawImage(img_reader, -dw/2, -fh/2 + cap_h, width=dw, height=dh, mask='auto')
+
+        if caption:
+            _sf(c, _SB_MUTED)
+            c.setFont("Courier", 6.5)
+            lines = wrap(caption.strip(), int(fw / 4.4)) or [""]
+            ty = -fh/2 + 4
+            for line in lines[:2]:
+                c.drawCentredString(0, ty, line)
+                ty += 9
+
+        if date_str:
+            _sf(c, _SB_GOLD)
+            c.setFont("Courier", 6)
+            c.drawRightString(fw/2 - 4, fh/2 - 9, date_str)
+
+    elif style == "tape":
+        if img_reader:
+            c.drawImage(img_reader, -dw/2, -dh/2, width=dw, height=dh, mask='auto')
+            _ss(c, (0.90, 0.88, 0.85))
+            c.setLineWidth(0.3)
+            c.rect(-dw/2, -dh/2, dw, dh, fill=False, stroke=True)
+
+        tc = tape_color or _TAPE_COLORS[0]
+        _draw_tape(c, -dw/2 + 18, dh/2 - 1, tw=38, th=12, angle=22, color=tc)
+        _draw_tape(c, dw/2 - 18, dh/2 - 1, tw=38, th=12, angle=-22, color=tc)
+
+        if caption:
+            _sf(c, _SB_TEXT)
+            c.setFont("Courier", 6.5)
+            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
+            ty = -dh/2 - 13
+            for line in lines[:2]:
+                c.drawCentredString(0, ty, line)
+                ty -= 9
+
+        if date_str:
+            _sf(c, _SB_MUTED)
+            c.setFont("Courier", 6)
+            c.drawRightString(dw/2, dh/2 + 14, date_str)
+
+    elif style == "vintage":
+        # Photo with vintage corner mounts (no frame border)
+        if img_reader:
+            c.drawImage(img_reader, -dw/2, -dh/2, width=dw, height=dh, mask='auto')
+        _draw_photo_corners(c, 0, 0, dw, dh)
+
+        if caption:
+            _sf(c, _SB_TEXT)
+            c.setFont("Courier", 6.5)
+            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
+            ty = -dh/2 - 13
+            for line in lines[:2]:
+                c.drawCentredString(0, ty, line)
+                ty -= 9
+
+        if date_str:
+            _sf(c, _SB_RUST)
+            c.setFont("Courier", 6.5)
+            c.drawCentredString(0, dh/2 + 10, date_str)
+
+    elif style == "magazine":
+        # Borderless with gold accent line below
+        if img_reader:
+            c.drawImage(img_reader, -dw/2, -dh/2 + 8, width=dw, height=dh, mask='auto')
+
+        # Gold accent bar under photo
+        _sf(c, _SB_GOLD)
+        c.rect(-dw/2, -dh/2 + 4, dw, 2, fill=True, stroke=False)
+
+        if caption:
+            _sf(c, _SB_NAVY)
+            c.setFont("Courier", 7)
+            lines = wrap(caption.strip(), int(dw / 4.2)) or [""]
+            ty = -dh/2 - 8
+            for line in lines[:2]:
+                c.drawCentredString(0, ty, line)
+                ty -= 9
+
+        if date_str:
+            _sf(c, _SB_GOLD)
+            c.setFont("Courier", 7)
+            c.drawString(-dw/2, -dh/2 - 6, date_str)
+
+    c.restoreState()
+
+def _page_bg(c, W, H, page_num, header=True, footer=True, chap_title="", fonts=None, tint=None):
+    """Render a beautiful content page background with header/footer."""
+    tf, bf, cf = fonts or ("Helvetica", "Helvetica-Bold", "Courier")
+    bg = tint or _PAGE_TINTS[page_num % len(_PAGE_TINTS)]
+
+    # Page background
+    _sf(c, bg)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    # Decorative corner flourishes
+    _corner_flourish(c, 22, H - 22, size=26, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, W - 22, H - 22, size=26, flip_x=True, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, 22, 22, size=26, color=_SB_GOLD)
+    _corner_flourish(c, W - 22, 22, size=26, flip_x=True, color=_SB_GOLD)
+
+    # Thin decorative border
+    _ss(c, (0.88, 0.86, 0.83))
+    c.setLineWidth(0.3)
+    c.roundRect(18, 18, W - 36, H - 36, 3, fill=False, stroke=True)
+
+    if header and chap_title:
+        # Elegant header
+        _sf(c, _SB_NAVY)
+        c.setFont(cf, 7)
+        c.drawCentredString(W/2, H - 28, chap_title.upper())
+        # Thin gold rule
+        _sf(c, _SB_GOLD)
+        c.rect(W/2 - 50, H - 33, 100, 0.4, fill=True, stroke=False)
+
+    if footer:
+        # Decorative footer with diamond
+        _sf(c, _SB_MUTED)
+        c.setFont(cf, 7)
+        c.drawCentredString(W/2, 14, f"-  {page_num}  -")
+        # Tiny gold dots flanking page number
+        _sf(c, _SB_GOLD)
+        c.circle(W/2 - 22, 17, 1.2, fill=True, stroke=False)
+        c.circle(W/2 + 22, 17, 1.2, fill=True, stroke=False)
+
+def _page_decorative_border(c, W, H, M=24):
+    """Subtle decorative border for content pages (legacy compat)."""
+    _ss(c, (0.88, 0.86, 0.83))
+    c.setLineWidth(0.3)
+    c.rect(M, M, W - 2*M, H - 2*M, fill=False, stroke=True)
+    _sf(c, _SB_GOLD)
+    for x, y in [(M, M), (W-M, M), (M, H-M), (W-M, H-M)]:
+        c.circle(x, y, 2, fill=True, stroke=False)
+
+# ── Individual page renderers ──────────────────────────────────
+
+def _page_cover(c, W, H, user_name: str, summary: str, chapters: list, fonts: tuple):
+    tf, bf, cf = fonts
+    M = 28
+
+    # Navy background
+    _sf(c, _SB_NAVY)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    # Gold bands
+    _sf(c, _SB_GOLD)
+    c.rect(0, H - 52, W, 52, fill=True, stroke=False)
+    c.rect(0, 0, W, 40, fill=True, stroke=False)
+
+    # Cream accent lines
+    _sf(c, _SB_CREAM)
+    c.rect(0, H - 54, W, 1, fill=True, stroke=False)
+    c.rect(0, 40, W, 1, fill=True, stroke=False)
+
+    # Borders
+    _double_border(c, M, 44, W - 2*M, H - 100, gap=6, color=_SB_CREAM)
+    _ss(c, _SB_GOLD)
+    c.setLineWidth(0.5)
+    c.rect(M+10, 52, W - 2*M - 20, H - 116, fill=False, stroke=True)
+    _ornament_corners(c, M+14, 56, W - 2*M - 28, H - 124, size=24, color=_SB_GOLD)
+
+    # Corner flourishes on navy body
+    _corner_flourish(c, M+20, H - 60, size=35, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, W-M-20, H - 60, size=35, flip_x=True, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, M+20, 50, size=35, color=_SB_GOLD)
+    _corner_flourish(c, W-M-20, 50, size=35, flip_x=True, color=_SB_GOLD)
+
+    # Eyebrow
+    _sf(c, _SB_GOLD)
+    c.setFont(tf, 9)
+    c.drawCentredString(W/2, H - 84, "F A C E B O O K    M E M O R I E S")
+    _star_divider(c, W/2, H - 98, half_w=100, color=_SB_GOLD)
+
+    # User name
+    _sf(c, _SB_CREAM)
+    font_size = 38 if len(user_name) <= 16 else (28 if len(user_name) <= 24 else 22)
+    c.setFont(bf, font_size)
+    c.drawCentredString(W/2, H/2 + 80, user_name)
+
+    # Thin gold rule
+    _sf(c, _SB_GOLD)
+    c.rect(W/2 - 70, H/2 + 70, 140, 0.8, fill=True, stroke=False)
+
+    # Subtitle
+    c.setFont(tf, 14)
+    c.drawCentredString(W/2, H/2 + 48, "A Life in Memories")
+    _divider(c, W/2, H/2 + 32, half_w=75, color=_SB_GOLD)
+
+    # Summary
+    if summary:
+        _sf(c, (0.78, 0.76, 0.73))
+        c.setFont(cf, 9)
+        lines = wrap(summary.strip()[:380], 56)
+        ty = H/2 + 10
+        for line in lines[:5]:
+            c.drawCentredString(W/2, ty, line)
+            ty -= 13
+
+    # Chapter count
+    _star_divider(c, W/2, H/2 - 80, half_w=55, color=_SB_GOLD)
+    _sf(c, (0.60, 0.58, 0.55))
+    c.setFont(cf, 9)
+    c.drawCentredString(W/2, H/2 - 98, f"{len(chapters)} Chapters  \u00b7  {datetime.now().year}")
+
+    # Branding
+    _sf(c, _SB_NAVY)
+    c.setFont(bf, 10)
+    c.drawCentredString(W/2, 14, "LiveOn")
+
+
+def _page_toc(c, W, H, chapters: list, fonts: tuple):
+    tf, bf, cf = fonts
+    M = 46
+    roman = ["I","II","III","IV","V","VI","VII","VIII","IX","X","XI","XII"]
+
+    _sf(c, _SB_CREAM)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    # Navy top band
+    _sf(c, _SB_NAVY)
+    c.rect(0, H - 66, W, 66, fill=True, stroke=False)
+    _sf(c, _SB_GOLD)
+    c.rect(0, H - 68, W, 2, fill=True, stroke=False)
+
+    _sf(c, _SB_CREAM)
+    c.setFont(bf, 18)
+    c.drawCentredString(W/2, H - 46, "Table of Contents")
+    _sf(c, _SB_GOLD)
+    c.setFont(tf, 8)
+    c.drawCentredString(W/2, H - 58, "- your story in chapters -")
+
+    _double_border(c, M - 10, M - 10, W - 2*M + 20, H - 2*M - 50, gap=5, color=_SB_NAVY)
+    _ornament_corners(c, M - 2, M - 2, W - 2*M + 4, H - 2*M - 66, size=16, color=_SB_GOLD)
+
+    # Flourishes
+    _corner_flourish(c, M, H - 78, size=22, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, W - M, H - 78, size=22, flip_x=True, flip_y=True, color=_SB_GOLD)
+
+    # Fixed column positions for clean alignment
+    col_num   = M + 10            # roman numeral left edge
+    col_dot   = M + 38            # dot separator
+    col_title = M + 46            # chapter title left edge
+    col_end   = W - M - 10        # right edge for page numbers
+    leader_end = col_end - 4
+
+    start_y = H - 108
+    row_h = 34
+    for i, chap in enumerate(chapters):
+        ry = start_y - i * row_h
+        if ry < M + 10:
+            break
+        if i % 2 == 0:
+            _sf(c, _SB_IVORY)
+            c.rect(M, ry - 6, W - 2*M, row_h - 2, fill=True, stroke=False)
+
+        # Roman numeral — right-aligned in its column
+        num = roman[i] if i < len(roman) else str(i + 1)
+        _sf(c, _SB_GOLD)
+        c.setFont(bf, 10)
+        c.drawRightString(col_dot - 6, ry + 8, num)
+
+        # Gold dot separator
+        c.circle(col_dot, ry + 12, 1.5, fill=True, stroke=False)
+
+        # Chapter title — fixed left position
+        _sf(c, _SB_NAVY)
+        c.setFont(tf, 11)
+        c.drawString(col_title, ry + 8, chap)
+
+        # Dotted leader — starts after actual text width
+        title_width = c.stringWidth(chap, tf, 11)
+        leader_start = col_title + title_width + 8
+        if leader_start < leader_end - 20:
+            _ss(c, _SB_MUTED)
+            c.setLineWidth(0.4)
+            c.setDash([1, 4])
+            c.line(leader_start, ry + 12, leader_end, ry + 12)
+            c.setDash()
+
+    _sf(c, _SB_MUTED)
+    c.setFont(cf, 8)
+    c.drawCentredString(W/2, M/2, "- i -")
+
+
+def _page_chapter_title(c, W, H, title: str, num: int, fonts: tuple):
+    tf, bf, cf = fonts
+    roman = ["I","II","III","IV","V","VI","VII","VIII","IX","X","XI","XII"]
+    num_str = roman[num - 1] if num <= 12 else str(num)
+
+    _sf(c, _SB_IVORY)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    # Spine
+    _sf(c, _SB_NAVY)
+    c.rect(0, 0, 48, H, fill=True, stroke=False)
+    _sf(c, _SB_GOLD)
+    c.rect(48, 0, 3, H, fill=True, stroke=False)
+    _sf(c, _SB_CREAM)
+    c.rect(47, 0, 0.5, H, fill=True, stroke=False)
+
+    c.saveState()
+    c.translate(24, H / 2)
+    c.rotate(90)
+    _sf(c, _SB_GOLD)
+    c.setFont(bf, 9)
+    c.drawCentredString(0, 0, f"CHAPTER  {num_str}")
+    c.restoreState()
+
+    # Ghost numeral
+    _sf(c, (0.968, 0.945, 0.906))
+    c.setFont(bf, 150)
+    c.drawRightString(W - 16, H * 0.04, num_str)
+
+    # Corner flourishes on right page
+    cx = 55 + (W - 55) / 2
+    _corner_flourish(c, 62, H - 30, size=28, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, W - 22, H - 30, size=28, flip_x=True, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, 62, 30, size=28, color=_SB_GOLD)
+    _corner_flourish(c, W - 22, 30, size=28, flip_x=True, color=_SB_GOLD)
+
+    # Content
+    _sf(c, _SB_GOLD)
+    c.setFont(cf, 10)
+    c.drawCentredString(cx, H * 0.66, f"Chapter {num_str}")
+    _star_divider(c, cx, H * 0.62, half_w=85, color=_SB_GOLD)
+
+    font_size = 28 if len(title) <= 22 else 20
+    _sf(c, _SB_NAVY)
+    c.setFont(tf, font_size)
+    c.drawCentredString(cx, H * 0.54, title)
+
+    _star_divider(c, cx, H * 0.48, half_w=85, color=_SB_GOLD)
+
+    _sf(c, _SB_MUTED)
+    c.setFont(cf, 9)
+    c.drawCentredString(cx, H * 0.43, "A collection of cherished moments")
+
+    # Gold bottom rule
+    _sf(c, _SB_GOLD)
+    c.rect(55, 0, W - 55, 4, fill=True, stroke=False)
+
+
+def _page_quote(c, W, H, quote_text: str, attribution: str, fonts: tuple):
+    """Render an inspirational quote interlude page."""
+    tf, bf, cf = fonts
+
+    # Soft background
+    _sf(c, _SB_IVORY)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    # Decorative border
+    _ss(c, _SB_GOLD)
+    c.setLineWidth(0.4)
+    c.roundRect(36, 36, W - 72, H - 72, 4, fill=False, stroke=True)
+    _ornament_corners(c, 42, 42, W - 84, H - 84, size=18, color=_SB_GOLD)
+
+    # Large decorative open-quote mark
+    _sf(c, (0.92, 0.90, 0.86))
+    c.setFont(bf, 120)
+    c.drawCentredString(W/2, H * 0.68, "\u201c")
+
+    # Quote text
+    _sf(c, _SB_NAVY)
+    c.setFont(tf, 14)
+    lines = quote_text.split("\n")
+    ty = H * 0.54
+    for line in lines:
+        c.drawCentredString(W/2, ty, line.strip())
+        ty -= 20
+
+    _divider(c, W/2, ty - 8, half_w=60, color=_SB_GOLD)
+
+    # Attribution
+    if attribution:
+        _sf(c, _SB_MUTED)
+        c.setFont(cf, 9)
+        c.drawCentredString(W/2, ty - 26, f"- {attribution}")
+
+
+# ── Content page layout styles ────────────────────────────────
+
+def _layout_hero(c, W, H, chap_title, items, page_num, fonts):
+    """Single stunning large photo."""
+    tf, bf, cf = fonts
+    item = items[0]
+    img = _item_img(item, slot_px(W * 0.72, H * 0.64))
+    cap = item.get("caption", "")
+    if cap == "\U0001f4f7": cap = ""
+    date_s = _format_date(item.get("date", ""))
+
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
+
+    _framed_photo(c, img, W/2, H/2 + 10, W * 0.72, H * 0.64,
+                  cap, date_s, angle=0, style="polaroid")
+
+
+def _layout_duo(c, W, H, chap_title, items, page_num, fonts):
+    """Two photos side by side, contrasting styles."""
+    tf, bf, cf = fonts
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
+
+    pw, ph = W * 0.40, H * 0.56
+    x1, x2 = W * 0.27, W * 0.73
+    cy = H * 0.47
+
+    style_pairs = [("polaroid", "tape"), ("clean", "vintage"), ("vintage", "polaroid")]
+    s1, s2 = style_pairs[page_num % len(style_pairs)]
+    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
+
+    for i, item in enumerate(items[:2]):
+        img = _item_img(item, slot_px(pw, ph))
+        cap = item.get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(item.get("date", ""))
+        _framed_photo(c, img, x1 if i == 0 else x2, cy, pw, ph,
+                      cap, date_s, angle=[-2.0, 1.8][i],
+                      style=s1 if i == 0 else s2, tape_color=tc)
+
+
+def _layout_trio(c, W, H, chap_title, items, page_num, fonts):
+    """One large featured photo top, two smaller below."""
+    tf, bf, cf = fonts
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
+    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
+
+    configs = [
+        (W/2,      H * 0.64, W * 0.54, H * 0.36, 0,    "magazine"),
+        (W * 0.28, H * 0.22, W * 0.36, H * 0.28, -1.5, "polaroid"),
+        (W * 0.72, H * 0.22, W * 0.36, H * 0.28, 1.5,  "tape"),
+    ]
+    for i, item in enumerate(items[:3]):
+        if i >= len(configs): break
+        cx, cy, pw, ph, angle, style = configs[i]
+        img = _item_img(item, slot_px(pw, ph))
+        cap = item.get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(item.get("date", ""))
+        _framed_photo(c, img, cx, cy, pw, ph, cap, date_s, angle, style,
+                      tape_color=tc)
+
+
+def _layout_grid(c, W, H, chap_title, items, page_num, fonts):
+    """2x2 grid with mixed frame styles."""
+    tf, bf, cf = fonts
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
+    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
+
+    pw, ph = W * 0.40, H * 0.35
+    x1, x2 = W * 0.27, W * 0.73
+    y_top, y_bot = H * 0.67, H * 0.29
+
+    style_sets = [
+        ["polaroid", "tape", "vintage", "clean"],
+        ["clean", "polaroid", "tape", "vintage"],
+        ["vintage", "clean", "polaroid", "tape"],
+    ]
+    styles = style_sets[page_num % len(style_sets)]
+    angles = [-1.0, 1.2, 1.0, -1.2]
+    positions = [(x1, y_top), (x2, y_top), (x1, y_bot), (x2, y_bot)]
+
+    for i, item in enumerate(items[:4]):
+        cx, cy = positions[i]
+        img = _item_img(item, slot_px(pw, ph))
+        cap = item.get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(item.get("date", ""))
+        _framed_photo(c, img, cx, cy, pw, ph, cap, date_s, angles[i],
+                      styles[i], tape_color=tc)
+
+
+def _layout_staggered(c, W, H, chap_title, items, page_num, fonts):
+    """Asymmetric: one tall left, two stacked right."""
+    tf, bf, cf = fonts
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts)
+    tc = _TAPE_COLORS[page_num % len(_TAPE_COLORS)]
+
+    n = min(len(items), 3)
+    if n >= 1:
+        img = _item_img(items[0], slot_px(W * 0.42, H * 0.62))
+        cap = items[0].get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(items[0].get("date", ""))
+        _framed_photo(c, img, W * 0.30, H * 0.47, W * 0.42, H * 0.62,
+                      cap, date_s, angle=-0.8, style="polaroid")
+    if n >= 2:
+        img = _item_img(items[1], slot_px(W * 0.36, H * 0.30))
+        cap = items[1].get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(items[1].get("date", ""))
+        _framed_photo(c, img, W * 0.74, H * 0.62, W * 0.36, H * 0.30,
+                      cap, date_s, angle=1.5, style="tape", tape_color=tc)
+    if n >= 3:
+        img = _item_img(items[2], slot_px(W * 0.34, H * 0.28))
+        cap = items[2].get("caption", "")
+        if cap == "\U0001f4f7": cap = ""
+        date_s = _format_date(items[2].get("date", ""))
+        _framed_photo(c, img, W * 0.72, H * 0.26, W * 0.34, H * 0.28,
+                      cap, date_s, angle=-1.0, style="vintage")
+
+
+def _layout_magazine(c, W, H, chap_title, items, page_num, fonts):
+    """Magazine-style: large photo left, caption panel right."""
+    tf, bf, cf = fonts
+    _page_bg(c, W, H, page_num, chap_title=chap_title, fonts=fonts, tint=_SB_CREAM)
+
+    item = items[0]
+    img = _item_img(item, slot_px(W * 0.52, H * 0.68))
+    cap = item.get("caption", "")
+    if cap == "\U0001f4f7": cap = ""
+    date_s = _format_date(item.get("date", ""))
+
+    # Large photo taking left 60%
+    _framed_photo(c, img, W * 0.33, H * 0.50, W * 0.52, H * 0.68,
+                  "", "", angle=0, style="magazine")
+
+    # Right side text panel
+    panel_x = W * 0.64
+    panel_w = W * 0.30
+
+    if date_s:
+        _sf(c, _SB_GOLD)
+        c.setFont(cf, 8)
+        c.drawString(panel_x, H * 0.68, date_s)
+        _sf(c, _SB_GOLD)
+        c.rect(panel_x, H * 0.66, 40, 0.5, fill=True, stroke=False)
+
+    if cap:
+        _sf(c, _SB_NAVY)
+        c.setFont(tf, 11)
+        lines = wrap(cap.strip(), int(panel_w / 6.5)) or [""]
+        ty = H * 0.62
+        for line in lines[:6]:
+            c.drawString(panel_x, ty, line)
+            ty -= 14
+
+    # Small decorative element
+    _divider(c, panel_x + panel_w/2, H * 0.30, half_w=35, color=_SB_GOLD)
+
+
+def _format_date(raw_d):
+    if not raw_d:
+        return ""
+    try:
+        dt = datetime.fromisoformat(raw_d.replace("Z", "+00:00"))
+        return dt.strftime("%b %Y")
+    except Exception:
+        return str(raw_d)[:7]
+
+
+def layout_for(n: int, page_num: int) -> str:
+    """Best layout based on item count and page variety."""
+    if n == 1:
+        # Alternate hero and magazine for single photos
+        return "magazine" if page_num % 3 == 0 else "hero"
+    if n == 2:
+        return "duo" if page_num % 2 == 0 else "staggered"
+    if n == 3:
+        return "trio" if page_num % 2 == 0 else "staggered"
+    return "grid"
+
+_LAYOUTS = {
+    "hero": _layout_hero, "magazine": _layout_magazine, "duo": _layout_duo,
+    "staggered": _layout_staggered, "trio": _layout_trio, "grid": _layout_grid,
+}
+# Photo slot sizes (fractions of W, H) in draw order; keep in step with the _layout_* functions
+LAYOUT_SLOTS = {
+    "hero": [(0.72, 0.64)],
+    "magazine": [(0.52, 0.68)],
+    "duo": [(0.40, 0.56)] * 2,
+    "staggered": [(0.42, 0.62), (0.36, 0.30), (0.34, 0.28)],
+    "trio": [(0.54, 0.36), (0.36, 0.28), (0.36, 0.28)],
+    "grid": [(0.40, 0.35)] * 4,
+}
+
+def _page_photos(c, W, H, chap_title: str, items: list, page_num: int, fonts: tuple):
+    """Route to the best layout based on item count and page variety."""
+    _LAYOUTS[layout_for(len(items), page_num)](c, W, H, chap_title, items, page_num, fonts)
+def _page_back_cover(c, W, H, fonts: tuple):
+    tf, bf, cf = fonts
+    M = 28
+
+    _sf(c, _SB_NAVY)
+    c.rect(0, 0, W, H, fill=True, stroke=False)
+
+    _sf(c, _SB_GOLD)
+    c.rect(0, H - 52, W, 52, fill=True, stroke=False)
+    c.rect(0, 0, W, 40, fill=True, stroke=False)
+    _sf(c, _SB_CREAM)
+    c.rect(0, H - 54, W, 1, fill=True, stroke=False)
+    c.rect(0, 40, W, 1, fill=True, stroke=False)
+
+    _double_border(c, M, 44, W - 2*M, H - 100, gap=6, color=_SB_CREAM)
+    _ss(c, _SB_GOLD)
+    c.setLineWidth(0.5)
+    c.rect(M+10, 52, W - 2*M - 20, H - 116, fill=False, stroke=True)
+    _ornament_corners(c, M+14, 56, W - 2*M - 28, H - 124, size=20, color=_SB_GOLD)
+
+    _corner_flourish(c, M+20, H - 58, size=32, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, W-M-20, H - 58, size=32, flip_x=True, flip_y=True, color=_SB_GOLD)
+    _corner_flourish(c, M+20, 48, size=32, color=_SB_GOLD)
+    _corner_flourish(c, W-M-20, 48, size=32, flip_x=True, color=_SB_GOLD)
+
+    _sf(c, _SB_CREAM)
+    c.setFont(tf, 22)
+    c.drawCentredString(W/2, H/2 + 48, "Thank you")
+    c.setFont(tf, 15)
+    c.drawCentredString(W/2, H/2 + 24, "for the memories.")
+    _star_divider(c, W/2, H/2 + 6, half_w=80, color=_SB_GOLD)
+
+    _sf(c, (0.62, 0.60, 0.57))
+    c.setFont(cf, 9)
+    c.drawCentredString(W/2, H/2 - 16, "Every photo tells a story.")
+    c.drawCentredString(W/2, H/2 - 30, "Every story deserves to be remembered.")
+
+    _divider(c, W/2, H/2 - 52, half_w=50, color=_SB_GOLD)
+    _sf(c, (0.55, 0.53, 0.50))
+    c.setFont(cf, 8)
+    c.drawCentredString(W/2, H/2 - 68, f"Generated {datetime.now().strftime('%B %Y')}")
+
+    _sf(c, _SB_NAVY)
+    c.setFont(bf, 10)
+    c.drawCentredString(W/2, 14, "LiveOn")
+
+
+# ── Document assembly ──────────────────────────────────────────
+
+def _draw_page(c, W, H, page: tuple, fonts: tuple):
+    kind = page[0]
+    if kind == "cover":
+        _page_cover(c, W, H, page[1], page[2], page[3], fonts)
+    elif kind == "toc":
+        _page_toc(c, W, H, page[1], fonts)
+    elif kind == "quote":
+        _page_quote(c, W, H, page[1], page[2], fonts)
+    elif kind == "chapter":
+        _page_chapter_title(c, W, H, page[1], page[2], fonts)
+    elif kind == "photos":
+        _page_photos(c, W, H, page[1], page[2], page[3], fonts)
+    else:
+        _page_back_cover(c, W, H, fonts)
+
+
+def render_fragment(pages: list) -> tuple[bytes, int]:
+    """render_pages(), plus how many photos were drawn without their image."""
+    _draw_state.missing = 0
+    return render_pages(pages), _draw_state.missing
+
+
+def render_pages(pages: list) -> bytes:
+    """Draw `pages` onto one A4 canvas and return the PDF."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    W, H = A4
+    fonts = register_fonts()
+    for page in pages:
+        _draw_page(c, W, H, page, fonts)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def split_fragments(pages: list) -> list:
+    """
+    Cut a document into independently drawable runs: the cover, the TOC, one
+    per chapter (its quote interlude, divider and photo pages) and the back cover.
+    """
+    fragments = []
+    for i, page in enumerate(pages):
+        continues = page[0] == "photos" or (page[0] == "chapter" and i and pages[i - 1][0] == "quote")
+        if continues and fragments:
+            fragments[-1].append(page)
+        else:
+            fragments.append([page])
+    return fragments
+
+
+def merge_pdfs(parts: list) -> bytes:
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(PdfReader(BytesIO(part)))
+    if hasattr(writer, "compress_identical_objects"):  # pypdf >= 4.3
+        # Each fragment carries its own copy of the fonts and of repeated photos
+        writer.compress_identical_objects()
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def fragment_key(pages: list) -> str:
+    """
+    Hash of what a fragment draws: its page specs with the "_"-prefixed image
+    payloads left out, plus the month (the covers print the date).
+    """
+    spec = [
+        [[{k: v for k, v in item.items() if not k.startswith("_")} for item in part]
+         if isinstance(part, list) and part and isinstance(part[0], dict) else part
+         for part in page]
+        for page in pages
+    ]
+    raw = json.dumps([datetime.now().strftime("%Y-%m"), spec], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cached_fragment(key: str) -> bytes | None:
+    with _fragments_lock:
+        part = _fragments.get(key)
+        if part is not None:
+            _fragments.move_to_end(key)
+        return part
+
+
+def _cache_fragment(key: str, part: bytes) -> None:
+    global _fragments_size
+    with _fragments_lock:
+        old = _fragments.pop(key, None)
+        _fragments_size -= len(old) if old else 0
+        _fragments[key] = part
+        _fragments_size += len(part)
+        while _fragments_size > FRAGMENT_CACHE_MAX_BYTES and len(_fragments) > 1:
+            _, dropped = _fragments.popitem(last=False)
+            _fragments_size -= len(dropped)
+
+
+def _get_pool(workers: int):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the Streamlit server is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _drop_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_fragments(fragments: list, workers: int) -> list:
+    """[(pdf, missing photos)] per fragment."""
+    if workers <= 1 or len(fragments) <= 1:
+        return [render_fragment(f) for f in fragments]
+    try:
+        return list(_get_pool(workers).map(render_fragment, fragments))
+    except Exception as e:
+        # Broken or unstartable pool (e.g. a host that can't spawn): start a fresh one next time
+        logger.warning("scrapbook_parallel_render_failed error=%s", e)
+        _drop_pool()
+        return [render_fragment(f) for f in fragments]
+
+
+def render_document(pages: list, workers: int = PDF_RENDER_WORKERS, prepare=None) -> bytes:
+    """
+    The whole scrapbook PDF, merged from the fragments of split_fragments().
+    Fragments already in the cache are reused; the rest are drawn in the
+    process pool and cached unless a photo had to be left out (so a passing
+    download failure isn't kept). prepare(pages), if given, is called first with just the
+    pages about to be drawn, e.g. to fetch their images.
+    """
+    if PdfWriter is None:
+        if prepare:
+            prepare(pages)
+        return render_pages(pages)
+    fragments = split_fragments(pages)
+    keys = [fragment_key(f) for f in fragments]
+    parts = [_cached_fragment(k) for k in keys]
+    todo = [i for i, part in enumerate(parts) if part is None]
+    if todo:
+        if prepare:
+            prepare([page for i in todo for page in fragments[i]])
+        for i, (part, missing) in zip(todo, _render_fragments([fragments[i] for i in todo], workers)):
+            parts[i] = part
+            if not missing:
+                _cache_fragment(keys[i], part)
+    logger.info("scrapbook_render fragments=%s drawn=%s", len(fragments), len(todo))
+    return merge_pdfs(parts)
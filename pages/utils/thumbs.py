@@ -0,0 +1,87 @@
+# FILE: utils/thumbs.py
+"""
+Fixed-size JPEG thumbnails stored next to backup originals.
+
+For <prefix>/images/<stem>.<ext> the backup writes
+<prefix>/images/thumbs/<size>/<stem>.jpg for each size in THUMB_SIZES that
+is smaller than the original (size = longest edge in px). Readers ask for
+the smallest size that still covers the slot they draw into.
+"""
+from io import BytesIO
+
+from azure.storage.blob import ContentSettings
+
+THUMB_SIZES = (320, 640, 1280)
+THUMB_QUALITY = 82
+THUMB_DIR = "thumbs"
+
+
+def thumb_blob_path(image_blob_path: str, size: int) -> str:
+    folder, name = image_blob_path.rsplit("/", 1)
+    return f"{folder}/{THUMB_DIR}/{size}/{name.rsplit('.', 1)[0]}.jpg"
+
+
+def is_thumb_path(blob_path: str) -> bool:
+    return f"/images/{THUMB_DIR}/" in blob_path
+
+
+def pick_size(needed_px: int, available) -> int | None:
+    """Smallest available size >= needed_px, or None if only the original is big enough."""
+    fitting = [s for s in available if s >= needed_px]
+    return min(fitting) if fitting else None
+
+
+def make_thumbnails(data: bytes, sizes=THUMB_SIZES, quality: int = THUMB_QUALITY) -> dict:
+    """{size: jpeg bytes} for every size smaller than the image's longest edge (EXIF rotation applied)."""
+    from PIL import Image, ImageOps  # only the backup writer needs Pillow; readers just use the path helpers
+
+    with Image.open(BytesIO(data)) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        longest = max(im.size)
+        out = {}
+        # Largest first so each step downsamples the previous result, not the original
+        for size in sorted((s for s in sizes if s < longest), reverse=True):
+            im.thumbnail((size, size), Image.LANCZOS)
+            buf = BytesIO()
+            im.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+            out[size] = buf.getvalue()
+        return out
+
+
+def fit_jpeg(data: bytes, max_px: int, quality: int = THUMB_QUALITY) -> bytes:
+    """
+    `data` downsampled so its longest edge is at most max_px, EXIF rotation
+    applied and metadata dropped, re-encoded as JPEG. Already-small JPEGs
+    without EXIF come back untouched.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as im:
+        if im.format == "JPEG" and max(im.size) <= max_px and not im.info.get("exif"):
+            return data
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ("RGBA", "LA", "P"):
+            im = im.convert("RGBA")
+            flat = Image.new("RGB", im.size, (255, 255, 255))
+            flat.paste(im, mask=im.getchannel("A"))
+            im = flat
+        elif im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.thumbnail((max_px, max_px), Image.LANCZOS)
+        buf = BytesIO()
+        im.save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
+
+def upload_thumbnails(container, image_blob_path: str, data: bytes, sizes=THUMB_SIZES) -> list:
+    """Generate and upload thumbnails for one original; returns the blob paths written."""
+    written = []
+    for size, jpeg in make_thumbnails(data, sizes).items():
+        path = thumb_blob_path(image_blob_path, size)
+        container.get_blob_client(path).upload_blob(
+            jpeg, overwrite=True, content_settings=ContentSettings(content_type="image/jpeg"),
+        )
+        written.append(path)
+    return written
@@ -0,0 +1,118 @@
+# FILE: utils/zip_stream.py
+"""
+Server-side ZIP assembly: source files are read from blob storage chunk by
+chunk and the archive is written through a BlockBlobWriter, so building a
+backup ZIP needs one block of memory and no local disk, whatever its size.
+"""
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pages.utils.blob_io import BlockBlobWriter
+
+# Already-compressed formats gain nothing from DEFLATE; store them as-is.
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".mp4", ".mov", ".zip", ".pdf"}
+# Blobs up to this size are prefetched whole; bigger ones are streamed on the writer thread.
+PREFETCH_MAX_BYTES = 16 * 1024 * 1024
+
+
+def compression_for(name: str) -> int:
+    ext = "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def _zipinfo(arcname: str, size: int = 0) -> zipfile.ZipInfo:
+    zi = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+    zi.compress_type = compression_for(arcname)
+    zi.file_size = size  # lets zipfile decide on ZIP64 up front for huge entries
+    return zi
+
+
+def write_bytes_entry(zf: zipfile.ZipFile, arcname: str, data) -> None:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    zf.writestr(_zipinfo(arcname, len(data)), data)
+
+
+def write_blob_entry(zf: zipfile.ZipFile, container, blob_name: str, arcname: str, downloader=None) -> None:
+    """Copy one blob into the archive, streaming its chunks."""
+    if downloader is None:
+        downloader = container.get_blob_client(blob_name).download_blob()
+    with zf.open(_zipinfo(arcname, downloader.size), "w") as dst:
+        for chunk in downloader.chunks():
+            dst.write(chunk)
+
+
+def _prefetched(container, entries, window: int, max_bytes: int):
+    """
+    Yield (blob_name, arcname, future) in entry order while keeping up to
+    `window` downloads of the upcoming blobs in flight. Each future resolves to
+    ("bytes", data) for small blobs or ("stream", downloader) for large ones,
+    so memory stays bounded at roughly window × max_bytes.
+    """
+    def fetch(blob_name):
+        downloader = container.get_blob_client(blob_name).download_blob()
+        if downloader.size <= max_bytes:
+            return "bytes", downloader.readall()
+        return "stream", downloader
+
+    it = iter(entries)
+    queue = deque()
+    with ThreadPoolExecutor(max_workers=window) as pool:
+        for blob_name, arcname in it:
+            queue.append((blob_name, arcname, pool.submit(fetch, blob_name)))
+            if len(queue) >= window:
+                break
+        while queue:
+            blob_name, arcname, fut = queue.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                queue.append((nxt[0], nxt[1], pool.submit(fetch, nxt[0])))
+            yield blob_name, arcname, fut
+
+
+def zip_blobs_to_blob(container, dest_blob: str, entries, *, extras=None, on_error=None,
+                      on_progress=None, prefetch: int = 0, prefetch_max_bytes: int = PREFETCH_MAX_BYTES) -> int:
+    """
+    Build `dest_blob` as a ZIP of `entries` ([(blob_name, arcname), ...]) plus
+    `extras` ({arcname: bytes|str}, written first).
+
+    If `on_error(arcname, exc)` is given, a source blob that fails to open is
+    reported through it and may return (arcname, bytes) to write instead;
+    otherwise the error propagates and nothing is committed.
+    `on_progress(done, total)` is called after each entry.
+    With `prefetch` > 0 that many upcoming blobs are downloaded in parallel
+    while the current one is being written.
+    Returns the number of blob entries written.
+    """
+    entries = list(entries)
+    written = 0
+    with BlockBlobWriter(container.get_blob_client(dest_blob), content_type="application/zip") as out:
+        with zipfile.ZipFile(out, "w") as zf:
+            for arcname, data in (extras or {}).items():
+                write_bytes_entry(zf, arcname, data)
+            if prefetch > 0:
+                source = _prefetched(container, entries, prefetch, prefetch_max_bytes)
+            else:
+                source = ((blob_name, arcname, None) for blob_name, arcname in entries)
+            for i, (blob_name, arcname, fut) in enumerate(source, 1):
+                try:
+                    if fut is None:
+                        write_blob_entry(zf, container, blob_name, arcname)
+                    else:
+                        kind, payload = fut.result()
+                        if kind == "bytes":
+                            write_bytes_entry(zf, arcname, payload)
+                        else:
+                            write_blob_entry(zf, container, blob_name, arcname, downloader=payload)
+                    written += 1
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    replacement = on_error(arcname, e)
+                    if replacement:
+                        write_bytes_entry(zf, *replacement)
+                if on_progress:
+                    on_progress(i, len(entries))
+    return written